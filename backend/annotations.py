@@ -0,0 +1,70 @@
+"""Champs dérivés calculés par la base de données.
+
+Les champs comme ``is_overdue`` ou ``days_left`` sont des propriétés
+Python sur les modèles, et des annotations (``Case``/``When``, fonctions
+de dates) sur les querysets qui les déclarent. Annotés, ils se filtrent,
+se trient et s'agrègent en SQL. ``annotated_property`` permet aux deux de
+cohabiter : la valeur annotée est utilisée quand elle est présente, le
+calcul Python sinon (objet fraîchement créé, relation...). Les deux
+versions appliquent les mêmes règles, l'une en SQL, l'autre en Python.
+"""
+from django.db.models import Func, IntegerField, Value
+from django.db.models.functions import Greatest
+
+
+class annotated_property:
+    """Propriété remplacée par l'annotation du même nom si le queryset l'a fournie
+
+    Descripteur sans ``__set__`` : Django écrit l'annotation dans
+    ``instance.__dict__``, qui prend le pas sur le calcul Python.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return self.func(instance)
+
+    @classmethod
+    def discard(cls, instance):
+        """Oublier les annotations de ``instance`` après un changement d'état"""
+        for klass in type(instance).__mro__:
+            for name, value in vars(klass).items():
+                if isinstance(value, cls):
+                    instance.__dict__.pop(name, None)
+
+
+class DaysUntil(Func):
+    """Nombre de jours entiers entre ``now`` et ``expression`` (négatif si passé)
+
+    Même valeur que ``(expression - now).days`` en Python. Écrite pour
+    SQLite et PostgreSQL, comme la recherche plein texte.
+    """
+    output_field = IntegerField()
+
+    def __init__(self, expression, now, **extra):
+        super().__init__(expression, Value(now), **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='CAST(FLOOR(julianday(%(expressions)s)) AS INTEGER)',
+            arg_joiner=') - julianday(',
+            **extra_context
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='FLOOR(EXTRACT(EPOCH FROM (%(expressions)s)) / 86400)::integer',
+            arg_joiner=' - ',
+            **extra_context
+        )
+
+
+def days_left(expression, now):
+    """Jours restants avant ``expression``, 0 si la date est passée"""
+    return Greatest(DaysUntil(expression, now), Value(0))
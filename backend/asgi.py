@@ -5,6 +5,15 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
+
+Déploiement (voir ``gunicorn.conf.py``) :
+
+    SERVER_MODE=asgi gunicorn                                   # gunicorn + workers uvicorn
+    ASYNC_VIEWS=True uvicorn backend.asgi:application --workers 4
+
+``ASYNC_VIEWS`` sert les lectures les plus fréquentes (catalogue,
+``queue_status``, ``my_loans``, ``profile``) par des actions asynchrones ;
+comparer avec WSGI : ``python -m benchmarks.asgi``.
 """
 
 import os
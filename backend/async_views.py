@@ -0,0 +1,73 @@
+"""Actions de lecture asynchrones (``list`` -> ``alist``) sous ASGI avec ``ASYNC_VIEWS`` ;
+sous WSGI, les vues restent synchrones et les méthodes ``a...`` ne servent pas."""
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.conf import settings
+from rest_framework.response import Response
+
+
+class AsyncViewSetMixin:
+    """Mixin de ViewSet : ``async_actions`` servies par leurs méthodes ``a...``
+
+    À placer juste avant la classe de ViewSet de DRF. Une route dont
+    aucune action n'est asynchrone reste une vue synchrone.
+    """
+    async_actions = ()
+    async_mode = False
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        async_mode = bool(
+            getattr(settings, 'ASYNC_VIEWS', False)
+            and actions
+            and set(actions.values()) & set(cls.async_actions)
+        )
+        view = super().as_view(actions, async_mode=async_mode, **initkwargs)
+        if async_mode:
+            # dispatch renvoie alors une coroutine
+            markcoroutinefunction(view)
+        return view
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.async_mode:
+            return self.adispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
+
+    async def adispatch(self, request, *args, **kwargs):
+        """``APIView.dispatch`` avec l'action attendue sur la boucle d'événements"""
+        action = self.action_map.get(request.method.lower())
+        if action not in self.async_actions:
+            return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            response = await getattr(self, f'a{action}')(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def apaginate_queryset(self, queryset):
+        """``paginate_queryset`` ; ``apaginate_queryset`` de la pagination s'il existe"""
+        if self.paginator is None:
+            return None
+        paginate = getattr(self.paginator, 'apaginate_queryset', None)
+        if paginate is None:
+            return await sync_to_async(self.paginator.paginate_queryset)(
+                queryset, self.request, view=self
+            )
+        return await paginate(queryset, self.request, view=self)
+
+    async def alist(self, request, *args, **kwargs):
+        """``ListModelMixin.list`` avec l'ORM asynchrone"""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer([obj async for obj in queryset.aiterator()], many=True)
+        return Response(serializer.data)
@@ -0,0 +1,167 @@
+"""Requêtes conditionnelles (ETag / Last-Modified) pour les ViewSets.
+
+Le validateur d'une liste est calculé par une seule requête agrégée sur
+le queryset filtré : ``COUNT(*)`` et ``MAX(updated_at)`` (et des relations
+affichées) ; le nombre de lignes sert ensuite à la pagination, qui ne
+relance pas de ``COUNT(*)``. Celui d'un objet est lu sur l'objet lui-même.
+``If-None-Match`` et ``If-Modified-Since`` sont traités avant toute
+sérialisation : un client qui interroge l'API toutes les quelques
+secondes reçoit un 304 vide tant que rien n'a changé.
+
+Les champs calculés à partir de l'heure (``days_left``, ``is_overdue``...)
+changent sans écriture : ``conditional_period`` fait aussi dépendre le
+validateur de la période en cours.
+
+``Last-Modified`` ne voit pas les suppressions ; l'ETag, qui inclut le
+nombre de lignes, est le validateur à privilégier pour les listes. Les
+pages en mode curseur ne sont pas validées : leur agrégat coûterait le
+``COUNT(*)`` que ce mode évite.
+
+Les méthodes préfixées par ``a`` (``alist_response``...) sont leurs
+équivalents pour les actions asynchrones (voir ``backend.async_views``).
+"""
+import hashlib
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.sha1(repr(parts).encode()).hexdigest())
+
+
+def _follow(instance, path):
+    """Valeur de ``book__updated_at`` sur une instance"""
+    for name in path.split('__'):
+        instance = getattr(instance, name, None)
+    return instance
+
+
+class ConditionalGetMixin:
+    """Réponses 304 pour ``list``, ``retrieve`` et les listes des actions
+
+    Les actions de liste personnalisées passent par ``list_response``.
+    """
+    # Dates du validateur ; ``book__updated_at`` pour voir aussi les
+    # modifications des livres affichés
+    conditional_fields = ('updated_at',)
+    # Nombre de lignes déjà compté par le validateur, repris par la pagination
+    known_count = None
+    # Secondes : les réponses qui affichent des champs dépendant de l'heure
+    # changent de validateur à chaque période, même sans écriture
+    conditional_period = None
+
+    def list(self, request, *args, **kwargs):
+        return self.list_response(self.filter_queryset(self.get_queryset()))
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        dates = [_follow(instance, field) for field in self.conditional_fields]
+        return self.conditional_response(
+            *self._validators(instance.pk, dates),
+            lambda: Response(self.get_serializer(instance).data)
+        )
+
+    def list_response(self, queryset):
+        """Page sérialisée de ``queryset``, ou 304 si le client l'a déjà"""
+        cursor_param = getattr(self.paginator, 'cursor_query_param', None)
+        if cursor_param in self.request.query_params:
+            return self.list_page(queryset)
+        return self.conditional(queryset, self.list_page, queryset)
+
+    def list_page(self, queryset):
+        """Page sérialisée de ``queryset`` (voir ``ValuesListMixin``)"""
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    def conditional(self, queryset, handler, *args, **kwargs):
+        """Appeler ``handler`` seulement si le validateur de ``queryset`` a changé"""
+        values = queryset.order_by().aggregate(**self._aggregates())
+        self.known_count = values.pop('count')
+        return self.conditional_response(
+            *self._validators(self.known_count, values.values()),
+            handler, *args, **kwargs
+        )
+
+    def conditional_response(self, etag, last_modified, handler, *args, **kwargs):
+        """304 si le client a déjà ``etag`` / ``last_modified``, sinon ``handler``"""
+        response = self._not_modified(etag, last_modified)
+        if response is None:
+            response = handler(*args, **kwargs)
+            if response.status_code != 200:
+                return response
+        return self._with_validators(response, etag, last_modified)
+
+    async def alist_response(self, queryset):
+        cursor_param = getattr(self.paginator, 'cursor_query_param', None)
+        if cursor_param in self.request.query_params:
+            return await self.alist_page(queryset)
+        return await self.aconditional(queryset, self.alist_page, queryset)
+
+    async def alist_page(self, queryset):
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer([obj async for obj in queryset.aiterator()], many=True)
+        return Response(serializer.data)
+
+    async def aconditional(self, queryset, handler, *args, **kwargs):
+        values = await queryset.order_by().aaggregate(**self._aggregates())
+        self.known_count = values.pop('count')
+        return await self.aconditional_response(
+            *self._validators(self.known_count, values.values()),
+            handler, *args, **kwargs
+        )
+
+    async def aconditional_response(self, etag, last_modified, handler, *args, **kwargs):
+        response = self._not_modified(etag, last_modified)
+        if response is None:
+            response = await handler(*args, **kwargs)
+            if response.status_code != 200:
+                return response
+        return self._with_validators(response, etag, last_modified)
+
+    def _aggregates(self):
+        """Nombre de lignes et dates les plus récentes, en une requête"""
+        aggregates = {
+            f'max_{index}': Max(field) for index, field in enumerate(self.conditional_fields)
+        }
+        return {'count': Count('pk'), **aggregates}
+
+    def _not_modified(self, etag, last_modified):
+        return get_conditional_response(
+            self.request._request, etag=etag,
+            last_modified=last_modified and int(last_modified.timestamp()),
+        )
+
+    def _with_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        # Les listes dépendent de l'utilisateur connecté
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def _validators(self, key, dates):
+        """(ETag, dernière modification) à partir de ``key`` et des dates"""
+        dates = list(dates)
+        if self.conditional_period:
+            now = timezone.now().timestamp()
+            dates.append(datetime.fromtimestamp(
+                now - now % self.conditional_period, tz=dt_timezone.utc
+            ))
+        etag = make_etag(
+            self.request.get_full_path(), self.request.user.pk, key,
+            *[date and date.isoformat() for date in dates],
+        )
+        present = [date for date in dates if date is not None]
+        return etag, max(present) if present else None
@@ -0,0 +1,225 @@
+"""Mesures Prometheus par requête (latence, SQL, sérialisation, rendu, taille)
+sur ``/metrics`` ; en-tête ``Server-Timing`` en mode DEBUG."""
+import os
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram, generate_latest, multiprocess,
+)
+
+LABELS = ('route', 'action', 'method')
+
+REQUEST_LATENCY = Histogram(
+    'libratech_request_duration_seconds', 'Durée totale des requêtes',
+    LABELS + ('status',),
+)
+DB_QUERIES = Histogram(
+    'libratech_db_queries_per_request', 'Requêtes SQL par requête HTTP', LABELS,
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, float('inf')),
+)
+DB_DURATION = Histogram(
+    'libratech_db_duration_seconds', 'Temps SQL cumulé par requête HTTP', LABELS,
+)
+SERIALIZE_DURATION = Histogram(
+    'libratech_serialize_duration_seconds', 'Temps de sérialisation (serializers DRF)', LABELS,
+)
+RENDER_DURATION = Histogram(
+    'libratech_render_duration_seconds', 'Temps de rendu (JSON) de la réponse', LABELS,
+)
+RESPONSE_SIZE = Histogram(
+    'libratech_response_size_bytes', 'Taille du corps de la réponse', LABELS,
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, float('inf')),
+)
+
+# Routes non résolues (404) regroupées pour borner le nombre de séries
+UNMATCHED_ROUTE = '<unmatched>'
+# Voir backend/urls.py ; non mesuré
+METRICS_PATH = '/metrics/'
+
+
+def request_labels(request):
+    """Route, action du ViewSet et méthode d'une requête déjà résolue"""
+    match = request.resolver_match
+    if match is None:
+        return UNMATCHED_ROUTE, '', request.method
+    # Les vues de ViewSet portent la table méthode -> action (y compris pour un 304)
+    actions = getattr(match.func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), '')
+    return match.view_name or match.route, action, request.method
+
+
+class _QueryTimer:
+    """``execute_wrapper`` qui compte et chronomètre les requêtes SQL"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+@contextmanager
+def wrap_connections(wrapper):
+    """``execute_wrapper`` sur toutes les bases, pour le thread courant"""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        yield
+
+
+async def awrap_connections(wrapper):
+    """``wrap_connections`` pour un middleware asynchrone
+
+    Pose ``wrapper`` dans le thread des ``sync_to_async`` de la requête
+    (un par requête sous ASGI) ; retourne la pile à fermer par
+    ``await sync_to_async(stack.close)()``.
+    """
+    stack = ExitStack()
+    await sync_to_async(stack.enter_context)(wrap_connections(wrapper))
+    return stack
+
+
+class RequestMetricsMiddleware:
+    """Mesurer chaque requête ; à placer en tête de ``MIDDLEWARE``"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path == METRICS_PATH:
+            return self.get_response(request)
+
+        queries = _QueryTimer()
+        request._serialize_duration = 0.0
+        request._render_duration = 0.0
+        started = time.perf_counter()
+        with wrap_connections(queries):
+            response = self.get_response(request)
+        return self._record(request, response, queries, started)
+
+    async def __acall__(self, request):
+        if request.path == METRICS_PATH:
+            return await self.get_response(request)
+
+        queries = _QueryTimer()
+        request._serialize_duration = 0.0
+        request._render_duration = 0.0
+        started = time.perf_counter()
+        stack = await awrap_connections(queries)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self._record(request, response, queries, started)
+
+    def _record(self, request, response, queries, started):
+        total = time.perf_counter() - started
+        labels = request_labels(request)
+        serialize = request._serialize_duration
+        render = request._render_duration
+        REQUEST_LATENCY.labels(*labels, response.status_code).observe(total)
+        DB_QUERIES.labels(*labels).observe(queries.count)
+        DB_DURATION.labels(*labels).observe(queries.duration)
+        SERIALIZE_DURATION.labels(*labels).observe(serialize)
+        RENDER_DURATION.labels(*labels).observe(render)
+        if not response.streaming:
+            RESPONSE_SIZE.labels(*labels).observe(len(response.content))
+
+        if settings.DEBUG:
+            app = max(total - queries.duration - serialize - render, 0.0)
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={queries.duration * 1000:.1f};desc="{queries.count} SQL"',
+                f'app;dur={app * 1000:.1f}',
+                f'serialize;dur={serialize * 1000:.1f}',
+                f'render;dur={render * 1000:.1f}',
+                f'total;dur={total * 1000:.1f}',
+            ])
+        return response
+
+    def process_template_response(self, request, response):
+        """Chronométrer le rendu des réponses DRF (appelé juste avant ``render()``)"""
+        return _time_render(request, response)
+
+    async def aprocess_template_response(self, request, response):
+        return _time_render(request, response)
+
+
+def _time_render(request, response):
+    started = time.perf_counter()
+
+    def rendered(response):
+        request._render_duration = time.perf_counter() - started
+
+    response.add_post_render_callback(rendered)
+    return response
+
+
+class SerializationTimingMixin:
+    """Mixin de ViewSet : temps de sérialisation compté par la mesure
+
+    Chronomètre ``to_representation`` du serializer racine (les serializers
+    imbriqués sont compris dans sa durée) et ``serialize`` du lecteur de
+    ``ValuesListMixin``. À placer en tête des bases du ViewSet.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        serializer.to_representation = self._timed(serializer.to_representation)
+        return serializer
+
+    def get_read_serializer(self):
+        reader = super().get_read_serializer()
+        reader.serialize = self._timed(reader.serialize)
+        return reader
+
+    def _timed(self, function):
+        request = self.request._request
+
+        def timed(*args):
+            started = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                # Absent hors du middleware (vue appelée directement)
+                if hasattr(request, '_serialize_duration'):
+                    request._serialize_duration += time.perf_counter() - started
+
+        return timed
+
+
+def metrics_view(request):
+    """Mesures au format texte de Prometheus
+
+    Si ``METRICS_TOKEN`` est défini, l'en-tête ``Authorization: Bearer
+    <token>`` est exigé ; sinon, une session staff.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        allowed = request.headers.get('Authorization') == f'Bearer {token}'
+    else:
+        allowed = request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden()
+    registry = REGISTRY
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,136 @@
+"""Détection des N+1 : un même SELECT exécuté plus de ``NPLUSONE_THRESHOLD`` fois
+par requête HTTP lève ``NPlusOneError`` (``raise``) ou est journalisé (``log``)."""
+import inspect
+import logging
+import random
+import re
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from rest_framework.serializers import Serializer
+
+from backend.metrics import awrap_connections, request_labels, wrap_connections
+
+logger = logging.getLogger(__name__)
+
+# Listes de paramètres de longueur variable : une seule forme
+_PARAMETER_LIST = re.compile(r'%s(?:\s*,\s*%s)+')
+# Seules les lectures sont comptées : les UPDATE groupés de _return_copies
+# ou _shift_queues se répètent légitimement
+_COUNTED = ('SELECT',)
+
+
+class NPlusOneError(AssertionError):
+    """Requête SQL répétée à l'identique pendant une même requête HTTP"""
+
+
+def query_shape(sql):
+    """Forme d'une requête SQL : paramètres retirés, listes ``IN`` ramenées à un élément"""
+    return _PARAMETER_LIST.sub('%s', ' '.join(sql.split()))
+
+
+def serializer_field(frame):
+    """Champ de serializer en cours de lecture dans la pile, ``''`` sinon
+
+    Les serializers imbriqués donnent un chemin : ``LoanDetailSerializer.user.email``.
+    """
+    path = []
+    owner = None
+    while frame is not None:
+        if frame.f_code.co_name == 'to_representation':
+            serializer = frame.f_locals.get('self')
+            field = frame.f_locals.get('field')
+            if isinstance(serializer, Serializer) and field is not None:
+                path.append(field.field_name)
+                owner = type(serializer).__name__
+        frame = frame.f_back
+    if owner is None:
+        return ''
+    return '.'.join([owner] + path[::-1])
+
+
+class _RepeatedQueries:
+    """``execute_wrapper`` qui compte les exécutions par forme de requête"""
+
+    def __init__(self, request, threshold, raise_error):
+        self.request = request
+        self.threshold = threshold
+        self.raise_error = raise_error
+        self.counts = Counter()
+        # Forme -> champ de serializer, pour les formes au-delà du seuil
+        self.offenders = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith(_COUNTED):
+            shape = query_shape(sql)
+            self.counts[shape] += 1
+            if self.counts[shape] == self.threshold + 1:
+                self.detected(shape, inspect.currentframe())
+        return execute(sql, params, many, context)
+
+    def detected(self, shape, frame):
+        field = serializer_field(frame)
+        self.offenders[shape] = field
+        if self.raise_error:
+            route, action, method = request_labels(self.request)
+            raise NPlusOneError(
+                f'N+1 sur {method} {route} ({action or "-"}) : requête répétée plus de '
+                f'{self.threshold} fois, champ {field or "inconnu"} :\n{shape}'
+            )
+
+    def report(self):
+        route, action, method = request_labels(self.request)
+        for shape, field in self.offenders.items():
+            logger.warning(
+                'N+1 sur %s %s (%s) : %d exécutions, champ %s : %s',
+                method, route, action or '-', self.counts[shape],
+                field or 'inconnu', shape,
+            )
+
+
+class NPlusOneMiddleware:
+    """Signaler les SELECT répétés ; ``NPLUSONE_MODE`` : ``raise``, ``log`` (échantillonné) ou ``off``"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        detector = self._detector(request)
+        if detector is None:
+            return self.get_response(request)
+        with wrap_connections(detector):
+            response = self.get_response(request)
+        if not detector.raise_error:
+            detector.report()
+        return response
+
+    async def __acall__(self, request):
+        detector = self._detector(request)
+        if detector is None:
+            return await self.get_response(request)
+        stack = await awrap_connections(detector)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        if not detector.raise_error:
+            detector.report()
+        return response
+
+    def _detector(self, request):
+        """Détecteur pour cette requête, None si elle n'est pas observée"""
+        mode = getattr(settings, 'NPLUSONE_MODE', 'log')
+        if mode == 'off' or (
+            mode == 'log' and random.random() >= getattr(settings, 'NPLUSONE_SAMPLE_RATE', 0.0)
+        ):
+            return None
+        return _RepeatedQueries(
+            request, getattr(settings, 'NPLUSONE_THRESHOLD', 2), mode == 'raise'
+        )
@@ -0,0 +1,225 @@
+"""Pagination par numéro de page, avec un mode curseur (keyset) optionnel.
+
+Sans paramètre ``cursor``, rien ne change (``?page=`` + ``COUNT(*)``).
+Avec ``?cursor=`` (vide pour la première page), la page suivante est lue
+après la dernière clé vue : ``WHERE (clé, id) > (...) ORDER BY clé, id
+LIMIT n``. Chaque page coûte le même prix, quelle que soit sa profondeur,
+et aucun ``COUNT(*)`` n'est lancé ; ``?include_total=1`` ajoute une
+estimation du total.
+"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage, Paginator as DjangoPaginator
+from django.db import connections
+from django.db.models import Q
+from rest_framework import exceptions
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def approximate_count(queryset):
+    """Estimation du nombre de lignes, sans parcourir la table si possible
+
+    PostgreSQL : estimation du planificateur (``EXPLAIN``). Ailleurs : COUNT.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _flip(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+class OptInCursorPagination(PageNumberPagination):
+    """``PageNumberPagination`` avec un mode curseur activé par ``?cursor=``
+
+    La clé du curseur reprend le tri effectif du queryset (``?ordering=``,
+    ``order_by`` de l'action, sinon ``ordering`` de la vue ou du modèle)
+    suivi de ``id`` pour départager les égalités, par exemple
+    ``-borrow_date, -id``.
+    """
+    cursor_query_param = 'cursor'
+    total_query_param = 'include_total'
+
+    keyset = False
+    known_count = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            # Nombre déjà compté par la vue (validateur des requêtes conditionnelles)
+            self.known_count = getattr(view, 'known_count', None)
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        key = self.get_cursor_key(queryset, view)
+        position, reverse = self.decode_cursor(request, queryset.model, key)
+
+        ordering = [_flip(field) for field in key] if reverse else key
+        page = queryset.order_by(*ordering)
+        if position is not None:
+            page = page.filter(self._after(ordering, position))
+        rows = list(page[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = position is not None, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+        self.next_cursor = self._position(rows[-1], key) if rows and has_next else None
+        self.previous_cursor = self._position(rows[0], key) if rows and has_previous else None
+        self.approximate_total = None
+        if request.query_params.get(self.total_query_param):
+            self.approximate_total = approximate_count(queryset)
+        return rows
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset`` pour les vues asynchrones (``backend.async_views``)
+
+        Mode page : ``acount`` (si la vue n'a pas déjà compté) puis la page
+        lue avec ``aiterator``. Le mode curseur passe par un thread.
+        """
+        if self.cursor_query_param in request.query_params:
+            return await sync_to_async(self.paginate_queryset)(queryset, request, view)
+
+        self.keyset = False
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        self.known_count = getattr(view, 'known_count', None)
+        if self.known_count is None:
+            self.known_count = await queryset.acount()
+        # Nombre connu : la validation du numéro de page ne lit pas la base
+        paginator = self.django_paginator_class(queryset, page_size)
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            ))
+        self.page.object_list = [row async for row in self.page.object_list.aiterator()]
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+    def django_paginator_class(self, queryset, page_size):
+        paginator = DjangoPaginator(queryset, page_size)
+        if self.known_count is not None:
+            paginator.count = self.known_count
+        return paginator
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        payload = OrderedDict()
+        if self.approximate_total is not None:
+            payload['approximate_count'] = self.approximate_total
+        payload['next'] = self._link(self.next_cursor, reverse=False)
+        payload['previous'] = self._link(self.previous_cursor, reverse=True)
+        payload['results'] = data
+        return Response(payload)
+
+    def get_cursor_key(self, queryset, view):
+        """Champs de tri du curseur, ``id`` en dernier
+
+        Un tri qui ne peut pas servir de clé (expression, relation,
+        annotation) est refusé plutôt que remplacé.
+        """
+        query = queryset.query
+        ordering = (
+            query.order_by
+            or (query.default_ordering and queryset.model._meta.ordering)
+            or getattr(view, 'ordering', None)
+            or ()
+        )
+        key = []
+        for field in ordering:
+            if not isinstance(field, str) or not self._is_column(queryset.model, field.lstrip('-')):
+                raise exceptions.ValidationError({
+                    self.cursor_query_param: 'Ce tri ne permet pas la pagination par curseur.'
+                })
+            direction = '-' if field.startswith('-') else ''
+            if field.lstrip('-') in ('id', 'pk'):
+                # L'id est unique : les champs suivants ne départagent plus rien
+                return key + [f'{direction}id']
+            key.append(field)
+        direction = '-' if key and key[-1].startswith('-') else ''
+        return key + [f'{direction}id']
+
+    @staticmethod
+    def _is_column(model, name):
+        if name == 'pk':
+            return True
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return False
+        return field.concrete and not field.is_relation
+
+    # -------- Curseurs --------
+
+    def _after(self, ordering, position):
+        """Condition « après ``position`` » pour un tri sur plusieurs champs"""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _position(self, obj, key):
+        # isoformat garde les microsecondes, que DjangoJSONEncoder tronque
+        # Instances de modèle, ou lignes ``.values()`` (ValuesListMixin)
+        names = [field.lstrip('-') for field in key]
+        if isinstance(obj, dict):
+            values = [obj[name] for name in names]
+        else:
+            values = [getattr(obj, name) for name in names]
+        return [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+
+    def _link(self, position, reverse):
+        if position is None:
+            return None
+        payload = json.dumps({'p': position, 'r': int(reverse)})
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, model, key):
+        """Retourner (position, sens) ; (None, False) pour la première page"""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            position = [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(key, payload['p'])
+            ]
+            if len(position) != len(key):
+                raise ValueError
+            return position, bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, binascii.Error, ValidationError) as exc:
+            raise NotFound('Curseur invalide.') from exc
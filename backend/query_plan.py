@@ -0,0 +1,46 @@
+"""Planification des requêtes par action de ViewSet.
+
+Chaque ViewSet déclare, action par action, les relations et les colonnes
+lues par son serializer. Le queryset est ensuite construit à partir de
+cette déclaration avec ``select_related`` / ``only`` afin que le nombre
+de requêtes par page reste fixe.
+"""
+
+
+class QueryPlan:
+    """Relations à joindre et colonnes à charger pour une action"""
+
+    def __init__(self, select_related=(), only=()):
+        self.select_related = tuple(select_related)
+        self.only = tuple(only)
+
+    def apply(self, queryset):
+        """Appliquer le plan à un queryset"""
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.only:
+            # Une relation jointe ne peut pas être différée
+            queryset = queryset.only(*self.select_related, *self.only)
+        return queryset
+
+
+class QueryPlanMixin:
+    """Mixin de ViewSet qui applique le plan déclaré pour l'action courante
+
+    ``query_plans`` associe un nom d'action à un ``QueryPlan``; la clé
+    ``'default'`` sert pour les actions non déclarées.
+    """
+    query_plans = {}
+
+    def get_query_plan(self):
+        plan = self.query_plans.get(self.action)
+        if plan is None:
+            plan = self.query_plans.get('default')
+        return plan
+
+    def plan_queryset(self, queryset):
+        """Appliquer le plan de l'action courante à ``queryset``"""
+        plan = self.get_query_plan()
+        if plan is None:
+            return queryset
+        return plan.apply(queryset)
@@ -0,0 +1,62 @@
+"""Rendu et lecture JSON avec orjson, et repli sur la bibliothèque standard.
+
+orjson encode directement les dictionnaires, listes, dates et UUID en C ;
+les autres types (Decimal, chaînes paresseuses, querysets...) passent par
+l'encodeur de DRF, si bien que la sortie est la même qu'avec le
+``JSONRenderer`` d'origine : JSON compact en UTF-8, dates ISO 8601 avec
+``Z`` pour UTC. Sans orjson installé, tout retombe sur ``json``.
+"""
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    orjson = None
+
+_drf_encoder = encoders.JSONEncoder()
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(data):
+    """Encoder ``data`` en JSON compact (bytes UTF-8), comme le JSONRenderer de DRF"""
+    if orjson is None:
+        return JSONRenderer().render(data)
+    output = orjson.dumps(data, default=_drf_encoder.default, option=ORJSON_OPTIONS)
+    # Comme DRF : U+2028 / U+2029 échappés pour pouvoir être inclus en JavaScript
+    if b'\xe2\x80\xa8' in output or b'\xe2\x80\xa9' in output:
+        output = output.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return output
+
+
+class FastJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` servi par orjson
+
+    Une indentation demandée (``Accept: application/json; indent=4``) passe
+    par le rendu d'origine.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class FastJSONParser(JSONParser):
+    """``JSONParser`` servi par orjson (corps en UTF-8 seulement)"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read() if stream is not None else b'')
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
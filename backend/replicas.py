@@ -0,0 +1,199 @@
+"""Lectures sur les réplicas (``READ_REPLICAS``), avec repli sur le primaire
+après une écriture de l'utilisateur ou quand le réplica est en retard."""
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+# Base de lecture de la requête en cours (None : pas de routage)
+_read_alias = ContextVar('read_alias', default=None)
+# Écritures de la requête en cours (liste fournie par le middleware)
+_writes = ContextVar('writes', default=None)
+# Alias -> (vérifié à, utilisable)
+_health = {}
+# Caches propres à chaque processus : un épinglage n'y serait pas vu des autres
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def replica_aliases():
+    return list(getattr(settings, 'READ_REPLICAS', ()))
+
+
+def _pin_key(user_id):
+    return f'replicas:pin:{user_id}'
+
+
+def check_pin_cache():
+    """Refuser un cache ``default`` propre au processus quand il y a des réplicas"""
+    if replica_aliases() and settings.CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHES:
+        raise ImproperlyConfigured(
+            'READ_REPLICAS demande un cache default partagé entre processus '
+            '(CACHE_BACKEND : Redis, Memcached, fichiers ou base).'
+        )
+
+
+def pin_to_primary(user):
+    """Lire sur le primaire pendant ``REPLICA_PIN_SECONDS``"""
+    cache.set(_pin_key(user.pk), True, getattr(settings, 'REPLICA_PIN_SECONDS', 10))
+
+
+def is_pinned(user):
+    return bool(user and user.is_authenticated and cache.get(_pin_key(user.pk)))
+
+
+def replica_lag(alias):
+    """Retard du réplica en secondes, None si la base ne le mesure pas"""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        connection.ensure_connection()
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())'
+        )
+        lag = cursor.fetchone()[0]
+    return float(lag) if lag is not None else None
+
+
+def replica_usable(alias):
+    """Joignable et pas trop en retard (vérifié par intervalles)"""
+    now = time.monotonic()
+    checked = _health.get(alias)
+    if checked is not None and now - checked[0] < getattr(settings, 'REPLICA_CHECK_INTERVAL', 5):
+        return checked[1]
+    try:
+        lag = replica_lag(alias)
+        usable = lag is None or lag <= getattr(settings, 'REPLICA_MAX_LAG', 5)
+    except DatabaseError:
+        usable = False
+    _health[alias] = (now, usable)
+    return usable
+
+
+def choose_replica():
+    """Un réplica utilisable au hasard, None s'il n'y en a aucun"""
+    usable = [alias for alias in replica_aliases() if replica_usable(alias)]
+    return random.choice(usable) if usable else None
+
+
+class ReplicaRouter:
+    """Lectures sur le réplica choisi pour la requête, écritures sur ``default``"""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        writes = _writes.get()
+        if writes is not None:
+            writes.append(model._meta.label)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Mêmes données partout
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class ReplicaPinMiddleware:
+    """Épingler au primaire l'utilisateur dont la requête a écrit
+
+    À placer après ``AuthenticationMiddleware`` ; l'utilisateur authentifié
+    par DRF (JWT) est lu après la vue.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        check_pin_cache()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not replica_aliases():
+            return self.get_response(request)
+        writes = []
+        writes_token = _writes.set(writes)
+        # Rien ne doit fuir d'une requête à l'autre sur le même thread
+        read_token = _read_alias.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(read_token)
+            _writes.reset(writes_token)
+        if writes:
+            self._pin(request)
+        return response
+
+    async def __acall__(self, request):
+        if not replica_aliases():
+            return await self.get_response(request)
+        # Liste partagée avec les contextes copiés par sync_to_async
+        writes = []
+        writes_token = _writes.set(writes)
+        read_token = _read_alias.set(None)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _read_alias.reset(read_token)
+            _writes.reset(writes_token)
+        if writes:
+            # request.user peut encore être la session paresseuse de Django
+            await sync_to_async(self._pin)(request)
+        return response
+
+    def _pin(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            pin_to_primary(user)
+
+
+class ReplicaReadMixin:
+    """Mixin de ViewSet : actions de lecture servies par un réplica
+
+    ``replica_actions`` liste les actions concernées (toutes si None).
+    Les querysets filtrés (liste, détail, export en flux) restent liés au
+    réplica même s'ils sont évalués après la vue.
+    """
+    replica_actions = None
+    read_alias = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            request.method in SAFE_METHODS
+            and (self.replica_actions is None or self.action in self.replica_actions)
+            and replica_aliases()
+            and not is_pinned(request.user)
+        ):
+            self.read_alias = choose_replica()
+        if self.read_alias is not None:
+            _read_alias.set(self.read_alias)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.read_alias is not None:
+            queryset = queryset.using(self.read_alias)
+        return queryset
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Pas de ContextVar.reset : sous une vue asynchrone, initial() a
+        # tourné dans un autre contexte (sync_to_async) que celui-ci
+        if self.read_alias is not None:
+            _read_alias.set(None)
+        return super().finalize_response(request, response, *args, **kwargs)
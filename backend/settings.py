@@ -1,6 +1,8 @@
+import copy
 import os
+import sys
 from pathlib import Path
-from decouple import config # type: ignore
+from decouple import Csv, config # type: ignore
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -29,17 +31,40 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # En tête : la latence mesurée couvre tous les autres middlewares
+    'backend.metrics.RequestMetricsMiddleware',
+    'backend.nplusone.NPlusOneMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'backend.replicas.ReplicaPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Mesures Prometheus (/metrics) : jeton Bearer s'il est défini, staff sinon.
+# Sous gunicorn multi-processus, définir PROMETHEUS_MULTIPROC_DIR pour agréger.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Suite de tests : TESTING=True dans l'environnement (CI), sinon déduit de
+# ``manage.py test`` / ``django-admin test`` ou d'une exécution sous pytest
+TESTING = config(
+    'TESTING', default=sys.argv[1:2] == ['test'] or 'pytest' in sys.modules, cast=bool
+)
+# Détection des N+1 (backend/nplusone.py) : erreur sous les tests,
+# avertissement journalisé sur une fraction des requêtes sinon
+NPLUSONE_MODE = config('NPLUSONE_MODE', default='raise' if TESTING else 'log')
+NPLUSONE_SAMPLE_RATE = config('NPLUSONE_SAMPLE_RATE', default=0.01, cast=float)
+NPLUSONE_THRESHOLD = config('NPLUSONE_THRESHOLD', default=2, cast=int)
+
+# Déploiement ASGI (uvicorn, voir backend/asgi.py) : lectures les plus
+# fréquentes servies par des actions asynchrones (backend/async_views.py)
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -60,13 +85,97 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
-# Base de données
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Base de données : SQLite (un seul serveur) ou PostgreSQL, selon le .env
+DATABASE_ENGINE = config('DATABASE_ENGINE', default='sqlite')
+
+if DATABASE_ENGINE == 'postgresql':
+    # pip install "psycopg[binary,pool]"
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DATABASE_NAME', default='libratech'),
+            'USER': config('DATABASE_USER', default='libratech'),
+            'PASSWORD': config('DATABASE_PASSWORD', default=''),
+            'HOST': config('DATABASE_HOST', default='127.0.0.1'),
+            'PORT': config('DATABASE_PORT', default='5432'),
+            # Connexion vérifiée avant réutilisation (serveur redémarré, coupure réseau)
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
     }
-}
+    if config('DATABASE_POOL', default=True, cast=bool):
+        # Pool psycopg 3 par processus ; exclut les connexions persistantes
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': config('DATABASE_POOL_MIN_SIZE', default=2, cast=int),
+            'max_size': config('DATABASE_POOL_MAX_SIZE', default=10, cast=int),
+            'timeout': config('DATABASE_POOL_TIMEOUT', default=10, cast=int),
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = config('DATABASE_CONN_MAX_AGE', default=60, cast=int)
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DATABASE_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'CONN_MAX_AGE': config('DATABASE_CONN_MAX_AGE', default=0, cast=int),
+            'OPTIONS': {},
+        }
+    }
+    # Réglage à activer (SQLITE_TUNED=True) hors de la base de développement
+    # suivie par git : WAL y laisserait des fichiers -wal et -shm
+    if config('SQLITE_TUNED', default=False, cast=bool):
+        # WAL : les lectures ne bloquent plus l'écriture en cours ; IMMEDIATE :
+        # le verrou d'écriture est pris dès BEGIN, les transactions concurrentes
+        # attendent (busy_timeout) au lieu d'échouer sur « database is locked »
+        DATABASES['default']['OPTIONS'] = {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': config('SQLITE_BUSY_TIMEOUT', default=5, cast=int),
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                f"PRAGMA mmap_size={config('SQLITE_MMAP_SIZE', default=134217728, cast=int)};"
+                'PRAGMA temp_store=MEMORY;'
+            ),
+        }
+
+# Réplicas en lecture (backend/replicas.py) : fichiers SQLite ou hôtes
+# PostgreSQL, par exemple DATABASE_REPLICAS=replica.sqlite3 (copie de
+# db.sqlite3) avec CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+for index, location in enumerate(config('DATABASE_REPLICAS', default='', cast=Csv()), start=1):
+    replica = copy.deepcopy(DATABASES['default'])
+    replica['HOST' if DATABASE_ENGINE == 'postgresql' else 'NAME'] = location
+    replica['TEST'] = {'MIRROR': 'default'}
+    DATABASES[f'replica{index}'] = replica
+READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+if TESTING:
+    # Un réplica miroir pour les tests du routage, qui l'activent eux-mêmes
+    DATABASES.setdefault('replica1', {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}})
+    READ_REPLICAS = []
+DATABASE_ROUTERS = ['backend.replicas.ReplicaRouter']
+# Lire ses propres écritures : primaire pendant N secondes après une écriture
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+REPLICA_MAX_LAG = config('REPLICA_MAX_LAG', default=5, cast=float)
+REPLICA_CHECK_INTERVAL = config('REPLICA_CHECK_INTERVAL', default=5, cast=float)
+
+# Hachage des mots de passe (users/hashers.py) : Argon2id réglé par le
+# .env, mesuré avec ``python -m benchmarks.login`` ; les hashs PBKDF2
+# existants sont convertis à la connexion suivante
+PASSWORD_HASHERS = [
+    'users.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+# Recommandation OWASP par défaut : 19 Mio, 2 passes, 1 voie (un cœur par hachage)
+ARGON2_TIME_COST = config('ARGON2_TIME_COST', default=2, cast=int)
+ARGON2_MEMORY_COST = config('ARGON2_MEMORY_COST', default=19456, cast=int)
+ARGON2_PARALLELISM = config('ARGON2_PARALLELISM', default=1, cast=int)
+if TESTING:
+    # Hachages quasi gratuits pour la suite de tests
+    ARGON2_TIME_COST, ARGON2_MEMORY_COST = 1, 64
+# Hachages simultanés par processus (0 : nombre de cœurs)
+PASSWORD_HASH_CONCURRENCY = config('PASSWORD_HASH_CONCURRENCY', default=0, cast=int)
 
 # Validation des mots de passe
 AUTH_PASSWORD_VALIDATORS = [
@@ -87,25 +196,55 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Caches : ``catalogue`` garde les réponses publiques du catalogue
+# (mémoire locale par défaut ; fichiers ou Redis via le .env, par exemple
+# django.core.cache.backends.redis.RedisCache + redis://127.0.0.1:6379/1).
+# ``default`` doit être partagé entre processus avec READ_REPLICAS.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    },
+    'catalogue': {
+        'BACKEND': config(
+            'CATALOGUE_CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': config('CATALOGUE_CACHE_LOCATION', default='catalogue'),
+        'TIMEOUT': config('CATALOGUE_CACHE_TIMEOUT', default=300, cast=int),
+    },
+}
+
 # Configuration du modèle utilisateur personnalisé
 AUTH_USER_MODEL = 'users.CustomUser'
+# Connexion à l'API par email, à l'admin par nom d'utilisateur
+AUTHENTICATION_BACKENDS = [
+    'users.backends.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
 
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Lectures sans requête utilisateur (claims du jeton), écritures vérifiées en base
+        'users.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'backend.pagination.OptInCursorPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_FILTER_BACKENDS': [
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',  # seulement JSON
+        'backend.renderers.FastJSONRenderer',  # seulement JSON (orjson)
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'backend.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ),
 }
 
@@ -118,6 +257,8 @@ SIMPLE_JWT = {
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
 }
+# Utilisateurs désactivés ou modifiés dont les jetons repassent par la base
+JWT_REVOKED_USERS_SIZE = config('JWT_REVOKED_USERS_SIZE', default=10000, cast=int)
 
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = [
@@ -0,0 +1,224 @@
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from backend.nplusone import NPlusOneError, query_shape
+from books.tests import create_book
+from loans.models import Loan
+from loans.serializers import LoanListSerializer, LoanSerializer
+from loans.tests import create_loan
+
+User = get_user_model()
+
+
+class NPlusOneTests(APITestCase):
+    """Une relation lue ligne par ligne fait échouer la requête sous les tests"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='lecteur', email='lecteur@example.com')
+        self.client.force_authenticate(self.user)
+        for index in range(3):
+            create_loan(self.user, create_book(index))
+
+    def without_plans(self):
+        from loans.views import LoanViewSet
+
+        return mock.patch.multiple(LoanViewSet, query_plans={}, read_serializer_class=None)
+
+    def test_query_shape(self):
+        self.assertEqual(
+            query_shape('SELECT * FROM "t"\n WHERE "id" IN (%s, %s,%s) AND "a" = %s'),
+            'SELECT * FROM "t" WHERE "id" IN (%s) AND "a" = %s',
+        )
+
+    def test_raises_with_serializer_field(self):
+        # Levée sans avertissement en double
+        with self.without_plans(), self.assertNoLogs('backend.nplusone'), \
+                self.assertRaises(NPlusOneError) as raised:
+            self.client.get('/api/loans/my_loans/')
+        message = str(raised.exception)
+        self.assertIn('GET loan-my-loans (my_loans)', message)
+        self.assertIn('LoanSerializer.user_username', message)
+
+    def test_repeated_writes_are_not_counted(self):
+        # Un, deux et trois exemplaires rendus : un UPDATE de même forme par nombre
+        loans = []
+        for index, count in enumerate((1, 2, 3), start=10):
+            book = create_book(index, total_copies=3, available_copies=3)
+            loans += [create_loan(self.user, book).pk for _ in range(count)]
+        response = self.client.post('/api/loans/bulk_return/', {'loans': loans}, format='json')
+        self.assertEqual(response.data['succeeded'], 6)
+
+    @override_settings(NPLUSONE_MODE='log', NPLUSONE_SAMPLE_RATE=1.0)
+    def test_logs_when_sampled(self):
+        with self.without_plans(), self.assertLogs('backend.nplusone', 'WARNING') as logs:
+            response = self.client.get('/api/loans/my_loans/')
+        self.assertEqual(response.status_code, 200)
+        # Un avertissement par relation : utilisateur et livre
+        self.assertEqual(len(logs.output), 2)
+        self.assertIn('LoanSerializer.user_username', logs.output[0])
+        self.assertIn('LoanSerializer.book_title', logs.output[1])
+
+    @override_settings(NPLUSONE_MODE='log', NPLUSONE_SAMPLE_RATE=0.0)
+    def test_not_sampled(self):
+        with self.without_plans(), self.assertNoLogs('backend.nplusone'):
+            self.client.get('/api/loans/my_loans/')
+
+
+class JSONRenderingTests(APITestCase):
+    """FastJSONRenderer / FastJSONParser : même JSON que DRF"""
+
+    def test_same_bytes_as_drf(self):
+        from decimal import Decimal
+        from django.utils.translation import gettext_lazy
+        from rest_framework.renderers import JSONRenderer
+        from backend.renderers import FastJSONRenderer
+
+        user = User.objects.create_user(username='lecteur', email='lecteur@example.com')
+        create_loan(user, create_book(0, title='Les Misérables\u2028'))
+        data = {
+            'results': LoanSerializer(Loan.objects.with_derived(), many=True).data,
+            'now': timezone.now(),
+            'price': Decimal('12.50'),
+            'detail': gettext_lazy('Not found.'),
+            1: 'clé entière',
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_parser(self):
+        user = User.objects.create_user(username='lecteur', email='lecteur@example.com')
+        self.client.force_authenticate(user)
+        response = self.client.post(
+            '/api/loans/bulk_return/', b'{"loans": [999]}', content_type='application/json'
+        )
+        self.assertEqual(response.data['results'][0]['detail'], 'Emprunt introuvable.')
+        response = self.client.post(
+            '/api/loans/bulk_return/', b'{"loans": [', content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class RequestMetricsTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='lecteur', email='lecteur@example.com')
+        self.client.force_authenticate(self.user)
+        create_loan(self.user, create_book(0))
+
+    @override_settings(DEBUG=True)
+    def test_server_timing_in_debug(self):
+        response = self.client.get('/api/loans/my_loans/')
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn('serialize;dur=', timing)
+        self.assertIn('render;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_metrics_by_route_and_action(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/loans/my_loans/'))
+        self.client.force_login(User.objects.create_user(
+            username='admin', email='admin@example.com', is_staff=True
+        ))
+        body = self.client.get('/metrics/').content.decode()
+        labels = 'action="my_loans",method="GET",route="loan-my-loans"'
+        self.assertIn(f'libratech_db_queries_per_request_count{{{labels}}}', body)
+        self.assertIn(f'libratech_serialize_duration_seconds_sum{{{labels}}}', body)
+        self.assertIn(f'libratech_render_duration_seconds_sum{{{labels}}}', body)
+        self.assertIn(f'libratech_response_size_bytes_count{{{labels}}}', body)
+        self.assertIn(f'libratech_request_duration_seconds_count{{{labels},status="200"}}', body)
+
+    async def test_async_middleware_chain(self):
+        # Chaîne de middlewares asynchrone (ASGI) : requêtes SQL toujours comptées
+        from prometheus_client import REGISTRY
+        from users.serializers import CustomTokenObtainPairSerializer
+
+        labels = {'route': 'loan-my-loans', 'action': 'my_loans', 'method': 'GET'}
+        before = REGISTRY.get_sample_value('libratech_db_queries_per_request_sum', labels) or 0
+        access = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        response = await self.async_client.get(
+            '/api/loans/my_loans/', headers={'Authorization': f'Bearer {access}'}
+        )
+        self.assertEqual(response.status_code, 200)
+        after = REGISTRY.get_sample_value('libratech_db_queries_per_request_sum', labels)
+        self.assertEqual(after - before, 2)
+
+    def test_metrics_staff_only_without_token(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+
+    @override_settings(DEBUG=True)
+    def test_serialization_timed_apart_from_rendering(self):
+        serialize = LoanListSerializer.serialize
+
+        def slow(reader, rows):
+            time.sleep(0.05)
+            return serialize(reader, rows)
+
+        with mock.patch.object(LoanListSerializer, 'serialize', slow):
+            response = self.client.get('/api/loans/my_loans/')
+        timing = dict(
+            entry.split(';desc')[0].split(';dur=') for entry in response['Server-Timing'].split(', ')
+        )
+        self.assertGreaterEqual(float(timing['serialize']), 50)
+        self.assertLess(float(timing['render']), 50)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        response = self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+
+class SweepStatusesTests(APITestCase):
+    """Balayage des statuts temporels"""
+
+    def test_sweep(self):
+        from reservations.models import Reservation
+
+        user = User.objects.create_user(username='lecteur', email='lecteur@example.com')
+        past = timezone.now() - timedelta(days=1)
+        late = create_loan(user, create_book(0), due_date=past)
+        on_time = create_loan(user, create_book(1))
+
+        book = create_book(2)
+        readers = [
+            User.objects.create_user(username=f'file{index}', email=f'file{index}@example.com')
+            for index in range(4)
+        ]
+        future = timezone.now() + timedelta(days=7)
+        held = Reservation.objects.create(user=readers[0], book=book, pickup_deadline=future)
+        lapsed = Reservation.objects.create(user=readers[1], book=book, pickup_deadline=past)
+        waiting = [
+            Reservation.objects.create(user=reader, book=book, pickup_deadline=future)
+            for reader in readers[2:]
+        ]
+        held.mark_as_ready()
+        Reservation.objects.filter(pk=held.pk).update(pickup_deadline=past)
+
+        out = StringIO()
+        # Dont le décompte des réservations qui quittent la file et la mise
+        # à jour de sa longueur sur le livre
+        with self.assertNumQueries(11):
+            call_command('sweep_statuses', stdout=out)
+        self.assertIn('1 emprunts en retard, 2 réservations expirées, 1 promues', out.getvalue())
+
+        self.assertEqual(Loan.objects.get(pk=late.pk).status, 'overdue')
+        self.assertEqual(Loan.objects.get(pk=on_time.pk).status, 'active')
+        self.assertEqual(
+            list(Reservation.objects.order_by('id').values_list('status', 'position_in_queue')),
+            [('expired', 1), ('expired', 1), ('ready', 2), ('pending', 1)]
+        )
+        self.assertTrue(Reservation.objects.get(pk=lapsed.pk).is_expired)
+
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/loans/overdue_loans/')
+        self.assertEqual([loan['id'] for loan in response.data['results']], [late.pk])
+        self.assertTrue(response.data['results'][0]['is_overdue'])
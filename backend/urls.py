@@ -6,6 +6,7 @@ from books.views import BookViewSet
 from loans.views import LoanViewSet
 from reservations.views import ReservationViewSet  # Correction: ajouter .views
 from rest_framework_simplejwt.views import TokenRefreshView
+from backend.metrics import metrics_view
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet)
@@ -20,4 +21,5 @@ urlpatterns = [
     path('api/auth/login/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api-auth/', include('rest_framework.urls')),
+    path('metrics/', metrics_view, name='metrics'),
 ]
\ No newline at end of file
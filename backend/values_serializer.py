@@ -0,0 +1,75 @@
+"""Sérialisation rapide des listes, à partir de lignes ``.values()``.
+
+Pour une page de liste, un ``ModelSerializer`` instancie chaque modèle
+puis parcourt ses champs un à un (``to_representation``, ``source``
+pointé, ``SerializerMethodField``...). Un ``ValuesSerializer`` lit
+directement les dictionnaires de ``.values()`` et construit la sortie
+dans une seule méthode écrite pour le modèle, avec les conversions
+préparées une fois ; les champs dérivés arrivent déjà calculés par les
+annotations du queryset (voir ``backend.annotations``).
+
+La sortie doit rester identique, clé pour clé, à celle du
+``ModelSerializer`` correspondant (voir les tests de chaque application).
+"""
+from django.utils import timezone
+from rest_framework.response import Response
+
+
+class ValuesSerializer:
+    """Sérialiseur en lecture seule de lignes ``.values(*columns)``
+
+    Les sous-classes déclarent ``columns`` et écrivent ``to_representation``.
+    """
+    columns = ()
+
+    def __init__(self):
+        self._timezone = timezone.get_current_timezone()
+
+    def datetime(self, value):
+        """Même rendu que ``serializers.DateTimeField`` (ISO 8601, ``Z`` pour UTC)"""
+        if value is None:
+            return None
+        value = timezone.localtime(value, self._timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    def to_representation(self, row):
+        raise NotImplementedError
+
+    def serialize(self, rows):
+        to_representation = self.to_representation
+        return [to_representation(row) for row in rows]
+
+
+class ValuesListMixin:
+    """Mixin de ViewSet : listes sérialisées par ``read_serializer_class``
+
+    Remplace ``list_page`` et ``alist_page`` (voir ``ConditionalGetMixin``) ; à placer avant
+    lui dans les bases du ViewSet. Sans ``read_serializer_class``, les listes
+    passent par le serializer habituel.
+    """
+    read_serializer_class = None
+
+    def get_read_serializer(self):
+        return self.read_serializer_class()
+
+    def list_page(self, queryset):
+        if self.read_serializer_class is None:
+            return super().list_page(queryset)
+        reader = self.get_read_serializer()
+        rows = queryset.values(*reader.columns)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(reader.serialize(page))
+        return Response(reader.serialize(rows))
+
+    async def alist_page(self, queryset):
+        if self.read_serializer_class is None:
+            return await super().alist_page(queryset)
+        reader = self.get_read_serializer()
+        rows = queryset.values(*reader.columns)
+        page = await self.apaginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(reader.serialize(page))
+        return Response(reader.serialize([row async for row in rows.aiterator()]))
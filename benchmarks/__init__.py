@@ -0,0 +1,10 @@
+"""Benchmarks de performance.
+
+Chaque module se lance depuis la racine du projet, par exemple :
+
+    python -m benchmarks.checkout_concurrency --copies 5 --workers 50
+
+Les benchmarks tournent sur une base jetable créée et migrée pour
+l'occasion (voir ``benchmarks.utils``) : la base de développement n'est
+jamais touchée.
+"""
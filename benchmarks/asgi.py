@@ -0,0 +1,164 @@
+"""Lectures servies en WSGI (gunicorn gthread) puis en ASGI (uvicorn).
+
+    python -m benchmarks.asgi --concurrency 200 --seconds 15
+    python -m benchmarks.asgi --workers 2 --mode asgi
+
+Une base jetable est remplie par ``benchmarks.seed``, puis chaque mode
+démarre gunicorn avec ``gunicorn.conf.py`` (même nombre de processus,
+``DEBUG`` désactivé) sur cette base. ``--concurrency`` clients HTTP
+(asyncio + httpx) enchaînent pendant ``--seconds`` secondes les lectures
+servies par des actions asynchrones en ASGI : catalogue, file de
+réservation d'un livre très demandé, emprunts du lecteur et profil.
+Débit, latences p50/p95/p99 et erreurs sont rapportés par mode.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.utils import benchmark_database, setup_django
+
+MODES = ('wsgi', 'asgi')
+POPULAR_BOOKS = 50
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def requests_to_send(data, rng):
+    """Chemins et jetons des lectures, tirés au hasard à chaque requête"""
+    while True:
+        token = rng.choice(data['tokens'])
+        kind = rng.randrange(4)
+        if kind == 0:
+            yield f"/api/books/?page={rng.randrange(1, 20)}", None
+        elif kind == 1:
+            yield f"/api/reservations/queue_status/?book_id={rng.choice(data['books'])}", None
+        elif kind == 2:
+            yield '/api/loans/my_loans/', token
+        else:
+            yield '/api/users/profile/', token
+
+
+def start_server(mode, args, database):
+    env = dict(
+        os.environ,
+        SERVER_MODE=mode,
+        WEB_CONCURRENCY=str(args.workers),
+        BIND=f'127.0.0.1:{args.port}',
+        DEBUG='False',
+        DATABASE_NAME=database,
+    )
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--log-level', 'warning'],
+        cwd=ROOT, env=env,
+    )
+
+
+async def wait_until_ready(client, server, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'gunicorn arrêté (code {server.returncode})')
+        try:
+            await client.get('/api/books/')
+            return
+        except Exception:
+            await asyncio.sleep(0.2)
+    raise RuntimeError('gunicorn ne répond pas')
+
+
+async def load(args, data):
+    import httpx
+
+    timings = []
+    errors = 0
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=f'http://127.0.0.1:{args.port}', limits=limits, timeout=30
+    ) as client:
+        await wait_until_ready(client, data['server'])
+        stop = time.perf_counter() + args.seconds
+
+        async def reader(index):
+            nonlocal errors
+            for path, token in requests_to_send(data, random.Random(index)):
+                if time.perf_counter() >= stop:
+                    return
+                headers = {'Authorization': f'Bearer {token}'} if token else {}
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path, headers=headers)
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    timings.append((time.perf_counter() - started) * 1000)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(reader(index) for index in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+    return timings, errors, elapsed
+
+
+def run(args):
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+
+    from benchmarks.seed import seed
+    from users.serializers import CustomTokenObtainPairSerializer
+
+    seeded = seed(users=args.users)
+    users = get_user_model().objects.order_by('?')[:args.readers]
+    data = {
+        'tokens': [str(CustomTokenObtainPairSerializer.get_token(user).access_token) for user in users],
+        'books': list(range(seeded['popular_book_id'], seeded['popular_book_id'] + POPULAR_BOOKS)),
+    }
+    database = connection.settings_dict['NAME']
+    # Les serveurs ouvrent leurs propres connexions sur la même base
+    connection.close()
+
+    print(f'{args.workers} processus, {args.concurrency} clients, {args.seconds} s par mode')
+    print(f"{'mode':<6} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'erreurs':>8}")
+    for mode in args.mode or MODES:
+        server = start_server(mode, args, database)
+        try:
+            timings, errors, elapsed = asyncio.run(load(args, dict(data, server=server)))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        if len(timings) < 2:
+            print(f'{mode:<6} {"-":>8} {"-":>9} {"-":>9} {"-":>9} {errors:>8}')
+            continue
+        percentiles = statistics.quantiles(timings, n=100, method='inclusive')
+        print(
+            f'{mode:<6} {len(timings) / elapsed:>8.0f} {statistics.median(timings):>9.1f} '
+            f'{percentiles[94]:>9.1f} {percentiles[98]:>9.1f} {errors:>8}'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=MODES, action='append',
+                        help='Mode à mesurer (par défaut les deux)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Processus gunicorn, identique pour les deux modes')
+    parser.add_argument('--concurrency', type=int, default=100, help='Clients simultanés')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--readers', type=int, default=100, help='Lecteurs connectés (JWT)')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
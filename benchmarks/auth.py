@@ -0,0 +1,65 @@
+"""Authentification JWT : utilisateur relu en base ou reconstruit depuis les claims.
+
+    python -m benchmarks.auth --repeat 200
+
+Pour ``my_loans`` et ``profile``, avec un vrai jeton d'accès : nombre de
+requêtes SQL et latence médiane avec ``JWTAuthentication`` (simplejwt)
+puis ``ClaimsJWTAuthentication``.
+"""
+import argparse
+from unittest import mock
+
+from benchmarks.serializers import median_ms
+from benchmarks.utils import benchmark_database, setup_django
+
+
+def run(args):
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIClient
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+
+    from benchmarks.seed import seed
+    from loans.views import LoanViewSet
+    from users.authentication import ClaimsJWTAuthentication
+    from users.serializers import CustomTokenObtainPairSerializer
+    from users.views import UserViewSet
+
+    context = seed(users=200, books=500, loans=args.loans, reservations=0)
+    reader = context['reader']
+    # Même jeton que /api/auth/login/ (claims compris)
+    access = CustomTokenObtainPairSerializer.get_token(reader).access_token
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    print(f"{'endpoint':<10} {'authentification':<24} {'requêtes':>9} {'médiane (ms)':>13}")
+    for url in ('/api/loans/my_loans/', '/api/users/profile/'):
+        for authentication in (JWTAuthentication, ClaimsJWTAuthentication):
+            with mock.patch.object(LoanViewSet, 'authentication_classes', [authentication]), \
+                    mock.patch.object(UserViewSet, 'authentication_classes', [authentication]):
+                # Journal des requêtes plein après le seed (DEBUG)
+                reset_queries()
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url)
+                assert response.status_code == 200, (url, response.status_code)
+                latency = median_ms(lambda: client.get(url), args.repeat)
+            name = url.rstrip('/').rsplit('/', 1)[-1]
+            print(
+                f'{name:<10} {authentication.__name__:<24} '
+                f'{len(queries.captured_queries):>9} {latency:>13.2f}'
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--loans', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
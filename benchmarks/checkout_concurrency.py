@@ -0,0 +1,72 @@
+"""N emprunts simultanés sur un livre à M exemplaires : exactement M réussissent.
+
+    python -m benchmarks.checkout_concurrency --copies 5 --workers 50
+"""
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.utils import benchmark_database, setup_django
+
+
+def run(copies, workers):
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+
+    from books.models import Book
+    from loans.models import Loan
+
+    User = get_user_model()
+    book = Book.objects.create(
+        title='Livre très demandé', author='Auteur', isbn='9780000000001',
+        pages=100, publication_year=2020, category='Roman',
+        total_copies=copies, available_copies=copies,
+    )
+    User.objects.bulk_create([
+        User(username=f'bench{index}', email=f'bench{index}@example.com')
+        for index in range(workers)
+    ])
+    users = list(User.objects.filter(username__startswith='bench'))
+    barrier = threading.Barrier(len(users))
+
+    def attempt(user):
+        barrier.wait()
+        try:
+            return Loan.objects.checkout(user, book.pk) is not None
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(users)) as pool:
+        results = list(pool.map(attempt, users))
+    elapsed = time.perf_counter() - started
+
+    book.refresh_from_db()
+    succeeded = sum(results)
+    loans = Loan.objects.filter(book=book).count()
+    print(f'{workers} emprunts simultanés sur {copies} exemplaires ({connection.vendor})')
+    print(f'  réussis           : {succeeded}')
+    print(f'  refusés           : {len(results) - succeeded}')
+    print(f'  emprunts en base  : {loans}')
+    print(f'  exemplaires dispo : {book.available_copies} (statut {book.status})')
+    print(f'  durée             : {elapsed * 1000:.1f} ms')
+    return succeeded == loans == copies and book.available_copies == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--copies', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        ok = run(args.copies, args.workers)
+    print('OK' if ok else 'ÉCHEC : le nombre d\'emprunts ne correspond pas aux exemplaires')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,352 @@
+"""Charge sur l'API : parcours de lecteurs, latences p50/p95/p99 et débit.
+
+    python -m benchmarks.load --workers 4 --iterations 50 --output run.json
+    python -m benchmarks.load --baseline baseline.json      # comparer
+    python -m benchmarks.load --save-baseline baseline.json  # référence
+
+Chaque worker est un lecteur qui enchaîne, à chaque itération, les
+scénarios demandés : connexion (JWT), recherche dans le catalogue,
+emprunt, renouvellement, retour, réservation d'un livre très demandé,
+annulation. L'emprunt, le renouvellement et le retour portent sur le même
+emprunt ; l'annulation sur la réservation qui vient d'être faite.
+
+Par défaut, les requêtes passent par le client de test de Django, sur une
+base jetable remplie par ``benchmarks.seed``. Avec ``--url``, elles
+partent en HTTP vers un serveur déjà lancé, dont la base a été remplie
+avec ``--seed-only`` (même réglage ``DATABASES`` que ce script).
+
+Comparée à une référence, une exécution échoue (code de sortie 1) si le
+p95 d'un scénario dépasse celui de la référence de plus de
+``--tolerance``.
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from benchmarks.utils import benchmark_database, setup_django
+
+SCENARIOS = ('login', 'search', 'checkout', 'renew', 'return', 'reserve', 'cancel')
+# Livres de tête (Zipf) : les files de réservation les plus longues
+POPULAR_BOOKS = 50
+
+
+def _json(content_type, content):
+    """Corps JSON décodé ; ``None`` pour une page d'erreur HTML ou un corps vide"""
+    if not content or 'json' not in (content_type or ''):
+        return None
+    return json.loads(content)
+
+
+class ClientTransport:
+    """Requêtes servies en processus par le client de test de DRF"""
+
+    def __init__(self):
+        from rest_framework.test import APIClient
+
+        # Une erreur serveur compte comme un échec, comme en HTTP
+        self.client = APIClient(raise_request_exception=False)
+
+    def request(self, method, path, data=None, token=None):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        response = getattr(self.client, method)(path, data, format='json', **headers)
+        return response.status_code, _json(response.get('Content-Type'), response.content)
+
+    def close(self):
+        from django.db import connection
+
+        connection.close()
+
+
+class HTTPTransport:
+    """Requêtes HTTP vers un serveur lancé à part"""
+
+    def __init__(self, base_url):
+        import requests
+
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def request(self, method, path, data=None, token=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        if method == 'get':
+            response = self.session.get(self.base_url + path, params=data, headers=headers)
+        else:
+            response = self.session.request(
+                method.upper(), self.base_url + path, json=data, headers=headers
+            )
+        return response.status_code, _json(response.headers.get('Content-Type'), response.content)
+
+    def close(self):
+        self.session.close()
+
+
+class Reader:
+    """Un lecteur simulé : jeton, emprunt et réservation en cours"""
+
+    def __init__(self, transport, account, password, book_ids, popular_ids, rng, recorder):
+        self.transport = transport
+        self.user_id, self.email = account
+        self.password = password
+        self.book_ids = book_ids
+        self.popular_ids = popular_ids
+        self.rng = rng
+        self.recorder = recorder
+        self.token = None
+        self.loan_id = None
+        self.reservation_id = None
+        self.reserved = set()
+
+    def call(self, scenario, method, path, data=None, expected=(200,)):
+        started = time.perf_counter()
+        status, body = self.transport.request(method, path, data, self.token)
+        self.recorder.record(scenario, time.perf_counter() - started, status in expected)
+        return body if status in expected else None
+
+    def login(self):
+        # Connexion par email (voir CustomTokenObtainPairSerializer)
+        body = self.call('login', 'post', '/api/auth/login/', {
+            'email': self.email, 'password': self.password,
+        })
+        if body is not None:
+            self.token = body['access']
+
+    def search(self):
+        from benchmarks.seed import TITLE_WORDS
+
+        self.call('search', 'get', '/api/books/', {'search': self.rng.choice(TITLE_WORDS)})
+
+    def checkout(self):
+        body = self.call(
+            'checkout', 'post', '/api/loans/',
+            {'user': self.user_id, 'book': self.rng.choice(self.book_ids)},
+            expected=(201,),
+        )
+        self.loan_id = body['id'] if body else None
+
+    def renew(self):
+        if self.loan_id is not None:
+            self.call('renew', 'post', f'/api/loans/{self.loan_id}/renew/')
+
+    def return_book(self):
+        if self.loan_id is not None:
+            self.call('return', 'post', f'/api/loans/{self.loan_id}/return_book/')
+            self.loan_id = None
+
+    def reserve(self):
+        from django.utils import timezone
+
+        # Une seule réservation par lecteur et par livre
+        candidates = [pk for pk in self.popular_ids if pk not in self.reserved]
+        if not candidates or self.token is None:
+            self.reservation_id = None
+            return
+        book_id = self.rng.choice(candidates)
+        self.reserved.add(book_id)
+        body = self.call('reserve', 'post', '/api/reservations/', {
+            'user': self.user_id,
+            'book': book_id,
+            'pickup_deadline': (timezone.now() + timedelta(days=7)).isoformat(),
+        }, expected=(201,))
+        self.reservation_id = body['id'] if body else None
+
+    def cancel(self):
+        if self.reservation_id is not None:
+            self.call('cancel', 'post', f'/api/reservations/{self.reservation_id}/cancel/')
+            self.reservation_id = None
+
+    def run(self, scenarios):
+        steps = {
+            'login': self.login, 'search': self.search, 'checkout': self.checkout,
+            'renew': self.renew, 'return': self.return_book,
+            'reserve': self.reserve, 'cancel': self.cancel,
+        }
+        if self.token is None and 'login' not in scenarios:
+            self.login()
+        for scenario in scenarios:
+            steps[scenario]()
+
+
+class Recorder:
+    """Latences et erreurs par scénario, partagées entre les workers"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, scenario, seconds, ok):
+        with self.lock:
+            self.timings[scenario].append(seconds * 1000)
+            if not ok:
+                self.errors[scenario] += 1
+
+
+def percentiles(timings):
+    """p50, p95 et p99 en millisecondes"""
+    if len(timings) == 1:
+        return timings * 3
+    cuts = statistics.quantiles(timings, n=100, method='inclusive')
+    return cuts[49], cuts[94], cuts[98]
+
+
+def summarize(recorder, elapsed, scenarios):
+    report = {}
+    for scenario in scenarios:
+        timings = recorder.timings.get(scenario)
+        if not timings:
+            continue
+        p50, p95, p99 = percentiles(timings)
+        report[scenario] = {
+            'requests': len(timings),
+            'errors': recorder.errors[scenario],
+            'p50_ms': round(p50, 2),
+            'p95_ms': round(p95, 2),
+            'p99_ms': round(p99, 2),
+            'throughput_rps': round(len(timings) / elapsed, 1),
+        }
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """Écarts de p95 avec la référence ; retourne les scénarios en régression"""
+    regressions = []
+    print(f"\n{'scénario':<10} {'p95 réf.':>10} {'p95':>10} {'écart':>8}")
+    for scenario, result in report.items():
+        reference = baseline.get(scenario)
+        if reference is None:
+            continue
+        ratio = result['p95_ms'] / reference['p95_ms'] if reference['p95_ms'] else 1.0
+        flag = ''
+        if ratio > 1 + tolerance:
+            regressions.append(scenario)
+            flag = '  RÉGRESSION'
+        print(
+            f"{scenario:<10} {reference['p95_ms']:>10.2f} {result['p95_ms']:>10.2f} "
+            f"{(ratio - 1) * 100:>+7.1f}%{flag}"
+        )
+    return regressions
+
+
+def run(args):
+    from django.contrib.auth import get_user_model
+
+    from benchmarks.seed import BENCHMARK_PASSWORD, seed
+    from books.models import Book
+
+    if args.url is None:
+        started = time.perf_counter()
+        seed(users=args.users, books=args.books, loans=args.loans,
+             reservations=args.reservations)
+        print(f'Jeu de données créé en {time.perf_counter() - started:.1f} s')
+
+    # Les lecteurs non membres du personnel, dans l'ordre du seed
+    accounts = list(
+        get_user_model().objects.filter(is_staff=False, username__startswith='lecteur')
+        .order_by('id').values_list('id', 'email')[:args.workers]
+    )
+    book_ids = list(Book.objects.order_by('id').values_list('id', flat=True))
+    popular_ids = book_ids[:POPULAR_BOOKS]
+    scenarios = [scenario for scenario in SCENARIOS if scenario in args.scenarios]
+    recorder = Recorder()
+
+    def worker(index):
+        transport = HTTPTransport(args.url) if args.url else ClientTransport()
+        reader = Reader(
+            transport, accounts[index], BENCHMARK_PASSWORD, book_ids, popular_ids,
+            random.Random(index), recorder,
+        )
+        try:
+            for _ in range(args.iterations):
+                reader.run(scenarios)
+        finally:
+            transport.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(accounts)) as pool:
+        list(pool.map(worker, range(len(accounts))))
+    elapsed = time.perf_counter() - started
+
+    report = summarize(recorder, elapsed, scenarios)
+    total = sum(result['requests'] for result in report.values())
+    target = args.url or 'client de test'
+    print(f'\n{len(accounts)} lecteurs x {args.iterations} itérations ({target})')
+    print(f"{'scénario':<10} {'requêtes':>9} {'erreurs':>8} {'p50 (ms)':>9} "
+          f"{'p95 (ms)':>9} {'p99 (ms)':>9} {'req/s':>8}")
+    for scenario, result in report.items():
+        print(
+            f"{scenario:<10} {result['requests']:>9} {result['errors']:>8} "
+            f"{result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+            f"{result['throughput_rps']:>8.1f}"
+        )
+    print(f'Total : {total} requêtes en {elapsed:.1f} s ({total / elapsed:.1f} req/s)')
+
+    parameters = {
+        'target': target, 'workers': len(accounts), 'iterations': args.iterations,
+        'users': args.users, 'books': args.books,
+        'loans': args.loans, 'reservations': args.reservations,
+    }
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(
+                {'parameters': parameters, 'scenarios': report},
+                file, ensure_ascii=False, indent=2,
+            )
+        print(f'Résultats écrits dans {path}')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        if baseline['parameters'] != parameters:
+            print(f"\nAttention : référence mesurée avec d'autres paramètres {baseline['parameters']}")
+        regressions = compare(report, baseline['scenarios'], args.tolerance)
+        if regressions:
+            print(f"\nÉCHEC : p95 en hausse de plus de {args.tolerance:.0%} ({', '.join(regressions)})")
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='Serveur à charger (http://127.0.0.1:8000) ; client de test sinon')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Lecteurs simultanés (SQLite sérialise les écritures)')
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--books', type=int, default=5000)
+    parser.add_argument('--loans', type=int, default=20000)
+    parser.add_argument('--reservations', type=int, default=5000)
+    parser.add_argument('--output', help='Écrire les résultats en JSON')
+    parser.add_argument('--baseline', help='Référence JSON à comparer')
+    parser.add_argument('--save-baseline', help='Enregistrer cette exécution comme référence')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Hausse de p95 tolérée (0.2 = 20 %%)')
+    parser.add_argument('--seed-only', action='store_true',
+                        help='Remplir la base configurée (pour --url) et sortir')
+    args = parser.parse_args()
+
+    setup_django()
+    if args.seed_only:
+        from benchmarks.seed import seed
+
+        seed(users=args.users, books=args.books, loans=args.loans,
+             reservations=args.reservations)
+        print('Base remplie.')
+        return
+    if args.url:
+        ok = run(args)
+    else:
+        with benchmark_database():
+            ok = run(args)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
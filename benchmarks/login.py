@@ -0,0 +1,119 @@
+"""Connexions par seconde et par cœur selon le hachage des mots de passe.
+
+    python -m benchmarks.login --workers 4 --logins 40
+    python -m benchmarks.login --argon2 2:19456:1 --argon2 3:65536:1
+
+Pour chaque configuration (PBKDF2 de Django, Argon2 de Django, Argon2 des
+settings et celles passées en ``--argon2 temps:mémoire_kio:voies``) :
+durée médiane d'une vérification de mot de passe, puis ``--workers``
+threads enchaînent ``--logins`` connexions sur ``/api/auth/login/``.
+Le débit est rapporté au nombre de cœurs du processus.
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.utils import benchmark_database, setup_django
+
+
+def configurations(args):
+    from django.conf import settings
+
+    pbkdf2 = ['django.contrib.auth.hashers.PBKDF2PasswordHasher']
+    tuned = ['users.hashers.Argon2PasswordHasher']
+    yield 'pbkdf2_sha256', {'PASSWORD_HASHERS': pbkdf2}
+    yield 'argon2 (Django)', {'PASSWORD_HASHERS': ['django.contrib.auth.hashers.Argon2PasswordHasher']}
+    current = (settings.ARGON2_TIME_COST, settings.ARGON2_MEMORY_COST, settings.ARGON2_PARALLELISM)
+    for time_cost, memory_cost, parallelism in [current] + args.argon2:
+        yield f'argon2 t={time_cost} m={memory_cost} p={parallelism}', {
+            'PASSWORD_HASHERS': tuned,
+            'ARGON2_TIME_COST': time_cost,
+            'ARGON2_MEMORY_COST': memory_cost,
+            'ARGON2_PARALLELISM': parallelism,
+        }
+
+
+def argon2_parameters(value):
+    try:
+        time_cost, memory_cost, parallelism = (int(part) for part in value.split(':'))
+    except ValueError:
+        raise argparse.ArgumentTypeError('attendu temps:mémoire_kio:voies, par exemple 2:19456:1')
+    return time_cost, memory_cost, parallelism
+
+
+def run(args):
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.hashers import check_password, make_password
+    from django.db import connection
+    from django.test import override_settings
+    from rest_framework.test import APIClient
+
+    from benchmarks.seed import BENCHMARK_PASSWORD
+    from benchmarks.serializers import median_ms
+    from users.hashers import hash_concurrency
+
+    User = get_user_model()
+    users = User.objects.bulk_create([
+        User(username=f'lecteur{index}', email=f'lecteur{index}@example.com')
+        for index in range(args.workers)
+    ])
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    print(f'{cores} cœur(s), {args.workers} workers, {hash_concurrency()} hachage(s) simultané(s)')
+    print(f"{'configuration':<30} {'vérif. (ms)':>11} {'connexions/s':>13} {'/s/cœur':>8} {'p95 (ms)':>9}")
+
+    for name, overrides in configurations(args):
+        with override_settings(**overrides):
+            # Hash déjà au bon format : pas de conversion pendant la mesure
+            encoded = make_password(BENCHMARK_PASSWORD)
+            User.objects.filter(pk__in=[user.pk for user in users]).update(password=encoded)
+            verify = median_ms(lambda: check_password(BENCHMARK_PASSWORD, encoded), 5)
+
+            barrier = threading.Barrier(len(users))
+            lock = threading.Lock()
+            timings = []
+
+            def worker(user):
+                client = APIClient()
+                payload = {'email': user.email, 'password': BENCHMARK_PASSWORD}
+                barrier.wait()
+                try:
+                    for _ in range(args.logins):
+                        started = time.perf_counter()
+                        response = client.post('/api/auth/login/', payload)
+                        assert response.status_code == 200, response.status_code
+                        with lock:
+                            timings.append((time.perf_counter() - started) * 1000)
+                finally:
+                    connection.close()
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=len(users)) as pool:
+                list(pool.map(worker, users))
+            elapsed = time.perf_counter() - started
+
+        throughput = len(timings) / elapsed
+        p95 = statistics.quantiles(timings, n=100, method='inclusive')[94]
+        print(
+            f'{name:<30} {verify:>11.1f} {throughput:>13.1f} '
+            f'{throughput / cores:>8.1f} {p95:>9.1f}'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--logins', type=int, default=20, help='Connexions par worker')
+    parser.add_argument('--argon2', type=argon2_parameters, action='append', default=[],
+                        help='Paramètres Argon2 supplémentaires, temps:mémoire_kio:voies')
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Plans d'exécution et latence des endpoints, sans puis avec les index ciblés.
+
+    python -m benchmarks.query_plans --loans 50000 --output plans.json
+
+Le jeu de données est créé sur une base jetable, puis chaque endpoint est
+mesuré deux fois : après suppression des index dérivés des filtres
+(``avant``), puis après leur recréation (``après``).
+"""
+import argparse
+import json
+import statistics
+import time
+
+from benchmarks.utils import benchmark_database, setup_django
+
+# Index dérivés des accès réels (voir Loan.Meta et Reservation.Meta)
+TUNED_INDEXES = {
+    'loans.Loan': (
+        'loan_user_status_due_idx', 'loan_active_due_idx',
+    ),
+    'reservations.Reservation': (
+        'resa_pending_position_idx', 'resa_pending_arrival_idx',
+        'resa_user_status_pickup_idx', 'resa_status_pickup_idx',
+    ),
+}
+
+
+def endpoints(context):
+    reader, staff = context['reader'], context['staff']
+    book_id = context['popular_book_id']
+    return [
+        ('loans list (staff)', staff, '/api/loans/?status=active'),
+        ('my_loans', reader, '/api/loans/my_loans/'),
+        ('overdue_loans', reader, '/api/loans/overdue_loans/'),
+        ('my_reservations', reader, '/api/reservations/my_reservations/'),
+        ('ready_for_pickup', reader, '/api/reservations/ready_for_pickup/'),
+        ('queue_status', None, f'/api/reservations/queue_status/?book_id={book_id}'),
+        ('book search', None, '/api/books/?search=chimie'),
+    ]
+
+
+def explain(connection, sql):
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            return [' '.join(str(part) for part in row) for row in cursor.fetchall()]
+    except Exception as exc:  # SQL affiché non rejouable tel quel
+        return [f'(plan indisponible : {exc})']
+
+
+def measure(label, user, url, repeat):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIClient
+
+    client = APIClient()
+    if user is not None:
+        client.force_authenticate(user)
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+    assert response.status_code == 200, (label, response.status_code)
+    return {
+        'endpoint': label,
+        'url': url,
+        'median_ms': round(statistics.median(timings), 2),
+        'queries': len(queries.captured_queries),
+        'plans': [
+            {'sql': query['sql'], 'plan': explain(connection, query['sql'])}
+            for query in queries.captured_queries
+        ],
+    }
+
+
+def set_tuned_indexes(enabled):
+    from django.apps import apps
+    from django.db import connection
+
+    with connection.schema_editor() as editor:
+        for label, names in TUNED_INDEXES.items():
+            model = apps.get_model(label)
+            for index in model._meta.indexes:
+                if index.name in names:
+                    (editor.add_index if enabled else editor.remove_index)(model, index)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def run(args):
+    from benchmarks.seed import seed
+
+    started = time.perf_counter()
+    context = seed(
+        users=args.users, books=args.books,
+        loans=args.loans, reservations=args.reservations,
+    )
+    print(f'Jeu de données créé en {time.perf_counter() - started:.1f} s')
+
+    report = {}
+    for phase, enabled in (('avant', False), ('après', True)):
+        set_tuned_indexes(enabled)
+        report[phase] = [
+            measure(label, user, url, args.repeat)
+            for label, user, url in endpoints(context)
+        ]
+
+    print(f"\n{'endpoint':<20} {'avant (ms)':>11} {'après (ms)':>11} {'requêtes':>9}")
+    for before, after in zip(report['avant'], report['après']):
+        print(
+            f"{before['endpoint']:<20} {before['median_ms']:>11.2f} "
+            f"{after['median_ms']:>11.2f} {after['queries']:>9}"
+        )
+    if args.verbose:
+        for phase, results in report.items():
+            print(f'\n== Plans {phase} ==')
+            for result in results:
+                print(f"\n{result['endpoint']}")
+                for query in result['plans']:
+                    for line in query['plan']:
+                        print(f'  {line}')
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f'\nRapport écrit dans {args.output}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--loans', type=int, default=50000)
+    parser.add_argument('--reservations', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', help='Écrire le rapport complet (plans compris) en JSON')
+    parser.add_argument('--verbose', action='store_true', help='Afficher les plans')
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Rendu JSON : JSONRenderer de DRF contre FastJSONRenderer (orjson).
+
+    python -m benchmarks.renderers --rows 100 1000
+
+Les données rendues sont celles des vrais serializers (ModelSerializer
+et lignes ``.values()``) sur un jeu de données créé pour l'occasion ;
+l'analyse (parser) est mesurée sur le même JSON.
+"""
+import argparse
+import io
+
+from benchmarks.serializers import median_ms
+from benchmarks.utils import benchmark_database, setup_django
+
+
+def payloads(rows):
+    from loans.models import Loan
+    from loans.serializers import LoanListSerializer, LoanSerializer
+    from loans.views import LOAN_LIST_PLAN
+    from reservations.models import Reservation
+    from reservations.serializers import ReservationListSerializer, ReservationSerializer
+    from reservations.views import RESERVATION_LIST_PLAN
+
+    loans = LOAN_LIST_PLAN.apply(Loan.objects.order_by('-borrow_date').with_derived())[:rows]
+    reservations = RESERVATION_LIST_PLAN.apply(
+        Reservation.objects.order_by('id').with_derived()
+    )[:rows]
+    return [
+        ('emprunts', {'results': LoanSerializer(loans, many=True).data}),
+        ('emprunts (values)', {'results': LoanListSerializer().serialize(
+            loans.values(*LoanListSerializer.columns))}),
+        ('réservations', {'results': ReservationSerializer(reservations, many=True).data}),
+        ('réservations (values)', {'results': ReservationListSerializer().serialize(
+            reservations.values(*ReservationListSerializer.columns))}),
+    ]
+
+
+def run(args):
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    from backend.renderers import FastJSONParser, FastJSONRenderer, orjson
+    from benchmarks.seed import seed
+
+    if orjson is None:
+        print('orjson absent : FastJSONRenderer retombe sur json, les deux colonnes sont comparables.')
+    largest = max(args.rows)
+    seed(users=200, books=500, loans=largest, reservations=largest)
+
+    print(f"{'données':<24} {'lignes':>7} {'':>8} {'DRF (ms)':>10} {'orjson (ms)':>12} {'gain':>6}")
+    for rows in args.rows:
+        for label, data in payloads(rows):
+            body = JSONRenderer().render(data)
+            assert FastJSONRenderer().render(data) == body, label
+            measures = {
+                'rendu': (
+                    lambda: JSONRenderer().render(data),
+                    lambda: FastJSONRenderer().render(data),
+                ),
+                'analyse': (
+                    lambda: JSONParser().parse(io.BytesIO(body)),
+                    lambda: FastJSONParser().parse(io.BytesIO(body)),
+                ),
+            }
+            for phase, (slow, fast) in measures.items():
+                before = median_ms(slow, args.repeat)
+                after = median_ms(fast, args.repeat)
+                print(
+                    f'{label:<24} {rows:>7} {phase:>8} {before:>10.2f} '
+                    f'{after:>12.2f} {before / after:>5.1f}x'
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Jeu de données de benchmark.
+
+Quelques livres très demandés concentrent les emprunts et de longues
+files de réservations (répartition de Zipf), comme dans une vraie
+bibliothèque universitaire.
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.utils import timezone
+
+from books.counters import reconcile_counters
+from books.models import Book
+from books.search import get_search_backend
+from loans.models import Loan
+from reservations.models import Reservation
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+TITLE_WORDS = (
+    'misérables', 'étranger', 'peste', 'château', 'mémoires', 'voyage', 'histoire',
+    'chimie', 'physique', 'algèbre', 'droit', 'économie', 'réseaux', 'données',
+)
+CATEGORIES = ('Roman', 'Sciences', 'Droit', 'Informatique', 'Histoire', 'Économie')
+
+
+@contextmanager
+def _dates_as_given(*fields):
+    """Laisser bulk_create écrire les dates fournies malgré auto_now_add"""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+def _zipf_weights(count, exponent=1.1):
+    return [1 / (rank + 1) ** exponent for rank in range(count)]
+
+
+def seed(users=1000, books=5000, loans=20000, reservations=5000,
+         random_seed=42, batch_size=2000):
+    """Remplir la base et retourner quelques objets utiles aux scénarios"""
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    User = get_user_model()
+
+    # Un seul hachage pour tous : le seed ne mesure pas le hachage
+    password = make_password(BENCHMARK_PASSWORD)
+    User.objects.bulk_create([
+        User(
+            username=f'lecteur{index}', email=f'lecteur{index}@example.com',
+            password=password, is_staff=index == 0,
+        )
+        for index in range(users)
+    ], batch_size=batch_size)
+    user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+
+    Book.objects.bulk_create([
+        Book(
+            title=' '.join(rng.sample(TITLE_WORDS, 3)).capitalize(),
+            author=f'Auteur {rng.randrange(books // 5 + 1)}',
+            isbn=f'979{index:010d}',
+            pages=rng.randrange(80, 900),
+            publication_year=rng.randrange(1850, 2026),
+            category=rng.choice(CATEGORIES),
+            total_copies=3,
+            available_copies=3,
+        )
+        for index in range(books)
+    ], batch_size=batch_size)
+    book_ids = list(Book.objects.order_by('id').values_list('id', flat=True))
+    backend = get_search_backend()
+    if backend is not None:
+        backend.index(connection, Book.objects.only('id', 'title', 'author', 'isbn'))
+
+    weights = _zipf_weights(len(book_ids))
+    loan_rows = []
+    for book_id in rng.choices(book_ids, weights, k=loans):
+        borrowed = now - timedelta(days=rng.uniform(0, 365))
+        due = borrowed + timedelta(days=14)
+        returned = due < now and rng.random() < 0.9
+        loan_rows.append(Loan(
+            user_id=rng.choice(user_ids), book_id=book_id,
+            borrow_date=borrowed, due_date=due,
+            return_date=due - timedelta(days=rng.uniform(0, 10)) if returned else None,
+            status='returned' if returned else 'active',
+        ))
+    with _dates_as_given(Loan._meta.get_field('borrow_date')):
+        Loan.objects.bulk_create(loan_rows, batch_size=batch_size)
+
+    # Les files les plus longues sur les livres les plus demandés
+    pairs = set()
+    while len(pairs) < min(reservations, len(user_ids) * len(book_ids)):
+        pairs.add((rng.choice(user_ids), rng.choices(book_ids, weights)[0]))
+    arrivals = sorted(
+        (now - timedelta(days=rng.uniform(0, 6)), user_id, book_id)
+        for user_id, book_id in pairs
+    )
+    positions = {}
+    reservation_rows = []
+    for reserved, user_id, book_id in arrivals:
+        positions[book_id] = positions.get(book_id, 0) + 1
+        reservation_rows.append(Reservation(
+            user_id=user_id, book_id=book_id, reservation_date=reserved,
+            pickup_deadline=reserved + timedelta(days=7),
+            position_in_queue=positions[book_id],
+        ))
+    with _dates_as_given(Reservation._meta.get_field('reservation_date')):
+        Reservation.objects.bulk_create(reservation_rows, batch_size=batch_size)
+    # bulk_create ne tient pas les compteurs des livres à jour
+    reconcile_counters(batch_size=batch_size)
+
+    reader_id = (
+        Loan.objects.filter(status='active').values_list('user_id', flat=True).first()
+        or user_ids[-1]
+    )
+    return {
+        'staff': User.objects.get(pk=user_ids[0]),
+        'reader': User.objects.get(pk=reader_id),
+        'popular_book_id': book_ids[0],
+    }
@@ -0,0 +1,85 @@
+"""Sérialisation des listes : ModelSerializer contre lignes ``.values()``.
+
+    python -m benchmarks.serializers --rows 10 100 1000
+
+Pour chaque taille, mesure le temps médian de sérialisation seule (les
+lignes sont déjà en mémoire) puis celui du chemin complet (requête +
+sérialisation), pour les emprunts et les réservations.
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.utils import benchmark_database, setup_django
+
+
+def median_ms(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def cases():
+    from loans.models import Loan
+    from loans.serializers import LoanListSerializer, LoanSerializer
+    from loans.views import LOAN_LIST_PLAN
+    from reservations.models import Reservation
+    from reservations.serializers import ReservationListSerializer, ReservationSerializer
+    from reservations.views import RESERVATION_LIST_PLAN
+
+    return [
+        ('emprunts', LOAN_LIST_PLAN.apply(Loan.objects.order_by('-borrow_date').with_derived()),
+         LoanSerializer, LoanListSerializer),
+        ('réservations', RESERVATION_LIST_PLAN.apply(Reservation.objects.order_by('id').with_derived()),
+         ReservationSerializer, ReservationListSerializer),
+    ]
+
+
+def run(args):
+    from benchmarks.seed import seed
+
+    largest = max(args.rows)
+    seed(users=200, books=500, loans=largest, reservations=largest)
+
+    print(f"{'liste':<14} {'lignes':>7} {'':>10} {'DRF (ms)':>10} {'values (ms)':>12} {'gain':>6}")
+    for label, queryset, model_serializer, values_serializer in cases():
+        for rows in args.rows:
+            page = queryset[:rows]
+            instances = list(page)
+            values = list(page.values(*values_serializer.columns))
+            assert len(values) == rows, (label, rows, len(values))
+            measures = {
+                'sérialisation': (
+                    lambda: model_serializer(instances, many=True).data,
+                    lambda: values_serializer().serialize(values),
+                ),
+                'complet': (
+                    lambda: model_serializer(list(page), many=True).data,
+                    lambda: values_serializer().serialize(page.values(*values_serializer.columns)),
+                ),
+            }
+            for phase, (slow, fast) in measures.items():
+                before = median_ms(slow, args.repeat)
+                after = median_ms(fast, args.repeat)
+                print(
+                    f'{label:<14} {rows:>7} {phase:>10} {before:>10.2f} '
+                    f'{after:>12.2f} {before / after:>5.1f}x'
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import django
+
+
+def setup_django():
+    """Charger Django pour un benchmark lancé en script"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    from django.conf import settings
+
+    default = settings.DATABASES['default']
+    if default['ENGINE'].endswith('sqlite3'):
+        # Une base fichier plutôt qu'en mémoire : les threads du benchmark
+        # doivent partager les mêmes données et se disputer les mêmes verrous.
+        default.setdefault('TEST', {}).setdefault(
+            'NAME', str(Path(tempfile.gettempdir()) / 'libratech_benchmark.sqlite3')
+        )
+    django.setup()
+
+
+@contextmanager
+def benchmark_database():
+    """Créer et migrer une base de test, puis la détruire en sortie"""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False
+    )
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
@@ -0,0 +1,154 @@
+"""Écritures concurrentes : emprunts, retours, réservations et annulations.
+
+    python -m benchmarks.write_concurrency --workers 16 --operations 20
+    python -m benchmarks.write_concurrency --compare            # SQLite d'origine / réglé
+    python -m benchmarks.write_concurrency --compare --postgres # + PostgreSQL du .env
+
+Chaque worker enchaîne ``--operations`` cycles emprunt + retour +
+réservation + annulation, tous démarrés ensemble. Sont mesurés le débit,
+la latence p50/p95 par cycle et les échecs (« database is locked »).
+
+Avec ``--compare``, le benchmark est relancé dans un processus par
+configuration (variables ``DATABASE_ENGINE`` et ``SQLITE_TUNED``, lues
+par les settings) et les résultats sont mis côte à côte.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.utils import benchmark_database, setup_django
+
+CONFIGURATIONS = {
+    'sqlite': {'DATABASE_ENGINE': 'sqlite', 'SQLITE_TUNED': 'False'},
+    'sqlite réglé': {'DATABASE_ENGINE': 'sqlite', 'SQLITE_TUNED': 'True'},
+    'postgresql': {'DATABASE_ENGINE': 'postgresql'},
+}
+
+
+def run(workers, operations):
+    from django.contrib.auth import get_user_model
+    from django.db import DatabaseError, connection
+    from django.utils import timezone
+
+    from benchmarks.seed import seed
+    from books.models import Book
+    from loans.models import Loan
+    from reservations.models import Reservation
+
+    seed(users=workers + 1, books=max(operations, 50), loans=0, reservations=0)
+    users = list(get_user_model().objects.filter(is_staff=False).order_by('id')[:workers])
+    book_ids = list(Book.objects.order_by('id').values_list('id', flat=True))
+    position = {user.pk: rank for rank, user in enumerate(users)}
+    barrier = threading.Barrier(len(users))
+    lock = threading.Lock()
+    timings, failures = [], []
+
+    def cycle(user, index):
+        # Livres différents par worker : seuls les verrous de la base sont disputés
+        book_id = book_ids[(index * len(users) + position[user.pk]) % len(book_ids)]
+        loan = Loan.objects.checkout(user, book_id)
+        if loan is not None:
+            loan.return_book()
+        reservation = Reservation.objects.create(
+            user=user, book_id=book_id, pickup_deadline=timezone.now()
+        )
+        reservation.cancel()
+
+    def worker(user):
+        barrier.wait()
+        try:
+            for index in range(operations):
+                started = time.perf_counter()
+                try:
+                    cycle(user, index)
+                except DatabaseError as exc:
+                    with lock:
+                        failures.append(str(exc))
+                    continue
+                with lock:
+                    timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(users)) as pool:
+        list(pool.map(worker, users))
+    elapsed = time.perf_counter() - started
+
+    p50 = p95 = None
+    if len(timings) > 1:
+        cuts = statistics.quantiles(timings, n=100, method='inclusive')
+        p50, p95 = round(cuts[49], 2), round(cuts[94], 2)
+    return {
+        'vendor': connection.vendor,
+        'cycles': len(timings),
+        'failures': len(failures),
+        'first_failure': failures[0] if failures else '',
+        'cycles_per_second': round(len(timings) / elapsed, 1),
+        'p50_ms': p50,
+        'p95_ms': p95,
+    }
+
+
+def compare(args):
+    names = ['sqlite', 'sqlite réglé'] + (['postgresql'] if args.postgres else [])
+    results = {}
+    for name in names:
+        command = [
+            sys.executable, '-m', 'benchmarks.write_concurrency', '--json',
+            '--workers', str(args.workers), '--operations', str(args.operations),
+        ]
+        env = {**os.environ, **CONFIGURATIONS[name]}
+        output = subprocess.run(command, env=env, capture_output=True, text=True)
+        if output.returncode:
+            print(f'{name} : échec\n{output.stderr[-2000:]}')
+            continue
+        results[name] = json.loads(output.stdout.splitlines()[-1])
+
+    total = args.workers * args.operations
+    print(f'{args.workers} workers x {args.operations} cycles (emprunt, retour, réservation, annulation)')
+    print(f"{'configuration':<14} {'réussis':>8} {'échecs':>7} {'cycles/s':>9} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for name, result in results.items():
+        p50 = f"{result['p50_ms']:.1f}" if result['p50_ms'] is not None else '-'
+        p95 = f"{result['p95_ms']:.1f}" if result['p95_ms'] is not None else '-'
+        print(
+            f"{name:<14} {result['cycles']:>5}/{total:<3}{result['failures']:>6} "
+            f"{result['cycles_per_second']:>9.1f} {p50:>9} {p95:>9}"
+        )
+    for name, result in results.items():
+        if result['first_failure']:
+            print(f"  {name} : {result['first_failure']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--operations', type=int, default=20)
+    parser.add_argument('--compare', action='store_true',
+                        help='Comparer SQLite d\'origine et réglé (un processus chacun)')
+    parser.add_argument('--postgres', action='store_true',
+                        help='Avec --compare : ajouter PostgreSQL (DATABASE_* du .env)')
+    parser.add_argument('--json', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args)
+        return
+
+    setup_django()
+    with benchmark_database():
+        result = run(args.workers, args.operations)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+        return
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
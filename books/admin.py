@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Book
+from .models import Book, BookImport
 
 from django.utils.html import format_html
 from django.urls import reverse
@@ -28,3 +28,10 @@ class BookAdmin(admin.ModelAdmin):
             '<a class="button" style="color:red" href="{}">🗑 Supprimer</a>', url
         )
     delete_button.short_description = "Supprimer"
+
+
+@admin.register(BookImport)
+class BookImportAdmin(admin.ModelAdmin):
+    list_display = ('id', 'file', 'format', 'status', 'rows', 'imported', 'failed', 'created_at')
+    list_filter = ('status', 'format')
+    readonly_fields = ('rows', 'imported', 'failed', 'rows_per_second', 'errors', 'finished_at')
@@ -0,0 +1,190 @@
+"""Cache serveur des lectures du catalogue (liste et fiche d'un livre).
+
+Une entrée est la réponse rendue, son ETag et les versions dont elle
+dépend :
+
+- chaque livre a sa version, changée à chaque modification du livre ;
+- les listes dépendent en plus d'une version « liste », changée seulement
+  quand un livre est créé, supprimé, ou que l'un des champs de recherche
+  ou de tri change.
+
+Une entrée n'est servie que si toutes ses versions sont encore les
+mêmes : modifier la description d'un livre n'invalide que sa fiche et les
+pages qui le contiennent. Les écritures invalident tout de suite puis
+une seconde fois après le commit, pour écarter une réponse remise en cache
+entre les deux par une lecture concurrente ; une génération, changée à
+chaque écriture, est lue avant la requête du catalogue et la réponse
+n'est gardée que si elle n'a pas changé entre-temps. Les versions sont
+des jetons aléatoires : si le cache en évince une, les entrées qui en
+dépendent deviennent simplement invalides.
+
+Le cache utilisé est l'alias ``catalogue`` de ``CACHES`` (mémoire locale,
+fichiers, Redis...).
+"""
+import hashlib
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, urlencode
+
+from .search import tokenize
+
+CACHE_ALIAS = 'catalogue'
+LIST_VERSION_KEY = 'catalogue:list:version'
+GENERATION_KEY = 'catalogue:generation'
+# Champs qui décident de l'appartenance et de l'ordre d'un livre dans une liste
+LISTING_FIELDS = ('title', 'author', 'isbn', 'rating', 'created_at')
+
+
+def catalogue_cache():
+    return caches[CACHE_ALIAS]
+
+
+def book_version_key(pk):
+    return f'catalogue:book:{pk}:version'
+
+
+def current_versions(cache, keys):
+    """Versions actuelles de ``keys``, créées si besoin"""
+    found = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+    return {**found, **missing}
+
+
+def invalidate_books(book_ids, listing=False):
+    """Invalider les entrées qui contiennent ``book_ids`` (et les listes si ``listing``)"""
+    keys = [GENERATION_KEY] + [book_version_key(pk) for pk in book_ids]
+    if listing:
+        keys.append(LIST_VERSION_KEY)
+    catalogue_cache().set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+
+
+def books_changed(book_ids, listing=False, using=None):
+    """Invalider maintenant et après le commit de la transaction en cours
+
+    À appeler par les écritures qui ne déclenchent pas les signaux du cache
+    (``update``, ``bulk_create``).
+    """
+    book_ids = list(book_ids)
+    invalidate_books(book_ids, listing)
+    transaction.on_commit(lambda: invalidate_books(book_ids, listing), using=using)
+
+
+def _matches(request, etag):
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return '*' in etags or etag in etags or etag.strip('"') in etags
+
+
+class CatalogueCacheMixin:
+    """Cache des actions ``list`` et ``retrieve`` d'un ViewSet de livres
+
+    Les requêtes ``If-None-Match`` reçoivent un 304 sans corps quand
+    l'ETag est toujours valable.
+    """
+    # Paramètres qui entrent dans la clé ; tout autre paramètre contourne le cache
+    cached_list_params = ('search', 'ordering', 'page', 'page_size', 'cursor', 'include_total')
+
+    def list(self, request, *args, **kwargs):
+        key = self._list_key(request)
+        if key is None:
+            return super().list(request, *args, **kwargs)
+        return self._cached(request, key, super().list, args, kwargs, listing=True)
+
+    async def alist(self, request, *args, **kwargs):
+        """``list`` pour un ViewSet asynchrone (voir ``backend.async_views``)
+
+        Le cache est lu et écrit dans un thread ; la liste elle-même
+        (``alist`` du ViewSet) est calculée sur la boucle d'événements.
+        """
+        key = self._list_key(request)
+        if key is None:
+            return await super().alist(request, *args, **kwargs)
+        hit, snapshot = await sync_to_async(self._lookup)(request, key, listing=True)
+        if hit is not None:
+            return hit
+        response = await super().alist(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        return await sync_to_async(self._store)(
+            request, key, response, args, kwargs, snapshot, listing=True
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        key = f"catalogue:detail:{kwargs.get(self.lookup_url_kwarg or self.lookup_field)}"
+        return self._cached(request, key, super().retrieve, args, kwargs, listing=False)
+
+    def _list_key(self, request):
+        """Clé d'une liste, None si un paramètre inconnu contourne le cache"""
+        if not set(request.query_params) <= set(self.cached_list_params):
+            return None
+        params = {
+            name: request.query_params[name]
+            for name in sorted(request.query_params)
+        }
+        if 'search' in params:
+            params['search'] = ' '.join(tokenize(params['search']))
+        return 'catalogue:list:' + hashlib.sha1(urlencode(params).encode()).hexdigest()
+
+    def _cached(self, request, key, handler, args, kwargs, listing):
+        hit, snapshot = self._lookup(request, key, listing)
+        if hit is not None:
+            return hit
+        response = handler(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        return self._store(request, key, response, args, kwargs, snapshot, listing)
+
+    def _lookup(self, request, key, listing):
+        """(réponse servie depuis le cache ou None, versions lues avant la requête)"""
+        cache = catalogue_cache()
+        entry = cache.get(key)
+        if entry is not None and cache.get_many(list(entry['versions'])) == entry['versions']:
+            return self._from_entry(request, entry, 'HIT'), None
+        keys = [GENERATION_KEY, LIST_VERSION_KEY] if listing else [GENERATION_KEY]
+        return None, current_versions(cache, keys)
+
+    def _store(self, request, key, response, args, kwargs, snapshot, listing):
+        cache = catalogue_cache()
+        response = self.finalize_response(request, response, *args, **kwargs)
+        response.render()
+
+        data = response.data
+        if listing:
+            rows = data['results'] if isinstance(data, dict) else data
+            book_ids = [row['id'] for row in rows]
+        else:
+            book_ids = [data['id']]
+        versions = current_versions(cache, [book_version_key(pk) for pk in book_ids])
+        if listing:
+            versions[LIST_VERSION_KEY] = snapshot[LIST_VERSION_KEY]
+        entry = {
+            'etag': '"%s"' % hashlib.sha1(response.content).hexdigest(),
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'versions': versions,
+        }
+        # Écriture pendant la requête, ou lecture sur un réplica en retard :
+        # les lignes lues sont peut-être déjà périmées sous ces versions
+        if (
+            getattr(self, 'read_alias', None) is None
+            and cache.get(GENERATION_KEY) == snapshot[GENERATION_KEY]
+        ):
+            cache.set(key, entry)
+        return self._from_entry(request, entry, 'MISS', response)
+
+    def _from_entry(self, request, entry, status, response=None):
+        if _matches(request, entry['etag']):
+            response = HttpResponseNotModified()
+        elif response is None:
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        response['ETag'] = entry['etag']
+        response['X-Cache'] = status
+        return response
@@ -0,0 +1,106 @@
+"""Recalcul des compteurs dénormalisés de ``Book``.
+
+``active_loans_count`` (emprunts en cours, en retard compris) et
+``pending_reservations_count`` (longueur de la file d'attente) suivent
+chaque emprunt et chaque réservation par des UPDATE ``F()`` : une
+écriture qui contourne les méthodes des modèles (admin, statut modifié à
+la main, suppression) les fait dériver. ``reconcile_counters`` compare en
+une requête les compteurs aux emprunts et réservations, puis recalcule
+par lots ceux des livres qui ont dérivé.
+"""
+import time
+from functools import reduce
+from operator import or_
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from books.cache import books_changed
+from books.models import Book
+from loans.models import OUTSTANDING_STATUSES, Loan
+from reservations.models import Reservation
+
+COUNTERS = ('active_loans_count', 'pending_reservations_count')
+
+
+def _count_per_book(queryset):
+    return Coalesce(Subquery(
+        queryset.filter(book_id=OuterRef('pk')).order_by().values('book_id').annotate(
+            count=Count('id')
+        ).values('count')
+    ), 0)
+
+
+def expected_counters():
+    """Valeur exacte de chaque compteur, en sous-requêtes corrélées au livre"""
+    return {
+        'active_loans_count': _count_per_book(
+            Loan.objects.filter(status__in=OUTSTANDING_STATUSES)
+        ),
+        'pending_reservations_count': _count_per_book(
+            Reservation.objects.filter(status='pending')
+        ),
+    }
+
+
+class CounterReport:
+    """Livres dont les compteurs ont dérivé : ``{book_id: {champ: (stocké, exact)}}``"""
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.drift = {}
+        self.started = time.perf_counter()
+        self.elapsed = 0
+
+    def drift_per_counter(self):
+        """Écart cumulé (exact - stocké) de chaque compteur"""
+        totals = dict.fromkeys(COUNTERS, 0)
+        for fields in self.drift.values():
+            for field, (stored, exact) in fields.items():
+                totals[field] += exact - stored
+        return totals
+
+    def __str__(self):
+        action = 'à corriger' if self.dry_run else 'corrigés'
+        deltas = ', '.join(f'{field} {delta:+d}' for field, delta in self.drift_per_counter().items())
+        return f'{len(self.drift)} livres {action} ({deltas}) en {self.elapsed:.2f} s'
+
+
+def reconcile_counters(using=DEFAULT_DB_ALIAS, batch_size=1000, dry_run=False):
+    """Recalculer les compteurs des livres qui ont dérivé ; retourne un ``CounterReport``
+
+    Chaque lot est recalculé par un seul UPDATE à sous-requêtes, qui relit
+    les emprunts et réservations au moment de l'écriture : une opération
+    concurrente entre la détection et la correction n'est pas perdue. Les
+    files des livres corrigés sont renumérotées, leurs positions
+    dépendant de ``pending_reservations_count``.
+    """
+    report = CounterReport(dry_run)
+    expected = {f'exact_{field}': value for field, value in expected_counters().items()}
+    rows = Book.objects.using(using).annotate(**expected).filter(
+        reduce(or_, (~Q(**{field: F(f'exact_{field}')}) for field in COUNTERS))
+    ).order_by('pk').values_list('pk', *COUNTERS, *expected)
+    for pk, *values in rows:
+        stored, exact = values[:len(COUNTERS)], values[len(COUNTERS):]
+        report.drift[pk] = {
+            field: (old, new)
+            for field, old, new in zip(COUNTERS, stored, exact)
+            if old != new
+        }
+
+    if not dry_run:
+        book_ids = list(report.drift)
+        for start in range(0, len(book_ids), batch_size):
+            batch = book_ids[start:start + batch_size]
+            with transaction.atomic(using=using):
+                Book.objects.using(using).filter(pk__in=batch).update(
+                    **expected_counters(), updated_at=timezone.now()
+                )
+                Reservation.objects.db_manager(using).renumber_queues([
+                    pk for pk in batch if 'pending_reservations_count' in report.drift[pk]
+                ])
+                books_changed(batch, using=using)
+    report.elapsed = time.perf_counter() - report.started
+    return report
@@ -0,0 +1,27 @@
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+from .search import get_search_backend, tokenize
+
+
+class BookSearchFilter(filters.SearchFilter):
+    """Recherche ``?search=`` servie par l'index plein texte
+
+    Sans ``?ordering=`` explicite, les résultats sont triés par pertinence.
+    Sur une base sans index plein texte, on retombe sur le ``SearchFilter``
+    de DRF (``icontains``).
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        backend = get_search_backend(queryset.db)
+        if backend is None:
+            return super().filter_queryset(request, queryset, view)
+
+        terms = tokenize(request.query_params.get(self.search_param, ''))
+        if not terms:
+            return queryset
+
+        queryset = backend.search(queryset, terms)
+        if api_settings.ORDERING_PARAM not in request.query_params:
+            queryset = queryset.order_by('-search_rank', *getattr(view, 'ordering', []))
+        return queryset
@@ -0,0 +1,296 @@
+"""Import en flux de catalogues d'éditeurs (CSV, XLSX, ONIX).
+
+Les lecteurs produisent les lignes une à une ; ``BookImporter`` les valide
+par lots et les insère ou met à jour sur l'ISBN avec
+``bulk_create(update_conflicts=True)``. La mémoire utilisée dépend de la
+taille des lots, pas de celle du fichier.
+"""
+import csv
+import threading
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .cache import books_changed
+from .models import Book, BookImport
+from .search import get_search_backend
+
+# Champs mis à jour quand l'ISBN existe déjà : les exemplaires en
+# circulation ne sont jamais écrasés par un catalogue.
+UPDATE_FIELDS = [
+    'title', 'author', 'description', 'pages', 'publication_year',
+    'category', 'language', 'updated_at',
+]
+# Nombre maximal d'erreurs conservées dans le rapport
+MAX_REPORTED_ERRORS = 100
+
+
+class CatalogueRowSerializer(serializers.ModelSerializer):
+    """Validation d'une ligne de catalogue
+
+    L'unicité de l'ISBN n'est pas vérifiée ligne par ligne : un ISBN
+    existant est mis à jour.
+    """
+    class Meta:
+        model = Book
+        fields = (
+            'title', 'author', 'isbn', 'description', 'pages',
+            'publication_year', 'category', 'language', 'total_copies',
+        )
+        extra_kwargs = {'isbn': {'validators': []}}
+
+
+def _clean(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        # ISBN et années lus comme nombres dans les tableurs
+        value = int(value)
+    return str(value).strip()
+
+
+def _rows_from_table(rows):
+    """Transformer (en-tête, lignes...) en dictionnaires"""
+    rows = iter(rows)
+    header = [_clean(name).lower() for name in next(rows, [])]
+    for values in rows:
+        row = {
+            name: _clean(value)
+            for name, value in zip(header, values)
+            if name and _clean(value) != ''
+        }
+        if row:
+            yield row
+
+
+def read_csv(file):
+    """Lignes d'un CSV (fichier texte) dont l'en-tête reprend les champs de Book"""
+    dialect = csv.excel
+    sample = file.read(4096)
+    file.seek(0)
+    if sample:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    return _rows_from_table(csv.reader(file, dialect))
+
+
+def read_xlsx(path):
+    """Lignes de la première feuille d'un classeur, en lecture seule"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from _rows_from_table(workbook.worksheets[0].iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _find(element, *path):
+    """Premier texte au bout de ``path`` en ignorant les espaces de noms"""
+    for name in path:
+        element = next((child for child in element if _local(child.tag) == name), None)
+        if element is None:
+            return ''
+    return (element.text or '').strip()
+
+
+def read_onix(file):
+    """Lignes d'un flux ONIX 3.0 (balises longues), produit par produit"""
+    for event, element in ET.iterparse(file, events=('end',)):
+        if _local(element.tag) != 'Product':
+            continue
+        row = {}
+        for child in element:
+            name = _local(child.tag)
+            # ProductIDType 15 : ISBN-13
+            if name == 'ProductIdentifier' and _find(child, 'ProductIDType') == '15':
+                row['isbn'] = _find(child, 'IDValue')
+            elif name == 'DescriptiveDetail':
+                for detail in child:
+                    detail_name = _local(detail.tag)
+                    if detail_name == 'TitleDetail' and 'title' not in row:
+                        row['title'] = _find(detail, 'TitleElement', 'TitleText')
+                    elif detail_name == 'Contributor' and 'author' not in row:
+                        row['author'] = _find(detail, 'PersonName')
+                    elif detail_name == 'Extent':
+                        row['pages'] = _find(detail, 'ExtentValue')
+                    elif detail_name == 'Language':
+                        row['language'] = _find(detail, 'LanguageCode')
+                    elif detail_name == 'Subject' and 'category' not in row:
+                        row['category'] = _find(detail, 'SubjectHeadingText')
+            elif name == 'CollateralDetail':
+                row['description'] = _find(child, 'TextContent', 'Text')
+            elif name == 'PublishingDetail':
+                row['publication_year'] = _find(child, 'PublishingDate', 'Date')[:4]
+        # Libérer le produit déjà lu
+        element.clear()
+        yield {name: value for name, value in row.items() if value}
+
+
+FORMATS = ('csv', 'xlsx', 'onix')
+
+
+def detect_format(name):
+    suffix = Path(name).suffix.lower()
+    if suffix in ('.xml', '.onix'):
+        return 'onix'
+    return suffix.lstrip('.')
+
+
+def read_rows(path, format=None):
+    """Ouvrir ``path`` et produire ses lignes selon le format"""
+    format = format or detect_format(path)
+    if format == 'xlsx':
+        yield from read_xlsx(path)
+    elif format == 'csv':
+        with open(path, newline='', encoding='utf-8-sig') as file:
+            yield from read_csv(file)
+    elif format == 'onix':
+        with open(path, 'rb') as file:
+            yield from read_onix(file)
+    else:
+        raise ValueError(f"Format d'import inconnu : {format}")
+
+
+class ImportReport:
+    """Compteurs d'un import, mis à jour après chaque lot"""
+
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def add_error(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def __str__(self):
+        return (
+            f'{self.rows} lignes, {self.imported} importées, {self.failed} erreurs '
+            f'({self.rows_per_second:.0f} lignes/s)'
+        )
+
+
+class ChunkedImporter:
+    """Valider et écrire un flux de lignes par lots de ``chunk_size``
+
+    Les sous-classes écrivent un lot dans ``write_chunk`` ; l'avancement est
+    publié après chaque lot.
+    """
+    report_class = ImportReport
+
+    def __init__(self, chunk_size=1000, using='default', progress=None):
+        self.chunk_size = chunk_size
+        self.using = using
+        self.progress = progress
+
+    def run(self, rows):
+        report = self.report_class()
+        chunk = []
+        # La ligne 1 est l'en-tête des fichiers tabulaires
+        for line, row in enumerate(rows, start=2):
+            chunk.append((line, row))
+            if len(chunk) >= self.chunk_size:
+                self._import_chunk(chunk, report)
+                chunk = []
+        if chunk:
+            self._import_chunk(chunk, report)
+        return report
+
+    def _import_chunk(self, chunk, report):
+        self.write_chunk(chunk, report)
+        report.rows += len(chunk)
+        report.elapsed = time.perf_counter() - report.started
+        if self.progress is not None:
+            self.progress(report)
+
+    def write_chunk(self, chunk, report):
+        raise NotImplementedError
+
+
+class BookImporter(ChunkedImporter):
+    """Insérer ou mettre à jour les livres sur l'ISBN"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.serializer = CatalogueRowSerializer()
+
+    def write_chunk(self, chunk, report):
+        books = {}
+        for line, row in chunk:
+            try:
+                data = self.serializer.run_validation(row)
+            except serializers.ValidationError as exc:
+                report.add_error(line, exc.detail)
+                continue
+            copies = data.get('total_copies', 1)
+            # Un même ISBN deux fois dans le lot : la dernière ligne gagne
+            books[data['isbn']] = Book(available_copies=copies, **data)
+
+        if books:
+            with transaction.atomic(using=self.using):
+                written = Book.objects.using(self.using).bulk_create(
+                    books.values(),
+                    update_conflicts=True,
+                    unique_fields=['isbn'],
+                    update_fields=UPDATE_FIELDS,
+                )
+                # bulk_create ne déclenche pas les signaux de l'index
+                backend = get_search_backend(self.using)
+                if backend is not None:
+                    backend.index(connections[self.using], written)
+                books_changed([book.pk for book in written], listing=True, using=self.using)
+        report.imported += len(books)
+
+
+def run_import(job):
+    """Exécuter un import enregistré en publiant son avancement après chaque lot"""
+    jobs = BookImport.objects.filter(pk=job.pk)
+    jobs.update(status='running')
+
+    def progress(report):
+        jobs.update(
+            rows=report.rows,
+            imported=report.imported,
+            failed=report.failed,
+            rows_per_second=report.rows_per_second,
+            errors=report.errors,
+        )
+
+    try:
+        BookImporter(progress=progress).run(read_rows(job.file.path, job.format))
+    except Exception as exc:
+        jobs.update(status='failed', errors=[{'line': None, 'errors': str(exc)}])
+    else:
+        jobs.update(status='done')
+    finally:
+        jobs.update(finished_at=timezone.now())
+
+
+def _run_in_thread(job_id):
+    try:
+        run_import(BookImport.objects.get(pk=job_id))
+    finally:
+        connection.close()
+
+
+def start_import(job):
+    """Lancer l'import dans un thread une fois la transaction validée"""
+    transaction.on_commit(lambda: threading.Thread(
+        target=_run_in_thread, args=(job.pk,), daemon=True
+    ).start())
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from books.importers import FORMATS, BookImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = "Importer un catalogue d'éditeur (CSV, XLSX ou ONIX) en flux"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        importer = BookImporter(
+            chunk_size=options['chunk_size'],
+            using=options['database'],
+            progress=lambda report: self.stdout.write(str(report)),
+        )
+        try:
+            report = importer.run(read_rows(options['path'], options['format']))
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        for error in report.errors:
+            self.stderr.write(f"Ligne {error['line']} : {error['errors']}")
+        if report.failed > len(report.errors):
+            self.stderr.write(f'... {report.failed - len(report.errors)} autres erreurs')
+        self.stdout.write(self.style.SUCCESS(f'Import terminé : {report}'))
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from books.cache import books_changed
+from books.models import Book
+from books.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Reconstruire l'index plein texte du catalogue"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        using = options['database']
+        batch_size = options['batch_size']
+        backend = get_search_backend(using)
+        if backend is None:
+            raise CommandError(
+                f"La base '{using}' ne dispose pas d'index plein texte."
+            )
+
+        connection = connections[using]
+        started = time.perf_counter()
+        indexed = 0
+        books = (
+            Book.objects.using(using)
+            .only('id', 'title', 'author', 'isbn')
+            .order_by()
+            .iterator(chunk_size=batch_size)
+        )
+        with transaction.atomic(using=using):
+            backend.clear(connection)
+            batch = []
+            for book in books:
+                batch.append(book)
+                if len(batch) >= batch_size:
+                    backend.index(connection, batch)
+                    indexed += len(batch)
+                    batch = []
+            backend.index(connection, batch)
+            indexed += len(batch)
+            # Les résultats de recherche en cache ne sont plus à jour
+            books_changed([], listing=True, using=using)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{indexed} livres indexés en {elapsed:.2f} s.'
+        ))
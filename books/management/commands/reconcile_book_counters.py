@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from books.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculer les compteurs d'emprunts en cours et de réservations en "
+        "attente des livres, et signaler ceux qui avaient dérivé"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Signaler les écarts sans corriger'
+        )
+
+    def handle(self, *args, **options):
+        report = reconcile_counters(
+            using=options['database'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        if options['verbosity'] > 1:
+            for book_id, fields in report.drift.items():
+                changes = ', '.join(
+                    f'{field} {stored} -> {exact}' for field, (stored, exact) in fields.items()
+                )
+                self.stdout.write(f'Livre {book_id} : {changes}')
+        style = self.style.WARNING if report.drift else self.style.SUCCESS
+        self.stdout.write(style(str(report)))
@@ -0,0 +1,55 @@
+from django.db import migrations
+
+
+SQLITE_CREATE = (
+    "CREATE VIRTUAL TABLE books_book_fts USING fts5("
+    "title, author, isbn, tokenize = 'unicode61 remove_diacritics 2')"
+)
+SQLITE_DROP = 'DROP TABLE IF EXISTS books_book_fts'
+
+POSTGRESQL_CREATE = (
+    'CREATE TABLE books_book_search ('
+    'book_id bigint PRIMARY KEY REFERENCES books_book (id) ON DELETE CASCADE, '
+    'document tsvector NOT NULL)',
+    'CREATE INDEX books_book_search_document_gin '
+    'ON books_book_search USING GIN (document)',
+)
+POSTGRESQL_DROP = 'DROP TABLE IF EXISTS books_book_search'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+    elif vendor == 'postgresql':
+        for statement in POSTGRESQL_CREATE:
+            schema_editor.execute(statement)
+    else:
+        return
+
+    # Indexer le catalogue existant
+    from books.search import get_search_backend
+    Book = apps.get_model('books', 'Book')
+    using = schema_editor.connection.alias
+    get_search_backend(using).index(
+        schema_editor.connection, Book.objects.using(using).iterator()
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_DROP)
+    elif vendor == 'postgresql':
+        schema_editor.execute(POSTGRESQL_DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
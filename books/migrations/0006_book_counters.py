@@ -0,0 +1,50 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_per_book(queryset):
+    return Coalesce(Subquery(
+        queryset.filter(book_id=OuterRef('pk')).order_by().values('book_id').annotate(
+            count=Count('id')
+        ).values('count')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    """Compteurs du catalogue existant, en un seul UPDATE"""
+    Book = apps.get_model('books', 'Book')
+    Loan = apps.get_model('loans', 'Loan')
+    Reservation = apps.get_model('reservations', 'Reservation')
+    using = schema_editor.connection.alias
+    Book.objects.using(using).update(
+        active_loans_count=count_per_book(
+            Loan.objects.using(using).filter(status__in=['active', 'overdue'])
+        ),
+        pending_reservations_count=count_per_book(
+            Reservation.objects.using(using).filter(status='pending')
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_query_pattern_indexes'),
+        ('loans', '0005_loan_updated_at'),
+        ('reservations', '0006_reservation_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='active_loans_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='pending_reservations_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
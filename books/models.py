@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 
 class Book(models.Model):
@@ -23,6 +24,11 @@ class Book(models.Model):
     total_copies = models.IntegerField(default=1)
     available_copies = models.IntegerField(default=1)
     
+    # Compteurs dénormalisés, mis à jour par F() dans la transaction de
+    # chaque emprunt ou réservation ; ``reconcile_book_counters`` les recalcule
+    active_loans_count = models.IntegerField(default=0)
+    pending_reservations_count = models.IntegerField(default=0)
+    
     # Métadonnées
     rating = models.FloatField(default=0)
     reviews_count = models.IntegerField(default=0)
@@ -37,8 +43,44 @@ class Book(models.Model):
         indexes = [
             models.Index(fields=['title']),
             models.Index(fields=['author']),
-            models.Index(fields=['isbn']),
+            # isbn est déjà indexé par unique=True
+            # Pagination par curseur (-created_at, -id)
+            models.Index(fields=['-created_at', '-id'], name='book_created_keyset_idx'),
         ]
     
     def __str__(self):
-        return f"{self.title} ({self.author})"
\ No newline at end of file
+        return f"{self.title} ({self.author})"
+
+
+class BookImport(models.Model):
+    """Import de catalogue lancé depuis l'API et exécuté en tâche de fond"""
+
+    STATUS_CHOICES = (
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminé'),
+        ('failed', 'Échoué'),
+    )
+
+    file = models.FileField(upload_to='imports/')
+    format = models.CharField(max_length=10)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True
+    )
+
+    # Avancement, mis à jour après chaque lot
+    rows = models.IntegerField(default=0)
+    imported = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    rows_per_second = models.FloatField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Import {self.pk} ({self.get_status_display()})"
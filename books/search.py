@@ -0,0 +1,127 @@
+"""Index plein texte du catalogue.
+
+Le texte indexé (titre, auteur, ISBN) est replié côté Python : minuscules,
+accents retirés, tirets des ISBN supprimés. Chaque base a son propre index :
+
+- SQLite : table virtuelle FTS5 ``books_book_fts`` (rowid = id du livre);
+- PostgreSQL : table ``books_book_search`` avec une colonne ``tsvector``
+  indexée en GIN.
+
+Les tables sont créées par la migration ``0002_book_search_index`` et
+tenues à jour par les signaux de ``books.signals``.
+"""
+import re
+import unicodedata
+
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+_ISBN_HYPHEN = re.compile(r'(?<=\d)[-\s](?=\d)')
+_TOKEN = re.compile(r'\w+')
+
+
+def fold(text):
+    """Mettre en minuscules et retirer les accents (« Misérables » -> « miserables »)"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _ISBN_HYPHEN.sub('', text).lower()
+
+
+def tokenize(text):
+    """Découper une saisie utilisateur en termes repliés"""
+    return _TOKEN.findall(fold(text))
+
+
+class SearchBackend:
+    """Interface commune des index plein texte"""
+    vendor = None
+
+    def index(self, connection, books):
+        """Indexer (ou réindexer) une liste de livres"""
+        rows = [
+            (book.pk, fold(book.title), fold(book.author), fold(book.isbn))
+            for book in books
+        ]
+        if rows:
+            with connection.cursor() as cursor:
+                cursor.executemany(self.upsert_sql, rows)
+
+    def remove(self, connection, pks):
+        """Retirer des livres de l'index"""
+        with connection.cursor() as cursor:
+            cursor.executemany(self.delete_sql, [(pk,) for pk in pks])
+
+    def clear(self, connection):
+        """Vider l'index"""
+        with connection.cursor() as cursor:
+            cursor.execute(self.clear_sql)
+
+    def search(self, queryset, terms):
+        """Filtrer ``queryset`` sur ``terms`` et l'annoter avec ``search_rank``
+
+        Plus ``search_rank`` est grand, plus le livre est pertinent.
+        """
+        query = self.build_query(terms)
+        return queryset.filter(
+            pk__in=RawSQL(self.match_sql, (query,))
+        ).annotate(
+            search_rank=RawSQL(self.rank_sql, (query,))
+        )
+
+
+class SQLiteSearchBackend(SearchBackend):
+    vendor = 'sqlite'
+
+    upsert_sql = (
+        'INSERT OR REPLACE INTO books_book_fts (rowid, title, author, isbn) '
+        'VALUES (%s, %s, %s, %s)'
+    )
+    delete_sql = 'DELETE FROM books_book_fts WHERE rowid = %s'
+    clear_sql = 'DELETE FROM books_book_fts'
+    match_sql = 'SELECT rowid FROM books_book_fts WHERE books_book_fts MATCH %s'
+    # bm25 est négatif : plus il est petit, plus le document est pertinent.
+    # Poids : titre 10, auteur 5, ISBN 1.
+    rank_sql = (
+        'SELECT -bm25(books_book_fts, 10.0, 5.0, 1.0) FROM books_book_fts '
+        'WHERE books_book_fts MATCH %s AND rowid = books_book.id'
+    )
+
+    def build_query(self, terms):
+        # Recherche par préfixe pour la saisie au fil de l'eau
+        return ' '.join(f'"{term}"*' for term in terms)
+
+
+class PostgreSQLSearchBackend(SearchBackend):
+    vendor = 'postgresql'
+
+    upsert_sql = (
+        'INSERT INTO books_book_search (book_id, document) VALUES ('
+        "%s, setweight(to_tsvector('simple', %s), 'A') "
+        "|| setweight(to_tsvector('simple', %s), 'B') "
+        "|| setweight(to_tsvector('simple', %s), 'C')) "
+        'ON CONFLICT (book_id) DO UPDATE SET document = EXCLUDED.document'
+    )
+    delete_sql = 'DELETE FROM books_book_search WHERE book_id = %s'
+    clear_sql = 'TRUNCATE books_book_search'
+    match_sql = (
+        'SELECT book_id FROM books_book_search '
+        "WHERE document @@ to_tsquery('simple', %s)"
+    )
+    rank_sql = (
+        "SELECT ts_rank(document, to_tsquery('simple', %s)) "
+        'FROM books_book_search WHERE book_id = books_book.id'
+    )
+
+    def build_query(self, terms):
+        return ' & '.join(f'{term}:*' for term in terms)
+
+
+_BACKENDS = {
+    backend.vendor: backend
+    for backend in (SQLiteSearchBackend(), PostgreSQLSearchBackend())
+}
+
+
+def get_search_backend(using='default'):
+    """Retourner l'index de la base ``using``, ou None si elle n'en a pas"""
+    return _BACKENDS.get(connections[using].vendor)
@@ -1,8 +1,45 @@
 from rest_framework import serializers
-from .models import Book
+from .models import Book, BookImport
+from .importers import FORMATS, detect_format
 
 class BookSerializer(serializers.ModelSerializer):
     class Meta:
         model = Book
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at')
\ No newline at end of file
+        read_only_fields = (
+            'active_loans_count', 'pending_reservations_count', 'created_at', 'updated_at'
+        )
+
+    def update(self, instance, validated_data):
+        """N'écrire que les champs envoyés
+
+        Les compteurs et les exemplaires disponibles, modifiés par des UPDATE
+        ``F()`` concurrents, ne sont pas réécrits avec les valeurs lues.
+        """
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
+
+
+class BookImportSerializer(serializers.ModelSerializer):
+    """Dépôt d'un catalogue et suivi de son import"""
+    class Meta:
+        model = BookImport
+        fields = (
+            'id', 'file', 'format', 'status', 'rows', 'imported', 'failed',
+            'rows_per_second', 'errors', 'created_at', 'finished_at',
+        )
+        read_only_fields = (
+            'id', 'status', 'rows', 'imported', 'failed', 'rows_per_second',
+            'errors', 'created_at', 'finished_at',
+        )
+        extra_kwargs = {'format': {'required': False}}
+
+    def validate(self, data):
+        data['format'] = data.get('format') or detect_format(data['file'].name)
+        if data['format'] not in FORMATS:
+            raise serializers.ValidationError({
+                'format': f"Formats acceptés : {', '.join(FORMATS)}."
+            })
+        return data
@@ -0,0 +1,51 @@
+from django.db import connections
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import LISTING_FIELDS, books_changed
+from .models import Book
+from .search import get_search_backend
+
+
+@receiver(post_save, sender=Book)
+def index_book(sender, instance, using, **kwargs):
+    """Réindexer le livre enregistré"""
+    backend = get_search_backend(using)
+    if backend is not None:
+        backend.index(connections[using], [instance])
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book(sender, instance, using, **kwargs):
+    """Retirer le livre supprimé de l'index"""
+    backend = get_search_backend(using)
+    if backend is not None:
+        backend.remove(connections[using], [instance.pk])
+
+
+@receiver(pre_save, sender=Book)
+def remember_listing(sender, instance, using, update_fields=None, **kwargs):
+    """Noter si l'enregistrement change la place du livre dans les listes"""
+    if instance._state.adding:
+        instance._listing_changed = True
+        return
+    if update_fields is not None and not set(update_fields) & set(LISTING_FIELDS):
+        instance._listing_changed = False
+        return
+    previous = Book.objects.using(using).filter(pk=instance.pk).values(*LISTING_FIELDS).first()
+    instance._listing_changed = previous is None or any(
+        previous[field] != getattr(instance, field) for field in LISTING_FIELDS
+    )
+
+
+@receiver(post_save, sender=Book)
+def invalidate_saved_book(sender, instance, using, **kwargs):
+    """Invalider les réponses en cache qui contiennent le livre"""
+    listing = getattr(instance, '_listing_changed', True)
+    books_changed([instance.pk], listing, using)
+
+
+@receiver(post_delete, sender=Book)
+def invalidate_deleted_book(sender, instance, using, **kwargs):
+    """Invalider la fiche du livre supprimé et les listes"""
+    books_changed([instance.pk], listing=True, using=using)
@@ -1,3 +1,514 @@
-from django.test import TestCase
+import tempfile
+from io import StringIO
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase, force_authenticate
+
+from backend import replicas
+
+from .importers import run_import
+from .models import Book, BookImport
+from .cache import catalogue_cache
+from .search import fold, tokenize
+
+
+def create_book(index, **kwargs):
+    defaults = {
+        'title': f'Livre {index}',
+        'author': f'Auteur {index}',
+        'isbn': f'978{index:010d}',
+        'pages': 100,
+        'publication_year': 2020,
+        'category': 'Roman',
+    }
+    defaults.update(kwargs)
+    return Book.objects.create(**defaults)
+
+
+def async_get(viewset, action, path, data=None, user=None, **extra):
+    """``GET`` servi par la version asynchrone de ``action`` (``ASYNC_VIEWS``)"""
+    with override_settings(ASYNC_VIEWS=True):
+        view = viewset.as_view({'get': action})
+    assert iscoroutinefunction(view)
+    request = APIRequestFactory().get(path, data, **extra)
+    if user is not None:
+        force_authenticate(request, user)
+    response = async_to_sync(view)(request)
+    # Rendu fait d'ordinaire par le gestionnaire de Django (sauf réponse du cache)
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+class FoldTests(TestCase):
+
+    def test_accents_and_case(self):
+        self.assertEqual(fold('Les Misérables'), 'les miserables')
+        self.assertEqual(tokenize("L'Étranger, Camus"), ['l', 'etranger', 'camus'])
+
+    def test_isbn_hyphens(self):
+        self.assertEqual(tokenize('978-2-07-040922-8'), ['9782070409228'])
+
+
+class BookSearchTests(APITestCase):
+
+    def setUp(self):
+        self.miserables = create_book(
+            1, title='Les Misérables', author='Victor Hugo', isbn='9782070409228'
+        )
+        self.etranger = create_book(
+            2, title="L'Étranger", author='Albert Camus', isbn='9782070360024'
+        )
+        self.hugo = create_book(
+            3, title='Biographie', author='Hugo Pratt', isbn='9782203001237'
+        )
+
+    def search(self, query, **params):
+        response = self.client.get('/api/books/', {'search': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [book['id'] for book in response.data['results']]
+
+    def test_accent_folding(self):
+        self.assertEqual(self.search('miserables'), [self.miserables.pk])
+        self.assertEqual(self.search('ÉTRANGER'), [self.etranger.pk])
+
+    def test_prefix_and_isbn(self):
+        self.assertEqual(self.search('miser vic'), [self.miserables.pk])
+        self.assertEqual(self.search('978-2-07-036'), [self.etranger.pk])
+
+    def test_title_ranks_above_author(self):
+        title_match = create_book(4, title='Hugo', author='Anonyme')
+        ids = self.search('hugo')
+        self.assertEqual(ids[0], title_match.pk)
+        self.assertCountEqual(ids, [title_match.pk, self.miserables.pk, self.hugo.pk])
+
+    def test_explicit_ordering_wins(self):
+        self.assertEqual(
+            self.search('hugo', ordering='title'), [self.hugo.pk, self.miserables.pk]
+        )
+
+    def test_index_follows_save_and_delete(self):
+        self.miserables.title = 'Notre-Dame de Paris'
+        self.miserables.save()
+        self.assertEqual(self.search('miserables'), [])
+        self.assertEqual(self.search('notre dame'), [self.miserables.pk])
+        self.miserables.delete()
+        self.assertEqual(self.search('notre dame'), [])
+
+    def test_rebuild_command(self):
+        Book.objects.filter(pk=self.etranger.pk).update(title='La Peste')
+        self.assertEqual(self.search('peste'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', batch_size=2, stdout=out)
+        self.assertIn('3 livres', out.getvalue())
+        self.assertEqual(self.search('peste'), [self.etranger.pk])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM books_book_fts')
+            self.assertEqual(cursor.fetchone()[0], 3)
+
+
+CATALOGUE_CSV = """isbn;title;author;pages;publication_year;category
+9782070409228;Les Misérables;Victor Hugo;1900;1862;Roman
+9782070360024;L'Étranger;Albert Camus;186;1942;Roman
+9782070360025;Sans auteur;;100;2000;Roman
+"""
+
+CATALOGUE_ONIX = """<?xml version="1.0" encoding="UTF-8"?>
+<ONIXMessage release="3.0" xmlns="http://ns.editeur.org/onix/3.0/reference">
+  <Product>
+    <ProductIdentifier><ProductIDType>15</ProductIDType><IDValue>9782070409228</IDValue></ProductIdentifier>
+    <DescriptiveDetail>
+      <TitleDetail><TitleElement><TitleText>Les Misérables</TitleText></TitleElement></TitleDetail>
+      <Contributor><PersonName>Victor Hugo</PersonName></Contributor>
+      <Extent><ExtentValue>1900</ExtentValue></Extent>
+      <Subject><SubjectHeadingText>Roman</SubjectHeadingText></Subject>
+    </DescriptiveDetail>
+    <PublishingDetail><PublishingDate><Date>18620403</Date></PublishingDate></PublishingDetail>
+  </Product>
+</ONIXMessage>
+"""
+
+
+class BookImportTests(APITestCase):
+    """Import de catalogues par lots"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = Path(self.directory.name) / name
+        path.write_text(content, encoding='utf-8')
+        return str(path)
+
+    def test_csv_upsert_keeps_copies_in_circulation(self):
+        create_book(0, isbn='9782070409228', title='Ancien titre',
+                    total_copies=3, available_copies=1)
+        out, err = StringIO(), StringIO()
+        call_command(
+            'import_books', self.write('catalogue.csv', CATALOGUE_CSV),
+            chunk_size=2, stdout=out, stderr=err
+        )
+        self.assertIn('3 lignes, 2 importées, 1 erreurs', out.getvalue())
+        self.assertIn('Ligne 4', err.getvalue())
+        book = Book.objects.get(isbn='9782070409228')
+        self.assertEqual((book.title, book.available_copies), ('Les Misérables', 1))
+        self.assertEqual(Book.objects.count(), 2)
+        # Les livres importés sont indexés malgré bulk_create
+        response = self.client.get('/api/books/', {'search': 'etranger'})
+        self.assertEqual(response.data['count'], 1)
+
+    def test_xlsx(self):
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['ISBN', 'Title', 'Author', 'Pages', 'Publication_year', 'Category'])
+        sheet.append([9782070409228, 'Les Misérables', 'Victor Hugo', 1900, 1862, 'Roman'])
+        path = str(Path(self.directory.name) / 'catalogue.xlsx')
+        workbook.save(path)
+        call_command('import_books', path, stdout=StringIO())
+        self.assertEqual(Book.objects.get().isbn, '9782070409228')
+
+    def test_onix(self):
+        call_command(
+            'import_books', self.write('catalogue.xml', CATALOGUE_ONIX), stdout=StringIO()
+        )
+        book = Book.objects.get()
+        self.assertEqual(
+            (book.title, book.author, book.pages, book.publication_year),
+            ('Les Misérables', 'Victor Hugo', 1900, 1862)
+        )
+
+    def test_upload_endpoint(self):
+        staff = get_user_model().objects.create_user(
+            username='staff', email='staff@example.com', is_staff=True
+        )
+        self.client.force_authenticate(staff)
+        upload = SimpleUploadedFile('catalogue.csv', CATALOGUE_CSV.encode())
+        with override_settings(MEDIA_ROOT=self.directory.name), \
+                mock.patch('books.views.start_import', side_effect=run_import):
+            response = self.client.post('/api/books/import/', {'file': upload})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['format'], 'csv')
+
+        response = self.client.get(f"/api/books/import/{response.data['id']}/")
+        self.assertEqual(
+            (response.data['status'], response.data['imported'], response.data['failed']),
+            ('done', 2, 1)
+        )
+
+
+class BookExportTests(APITestCase):
+
+    def test_export_follows_search(self):
+        create_book(1, title='Les Misérables')
+        create_book(2, title='La Peste')
+        response = self.client.get('/api/books/export/', {'search': 'peste'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('La Peste', lines[1])
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="books.csv"')
+
+
+class BookCursorPaginationTests(APITestCase):
+
+    def test_catalogue_cursor(self):
+        for index in range(12):
+            create_book(index)
+        first = self.client.get('/api/books/', {'cursor': ''})
+        second = self.client.get(first.data['next'])
+        ids = [book['id'] for book in first.data['results'] + second.data['results']]
+        self.assertEqual(ids, list(range(12, 0, -1)))
+        self.assertIsNone(second.data['next'])
+
+
+class CatalogueCacheTests(APITestCase):
+
+    def setUp(self):
+        catalogue_cache().clear()
+        self.books = [create_book(index) for index in range(3)]
+
+    def test_list_hit_runs_no_query(self):
+        first = self.client.get('/api/books/', {'ordering': 'title'})
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/books/', {'ordering': 'title'})
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_write_during_a_miss_is_not_kept(self):
+        from .cache import books_changed
+        from .serializers import BookSerializer
+
+        book = self.books[0]
+        render = BookSerializer.to_representation
+
+        def checkout_meanwhile(serializer, instance):
+            data = render(serializer, instance)
+            Book.objects.filter(pk=book.pk).update(available_copies=0)
+            books_changed([book.pk])
+            return data
+
+        with mock.patch.object(BookSerializer, 'to_representation', checkout_meanwhile):
+            stale = self.client.get(f'/api/books/{book.pk}/')
+        self.assertEqual((stale['X-Cache'], stale.data['available_copies']), ('MISS', 1))
+        fresh = self.client.get(f'/api/books/{book.pk}/')
+        self.assertEqual((fresh['X-Cache'], fresh.data['available_copies']), ('MISS', 0))
+
+    def test_async_list(self):
+        from .views import BookViewSet
+
+        expected = self.client.get('/api/books/', {'ordering': 'title'}).content
+        catalogue_cache().clear()
+        first = async_get(BookViewSet, 'list', '/api/books/', {'ordering': 'title'})
+        self.assertEqual((first['X-Cache'], first.content), ('MISS', expected))
+        with self.assertNumQueries(0):
+            second = async_get(BookViewSet, 'list', '/api/books/', {'ordering': 'title'})
+        self.assertEqual((second['X-Cache'], second.content), ('HIT', expected))
+        # Paramètre hors clé : liste asynchrone sans cache (COUNT + page)
+        with self.assertNumQueries(2):
+            response = async_get(BookViewSet, 'list', '/api/books/', {'category': 'Roman'})
+        self.assertEqual(response.data['count'], 3)
+
+    def test_search_key_is_normalized(self):
+        self.client.get('/api/books/', {'search': 'Livre'})
+        response = self.client.get('/api/books/', {'search': '  livre '})
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_if_none_match(self):
+        etag = self.client.get(f'/api/books/{self.books[0].pk}/')['ETag']
+        response = self.client.get(f'/api/books/{self.books[0].pk}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_edit_evicts_only_affected_entries(self):
+        first, second = self.books[0].pk, self.books[1].pk
+        self.client.get(f'/api/books/{first}/')
+        self.client.get(f'/api/books/{second}/')
+        self.client.get('/api/books/')
+
+        book = Book.objects.get(pk=first)
+        book.description = 'Nouvelle description'
+        book.save()
+
+        self.assertEqual(self.client.get(f'/api/books/{first}/')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(f'/api/books/{second}/')['X-Cache'], 'HIT')
+        response = self.client.get('/api/books/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        # Une liste qui ne contient pas le livre reste en cache
+        self.client.get('/api/books/', {'search': 'inconnu'})
+        book.description = 'Autre description'
+        book.save()
+        self.assertEqual(self.client.get('/api/books/', {'search': 'inconnu'})['X-Cache'], 'HIT')
+
+    def test_listing_field_change_evicts_lists(self):
+        self.client.get('/api/books/', {'search': 'inconnu'})
+        book = Book.objects.get(pk=self.books[0].pk)
+        book.title = 'Inconnu'
+        book.save()
+        response = self.client.get('/api/books/', {'search': 'inconnu'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual([row['id'] for row in response.data['results']], [book.pk])
+
+    def test_checkout_evicts_book(self):
+        from loans.models import Loan
+
+        self.client.get(f'/api/books/{self.books[0].pk}/')
+        user = get_user_model().objects.create_user('lecteur', password='x')
+        Loan.objects.checkout(user, self.books[0])
+        response = self.client.get(f'/api/books/{self.books[0].pk}/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['available_copies'], 0)
+
+    def test_other_params_bypass_cache(self):
+        response = self.client.get('/api/books/', {'category': 'Roman'})
+        self.assertNotIn('X-Cache', response)
+
+
+class BookQueryCountTests(APITestCase):
+    """Requêtes par page du catalogue, cache vide"""
+
+    def setUp(self):
+        catalogue_cache().clear()
+
+    def test_list(self):
+        for size in (3, 30):
+            for index in range(Book.objects.count(), size):
+                create_book(index)
+            with self.assertNumQueries(2):
+                response = self.client.get('/api/books/', {'page_size': size})
+            self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_retrieve(self):
+        book = create_book(0)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/books/{book.pk}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_import_status(self):
+        staff = get_user_model().objects.create_user(
+            username='staff', email='staff@example.com', is_staff=True
+        )
+        job = BookImport.objects.create(file='imports/catalogue.csv', created_by=staff)
+        self.client.force_authenticate(staff)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/books/import/{job.pk}/')
+        self.assertEqual(response.status_code, 200)
+
+
+class BookUpdateTests(APITestCase):
+
+    def test_update_keeps_concurrent_counters(self):
+        from django.db.models import F
+        from .serializers import BookSerializer
+
+        book = create_book(0, total_copies=2, available_copies=2)
+        update = BookSerializer.update
+
+        def checkout_meanwhile(serializer, instance, validated_data):
+            # Emprunt entre la lecture du livre et son enregistrement
+            Book.objects.filter(pk=book.pk).update(
+                available_copies=F('available_copies') - 1,
+                active_loans_count=F('active_loans_count') + 1,
+            )
+            return update(serializer, instance, validated_data)
+
+        data = {
+            'title': 'Nouveau titre', 'author': book.author, 'isbn': book.isbn,
+            'pages': book.pages, 'publication_year': book.publication_year,
+            'category': book.category,
+        }
+        with mock.patch.object(BookSerializer, 'update', checkout_meanwhile):
+            response = self.client.put(f'/api/books/{book.pk}/', data)
+        self.assertEqual(response.status_code, 200)
+        book.refresh_from_db()
+        self.assertEqual(
+            (book.title, book.available_copies, book.active_loans_count),
+            ('Nouveau titre', 1, 1)
+        )
+
+
+class ReconcileCountersTests(APITestCase):
+    """Compteurs dénormalisés : recalcul et écarts signalés"""
+
+    def setUp(self):
+        from loans.models import Loan
+        from reservations.models import Reservation
+
+        reader = get_user_model().objects.create_user(username='lecteur', email='lecteur@example.com')
+        self.book = create_book(0, total_copies=2, available_copies=2)
+        self.untouched = create_book(1)
+        Loan.objects.checkout(reader, self.book)
+        Reservation.objects.create(
+            user=reader, book=self.book, pickup_deadline=timezone.now() + timedelta(days=7)
+        )
+
+    def reconcile(self, *args):
+        out = StringIO()
+        call_command('reconcile_book_counters', *args, verbosity=2, stdout=out)
+        return out.getvalue()
+
+    def test_listed_in_catalogue(self):
+        response = self.client.get('/api/books/')
+        book = next(item for item in response.data['results'] if item['id'] == self.book.pk)
+        self.assertEqual((book['active_loans_count'], book['pending_reservations_count']), (1, 1))
+
+    def test_no_drift(self):
+        self.assertIn('0 livres corrigés', self.reconcile())
+
+    def test_drift_reported_then_fixed(self):
+        Book.objects.filter(pk=self.book.pk).update(
+            active_loans_count=5, pending_reservations_count=0
+        )
+        output = self.reconcile('--dry-run')
+        self.assertIn(
+            f'Livre {self.book.pk} : active_loans_count 5 -> 1, pending_reservations_count 0 -> 1',
+            output
+        )
+        self.assertIn('1 livres à corriger (active_loans_count -4, pending_reservations_count +1)', output)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.active_loans_count, 5)
+
+        self.assertIn('1 livres corrigés', self.reconcile())
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.active_loans_count, self.book.pending_reservations_count), (1, 1))
+        self.assertIn('0 livres corrigés', self.reconcile())
+
+
+# Épinglage au primaire visible de tous les processus (voir check_pin_cache)
+SHARED_CACHES = {
+    **settings.CACHES,
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': str(Path(tempfile.gettempdir()) / 'bibliotheque-tests-cache'),
+    },
+}
+
+
+@override_settings(READ_REPLICAS=['replica1'], CACHES=SHARED_CACHES)
+class ReplicaRoutingTests(TransactionTestCase):
+    """Catalogue lu sur le réplica (miroir de ``default`` sous les tests)"""
+    databases = {'default', 'replica1'}
+    client_class = APIClient
+
+    def setUp(self):
+        cache.clear()
+        catalogue_cache().clear()
+        replicas._health.clear()
+        self.book = create_book(0, total_copies=2, available_copies=2)
+        self.reader = get_user_model().objects.create_user(
+            username='lecteur', email='lecteur@example.com'
+        )
+
+    def assertReadFrom(self, alias, url):
+        other = 'default' if alias == 'replica1' else 'replica1'
+        catalogue_cache().clear()
+        with self.assertNumQueries(0, using=other), self.assertNumQueries(2, using=alias):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_catalogue_reads_go_to_replica(self):
+        self.assertReadFrom('replica1', '/api/books/')
+        self.assertReadFrom('replica1', f'/api/reservations/queue_status/?book_id={self.book.pk}')
+        # Les actions non déclarées restent sur le primaire
+        with self.assertNumQueries(0, using='replica1'):
+            self.client.get('/api/loans/')
+
+    def test_reader_sees_own_writes(self):
+        self.client.force_authenticate(self.reader)
+        response = self.client.post('/api/loans/', {'user': self.reader.pk, 'book': self.book.pk})
+        self.assertEqual(response.status_code, 201)
+        self.assertReadFrom('default', '/api/books/')
+
+        # Les autres lecteurs restent sur le réplica
+        self.client.force_authenticate(None)
+        self.assertReadFrom('replica1', '/api/books/')
+
+    def test_process_local_pin_cache_is_refused(self):
+        local = {**SHARED_CACHES, 'default': {'BACKEND': replicas.PROCESS_LOCAL_CACHES[0]}}
+        with override_settings(CACHES=local), self.assertRaises(ImproperlyConfigured):
+            replicas.ReplicaPinMiddleware(lambda request: None)
+
+    def test_replica_reads_are_not_cached(self):
+        self.client.get('/api/books/')
+        response = self.client.get('/api/books/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    @override_settings(REPLICA_MAX_LAG=5)
+    def test_lagging_replica_falls_back_to_primary(self):
+        with mock.patch.object(replicas, 'replica_lag', return_value=60.0):
+            self.assertReadFrom('default', '/api/books/')
@@ -1,14 +1,58 @@
-from rest_framework import viewsets, filters
-from .models import Book
-from .serializers import BookSerializer
-from rest_framework.permissions import AllowAny
+from rest_framework import viewsets, filters, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from .models import Book, BookImport
+from .serializers import BookSerializer, BookImportSerializer
+from .filters import BookSearchFilter
+from .cache import CatalogueCacheMixin
+from .importers import start_import
+from backend.async_views import AsyncViewSetMixin
+from backend.exports import ExportMixin
+from backend.metrics import SerializationTimingMixin
+from backend.replicas import ReplicaReadMixin
+from rest_framework.permissions import AllowAny, IsAdminUser
 
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(SerializationTimingMixin, ReplicaReadMixin, CatalogueCacheMixin, ExportMixin,
+                  AsyncViewSetMixin, viewsets.ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    # La recherche passe après le tri pour pouvoir trier par pertinence
+    filter_backends = [filters.OrderingFilter, BookSearchFilter]
     search_fields = ['title', 'author', 'isbn']
     ordering_fields = ['title', 'rating', 'created_at']
     ordering = ['-created_at']
     permission_classes=[AllowAny]
-    
\ No newline at end of file
+
+    # Catalogue (consultation, export) lu sur un réplica
+    replica_actions = ('list', 'retrieve', 'export')
+    # Sous ASGI (ASYNC_VIEWS) : liste servie par CatalogueCacheMixin.alist
+    async_actions = ('list',)
+
+    export_filename = 'books'
+    export_fields = (
+        'id', 'isbn', 'title', 'author', 'category', 'language', 'publication_year',
+        'pages', 'total_copies', 'available_copies', 'active_loans_count',
+        'pending_reservations_count', 'status', 'rating',
+    )
+
+    @action(detail=False, methods=['post'], url_path='import',
+            permission_classes=[IsAdminUser], serializer_class=BookImportSerializer)
+    def import_catalogue(self, request):
+        """Déposer un catalogue (CSV, XLSX, ONIX) importé en tâche de fond"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = serializer.save(created_by=request.user)
+        start_import(job)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'], url_path=r'import/(?P<import_id>\d+)',
+            permission_classes=[IsAdminUser], serializer_class=BookImportSerializer)
+    def import_status(self, request, import_id=None):
+        """Suivre l'avancement d'un import"""
+        job = BookImport.objects.filter(pk=import_id).first()
+        if job is None:
+            return Response(
+                {'detail': 'Import introuvable.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(self.get_serializer(job).data)
@@ -0,0 +1,35 @@
+"""Configuration gunicorn : WSGI (threads) ou ASGI (uvicorn) selon ``SERVER_MODE``.
+
+    gunicorn                        # WSGI, workers gthread
+    SERVER_MODE=asgi gunicorn       # ASGI, workers uvicorn et vues asynchrones
+
+Variables d'environnement :
+
+- ``WEB_CONCURRENCY`` : processus, un par cœur par défaut ;
+- ``GUNICORN_THREADS`` (WSGI) : requêtes simultanées par processus ;
+- ``ASGI_THREADS`` (ASGI, lu par asgiref) : threads par processus pour le
+  code synchrone (authentification, ORM, écritures) ;
+- ``BIND`` : adresse d'écoute, ``127.0.0.1:8000`` par défaut.
+
+En ASGI, ``ASYNC_VIEWS`` est activé (voir ``backend/async_views.py``).
+Avec PostgreSQL, garder le pool (``DATABASE_POOL``) : les connexions
+persistantes (``CONN_MAX_AGE``) sont liées à un thread et ne conviennent
+pas aux threads d'asgiref.
+"""
+import os
+
+mode = os.environ.get('SERVER_MODE', 'wsgi')
+
+bind = os.environ.get('BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+timeout = 30
+keepalive = 5
+
+if mode == 'asgi':
+    wsgi_app = 'backend.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+    raw_env = ['ASYNC_VIEWS=True']
+else:
+    wsgi_app = 'backend.wsgi:application'
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', 8))
@@ -61,12 +61,16 @@ class LoanAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        # Colonnes dérivées calculées en SQL, triables dans la liste
+        return super().get_queryset(request).with_derived()
+
     # ----------- Méthodes affichage admin -----------
 
-    @admin.display(boolean=True, description="En retard")
+    @admin.display(boolean=True, description="En retard", ordering='is_overdue')
     def is_overdue_display(self, obj):
         return obj.is_overdue
 
-    @admin.display(description="Jours restants")
+    @admin.display(description="Jours restants", ordering='days_left')
     def days_left_display(self, obj):
         return obj.days_left
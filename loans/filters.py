@@ -0,0 +1,13 @@
+import django_filters
+
+from .models import Loan
+
+
+class LoanFilter(django_filters.FilterSet):
+    """Filtres des emprunts, y compris sur les champs annotés (``with_derived``)"""
+    is_overdue = django_filters.BooleanFilter()
+    can_renew = django_filters.BooleanFilter()
+
+    class Meta:
+        model = Loan
+        fields = ['status', 'user', 'is_overdue', 'can_renew']
@@ -0,0 +1,56 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from loans.models import Loan
+from reservations.models import Reservation
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Matérialiser les statuts temporels : emprunts en retard, "
+        "réservations expirées (et promotion du suivant dans la file)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help="Relancer le balayage en continu au lieu d'une seule passe"
+        )
+        parser.add_argument(
+            '--interval', type=int, default=300,
+            help='Secondes entre deux passes avec --loop (défaut : 300)'
+        )
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            self.sweep()
+            return
+        try:
+            while True:
+                started = time.monotonic()
+                self.sweep()
+                close_old_connections()
+                time.sleep(max(0, options['interval'] - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            self.stdout.write('Arrêt du balayage.')
+
+    def sweep(self):
+        now = timezone.now()
+        started = time.perf_counter()
+        overdue = Loan.objects.mark_overdue(now)
+        reservations = Reservation.objects.expire(now)
+        elapsed = (time.perf_counter() - started) * 1000
+
+        message = (
+            f"{overdue} emprunts en retard, {reservations['expired']} réservations "
+            f"expirées, {reservations['promoted']} promues ({elapsed:.1f} ms)"
+        )
+        logger.info(message)
+        self.stdout.write(message)
+        return {'overdue': overdue, **reservations}
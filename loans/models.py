@@ -1,11 +1,198 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import BooleanField, Case, F, Q, Value, When
 from django.contrib.auth import get_user_model
 from books.models import Book
+from books.cache import books_changed
+from backend.annotations import annotated_property, days_left
 from django.utils import timezone
 from datetime import timedelta
+from collections import Counter, defaultdict
 
 User = get_user_model()
 
+# Emprunts comptés dans ``Book.active_loans_count`` : exemplaires sortis
+OUTSTANDING_STATUSES = ('active', 'overdue')
+
+
+def _return_copies(book_counts, now, using=None):
+    """Remettre en rayon ``book_counts[book_id]`` exemplaires par livre
+
+    Le compteur d'emprunts en cours baisse d'autant. Un UPDATE par nombre
+    distinct d'exemplaires rendus (le plus souvent un seul), quel que soit
+    le nombre de livres.
+    """
+    books_changed(book_counts, using=using)
+    by_count = defaultdict(list)
+    for book_id, count in book_counts.items():
+        by_count[count].append(book_id)
+    for count, book_ids in by_count.items():
+        Book.objects.using(using).filter(pk__in=book_ids).update(
+            available_copies=F('available_copies') + count,
+            active_loans_count=F('active_loans_count') - count,
+            status=Case(
+                When(status='borrowed', then=Value('available')),
+                default=F('status')
+            ),
+            updated_at=now
+        )
+
+
+class LoanQuerySet(models.QuerySet):
+
+    def with_derived(self, now=None):
+        """Annoter ``is_overdue``, ``days_left`` et ``can_renew`` (filtrables, triables)"""
+        now = now or timezone.now()
+        return self.annotate(
+            is_overdue=Case(
+                When(Q(status='overdue') | Q(status='active', due_date__lt=now), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+            days_left=Case(
+                When(status__in=['active', 'overdue'], then=days_left('due_date', now)),
+                default=Value(0),
+            ),
+            can_renew=Case(
+                When(status='active', renewed_count__lt=F('renewable_count'), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+        )
+
+
+class LoanManager(models.Manager.from_queryset(LoanQuerySet)):
+    """Manager des emprunts : sortie atomique des exemplaires"""
+
+    def checkout(self, user, book, due_date=None, **fields):
+        """Emprunter un exemplaire de ``book`` pour ``user``
+
+        L'exemplaire est réservé par un UPDATE conditionnel
+        (``available_copies > 0``) dans la même transaction que la création
+        de l'emprunt : sous forte concurrence, il ne sort jamais plus
+        d'exemplaires qu'il n'y en a. Retourne None si aucun n'est disponible.
+        """
+        now = timezone.now()
+        book_id = getattr(book, 'pk', book)
+        with transaction.atomic(using=self.db):
+            taken = Book.objects.using(self.db).filter(
+                pk=book_id,
+                available_copies__gt=0
+            ).exclude(status='maintenance').update(
+                available_copies=F('available_copies') - 1,
+                active_loans_count=F('active_loans_count') + 1,
+                status=Case(
+                    When(available_copies=1, then=Value('borrowed')),
+                    default=F('status')
+                ),
+                updated_at=now
+            )
+            if not taken:
+                return None
+            books_changed([book_id], using=self.db)
+            return self.create(
+                user=user,
+                book_id=book_id,
+                due_date=due_date or now + timedelta(days=14),
+                **fields
+            )
+
+    def mark_overdue(self, now=None):
+        """Passer en ``overdue`` les emprunts actifs dont l'échéance est passée
+
+        Un seul UPDATE ensembliste ; retourne le nombre d'emprunts modifiés.
+        """
+        now = now or timezone.now()
+        return self.filter(status='active', due_date__lt=now).update(
+            status='overdue', updated_at=now
+        )
+
+    def bulk_checkout(self, user, book_ids, due_date=None):
+        """Emprunter une pile de livres pour ``user`` en une transaction
+
+        Les livres sont verrouillés et validés en une requête, puis les
+        exemplaires et les emprunts sont écrits avec ``bulk_update`` et
+        ``bulk_create``. Retourne un résultat par livre demandé, dans
+        l'ordre : ``{'book': id, 'loan': Loan ou None, 'detail': erreur}``.
+        """
+        now = timezone.now()
+        due_date = due_date or now + timedelta(days=14)
+        results = []
+        with transaction.atomic(using=self.db):
+            books = Book.objects.using(self.db).select_for_update().only(
+                'id', 'title', 'available_copies', 'status'
+            ).order_by().in_bulk(set(book_ids))
+            taken = Counter()
+            loans = []
+            for book_id in book_ids:
+                book = books.get(book_id)
+                result = {'book': book_id, 'loan': None, 'detail': None}
+                if book is None:
+                    result['detail'] = 'Livre introuvable.'
+                elif book.status == 'maintenance':
+                    result['detail'] = 'Livre en maintenance.'
+                elif book.available_copies - taken[book_id] <= 0:
+                    result['detail'] = 'Aucun exemplaire disponible.'
+                else:
+                    taken[book_id] += 1
+                    result['loan'] = self.model(
+                        user=user, book=book, due_date=due_date
+                    )
+                    loans.append(result['loan'])
+                results.append(result)
+
+            for book_id, count in taken.items():
+                book = books[book_id]
+                book.available_copies -= count
+                if book.available_copies == 0:
+                    book.status = 'borrowed'
+                book.active_loans_count = F('active_loans_count') + count
+                book.updated_at = now
+            Book.objects.using(self.db).bulk_update(
+                [books[book_id] for book_id in taken],
+                ['available_copies', 'active_loans_count', 'status', 'updated_at']
+            )
+            books_changed(taken, using=self.db)
+            self.bulk_create(loans)
+        return results
+
+    def bulk_return(self, loan_ids):
+        """Retourner une pile d'emprunts en une transaction
+
+        Retourne un résultat par emprunt demandé, dans l'ordre :
+        ``{'loan_id': id, 'loan': Loan ou None, 'detail': erreur}``.
+        """
+        now = timezone.now()
+        results = []
+        with transaction.atomic(using=self.db):
+            loans = self.select_for_update().select_related(
+                'user', 'book'
+            ).order_by().in_bulk(set(loan_ids))
+            returned = {}
+            for loan_id in loan_ids:
+                loan = loans.get(loan_id)
+                result = {'loan_id': loan_id, 'loan': None, 'detail': None}
+                if loan is None:
+                    result['detail'] = 'Emprunt introuvable.'
+                elif loan.status == 'returned' or loan_id in returned:
+                    result['detail'] = 'Ce livre a déjà été retourné.'
+                else:
+                    loan.status = 'returned'
+                    loan.return_date = now
+                    loan.updated_at = now
+                    returned[loan_id] = loan
+                    result['loan'] = loan
+                results.append(result)
+
+            if returned:
+                self.filter(pk__in=returned).update(
+                    status='returned', return_date=now, updated_at=now
+                )
+                _return_copies(
+                    Counter(loan.book_id for loan in returned.values()), now, self.db
+                )
+        return results
+
+
 class Loan(models.Model):
     """Modèle pour les emprunts de livres"""
     
@@ -27,30 +214,49 @@ class Loan(models.Model):
     renewed_count = models.IntegerField(default=0)
     
     notes = models.TextField(blank=True)
+    # Validateur des requêtes conditionnelles : les UPDATE en masse le
+    # renseignent eux-mêmes
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = LoanManager()
     
     class Meta:
         ordering = ['-borrow_date']
+        indexes = [
+            # Pagination par curseur (-borrow_date, -id)
+            models.Index(fields=['-borrow_date', '-id'], name='loan_borrow_keyset_idx'),
+            models.Index(fields=['user', '-borrow_date', '-id'], name='loan_user_borrow_keyset_idx'),
+            # overdue_loans, filtres ?user=&status=
+            models.Index(fields=['user', 'status', 'due_date'], name='loan_user_status_due_idx'),
+            # Balayage des retards : seuls les emprunts en cours
+            models.Index(
+                fields=['due_date'], condition=models.Q(status='active'),
+                name='loan_active_due_idx'
+            ),
+        ]
     
     def save(self, *args, **kwargs):
         # Définir la date d'échéance à 14 jours
         if not self.due_date:
-            self.due_date = self.borrow_date + timedelta(days=14)
+            self.due_date = (self.borrow_date or timezone.now()) + timedelta(days=14)
         super().save(*args, **kwargs)
     
-    @property
+    @annotated_property
     def is_overdue(self):
+        if self.status == 'overdue':
+            return True
         if self.status == 'active' and timezone.now() > self.due_date:
             return True
         return False
     
-    @property
+    @annotated_property
     def days_left(self):
-        if self.status == 'active':
+        if self.status in ['active', 'overdue']:
             days = (self.due_date - timezone.now()).days
             return max(0, days)
         return 0
     
-    @property
+    @annotated_property
     def can_renew(self):
         """Vérifier si l'emprunt peut être renouvelé"""
         return self.renewed_count < self.renewable_count and self.status == 'active'
@@ -60,17 +266,29 @@ class Loan(models.Model):
         if self.can_renew:
             self.due_date = timezone.now() + timedelta(days=14)
             self.renewed_count += 1
-            self.save()
+            self.save(update_fields=['due_date', 'renewed_count', 'updated_at'])
+            annotated_property.discard(self)
             return True
         return False
     
     def return_book(self):
-        """Marquer le livre comme retourné"""
-        self.return_date = timezone.now()
+        """Marquer le livre comme retourné et remettre l'exemplaire en rayon
+
+        Retourne False si l'emprunt était déjà retourné.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            returned = Loan.objects.filter(pk=self.pk).exclude(
+                status='returned'
+            ).update(status='returned', return_date=now, updated_at=now)
+            if not returned:
+                return False
+            _return_copies({self.book_id: 1}, now)
         self.status = 'returned'
-        self.book.is_available = True
-        self.book.save()
-        self.save()
+        self.return_date = now
+        self.updated_at = now
+        annotated_property.discard(self)
+        return True
     
     def __str__(self):
         return f"{self.user.username} - {self.book.title} ({self.status})"
\ No newline at end of file
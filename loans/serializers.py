@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from backend.values_serializer import ValuesSerializer
 from .models import Loan
 from books.models import Book
 from django.contrib.auth import get_user_model
@@ -11,9 +12,10 @@ class LoanSerializer(serializers.ModelSerializer):
     
     user_username = serializers.CharField(source='user.username', read_only=True)
     book_title = serializers.CharField(source='book.title', read_only=True)
-    is_overdue = serializers.SerializerMethodField()
+    # Annotés par Loan.objects.with_derived (propriétés Python sinon)
+    is_overdue = serializers.BooleanField(read_only=True)
     days_left = serializers.IntegerField(read_only=True)
-    can_renew = serializers.SerializerMethodField()
+    can_renew = serializers.BooleanField(read_only=True)
     
     class Meta:
         model = Loan
@@ -27,12 +29,38 @@ class LoanSerializer(serializers.ModelSerializer):
             'id', 'borrow_date', 'return_date', 'user_username',
             'book_title', 'is_overdue', 'days_left', 'can_renew'
         ]
-    
-    def get_is_overdue(self, obj):
-        return obj.is_overdue
-    
-    def get_can_renew(self, obj):
-        return obj.can_renew
+        # 14 jours par défaut (voir Loan.objects.checkout)
+        extra_kwargs = {'due_date': {'required': False}}
+
+
+class LoanListSerializer(ValuesSerializer):
+    """Même sortie que ``LoanSerializer``, pour les listes annotées par ``with_derived``"""
+
+    columns = (
+        'id', 'user', 'user__username', 'book', 'book__title',
+        'borrow_date', 'due_date', 'return_date', 'status',
+        'renewable_count', 'renewed_count', 'is_overdue', 'days_left',
+        'can_renew', 'notes',
+    )
+
+    def to_representation(self, row):
+        return {
+            'id': row['id'],
+            'user': row['user'],
+            'user_username': row['user__username'],
+            'book': row['book'],
+            'book_title': row['book__title'],
+            'borrow_date': self.datetime(row['borrow_date']),
+            'due_date': self.datetime(row['due_date']),
+            'return_date': self.datetime(row['return_date']),
+            'status': row['status'],
+            'renewable_count': row['renewable_count'],
+            'renewed_count': row['renewed_count'],
+            'is_overdue': row['is_overdue'],
+            'days_left': row['days_left'],
+            'can_renew': row['can_renew'],
+            'notes': row['notes'],
+        }
 
 
 class LoanDetailSerializer(serializers.ModelSerializer):
@@ -40,9 +68,10 @@ class LoanDetailSerializer(serializers.ModelSerializer):
     
     user = serializers.SerializerMethodField()
     book = serializers.SerializerMethodField()
-    is_overdue = serializers.SerializerMethodField()
+    # Voir LoanSerializer
+    is_overdue = serializers.BooleanField(read_only=True)
     days_left = serializers.IntegerField(read_only=True)
-    can_renew = serializers.SerializerMethodField()
+    can_renew = serializers.BooleanField(read_only=True)
     
     class Meta:
         model = Loan
@@ -71,11 +100,25 @@ class LoanDetailSerializer(serializers.ModelSerializer):
             'title': obj.book.title,
             'author': str(obj.book.author),
             'isbn': obj.book.isbn,
-            'is_available': obj.book.is_available
+            'is_available': obj.book.available_copies > 0
         }
-    
-    def get_is_overdue(self, obj):
-        return obj.is_overdue
-    
-    def get_can_renew(self, obj):
-        return obj.can_renew
\ No newline at end of file
+
+
+# Taille maximale d'un lot au comptoir de prêt
+BULK_MAX_ITEMS = 100
+
+
+class BulkCheckoutSerializer(serializers.Serializer):
+    """Lot d'emprunts scannés au comptoir pour un même lecteur"""
+    user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), required=False)
+    books = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=BULK_MAX_ITEMS
+    )
+    due_date = serializers.DateTimeField(required=False)
+
+
+class BulkReturnSerializer(serializers.Serializer):
+    """Lot de retours scannés au comptoir"""
+    loans = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=BULK_MAX_ITEMS
+    )
@@ -0,0 +1,21 @@
+from django.db.models import F
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from books.cache import books_changed
+from books.models import Book
+
+from .models import OUTSTANDING_STATUSES, Loan
+
+
+@receiver(post_delete, sender=Loan)
+def uncount_deleted_loan(sender, instance, using, **kwargs):
+    """Décompter un emprunt en cours supprimé"""
+    if instance.status not in OUTSTANDING_STATUSES:
+        return
+    books_changed([instance.book_id], using=using)
+    Book.objects.using(using).filter(pk=instance.book_id).update(
+        active_loans_count=F('active_loans_count') - 1,
+        updated_at=timezone.now()
+    )
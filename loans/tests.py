@@ -1,3 +1,449 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from books.models import Book
+from books.tests import async_get, create_book
+from .models import Loan
+from .serializers import LoanListSerializer, LoanSerializer
+
+User = get_user_model()
+
+
+def create_loan(user, book, **kwargs):
+    kwargs.setdefault('due_date', timezone.now() + timedelta(days=14))
+    return Loan.objects.create(user=user, book=book, **kwargs)
+
+
+class LoanQueryCountTests(APITestCase):
+    """Le nombre de requêtes par page ne dépend pas du nombre d'emprunts"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='lecteur', email='lecteur@example.com', password='secret123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def seed(self, count, start=0, **kwargs):
+        for index in range(start, start + count):
+            create_loan(self.user, create_book(index), **kwargs)
+
+    def assertConstantQueries(self, expected, url, **seed_kwargs):
+        self.seed(3, **seed_kwargs)
+        with self.assertNumQueries(expected):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.seed(20, start=3, **seed_kwargs)
+        with self.assertNumQueries(expected):
+            response = self.client.get(url, {'page_size': 100})
+        self.assertEqual(response.status_code, 200)
+
+    def test_list(self):
+        self.assertConstantQueries(2, '/api/loans/')
+
+    def test_my_loans(self):
+        self.assertConstantQueries(2, '/api/loans/my_loans/')
+
+    def test_overdue_loans(self):
+        self.assertConstantQueries(
+            2, '/api/loans/overdue_loans/',
+            due_date=timezone.now() - timedelta(days=1),
+        )
+
+    def test_retrieve(self):
+        loan = create_loan(self.user, create_book(0))
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/loans/{loan.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['user']['username'], 'lecteur')
+        self.assertEqual(response.data['book']['title'], 'Livre 0')
+
+    def test_renew(self):
+        loan = create_loan(self.user, create_book(0))
+        with self.assertNumQueries(2):
+            response = self.client.post(f'/api/loans/{loan.pk}/renew/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['book_title'], 'Livre 0')
+
+    def test_return_book(self):
+        loan = create_loan(self.user, create_book(0))
+        # Lecture, puis emprunt et exemplaire mis à jour dans un point de sauvegarde
+        with self.assertNumQueries(5):
+            response = self.client.post(f'/api/loans/{loan.pk}/return_book/')
+        self.assertEqual(response.status_code, 200)
+
+
+class LoanListSerializerTests(APITestCase):
+
+    def test_same_output_as_model_serializer(self):
+        user = User.objects.create_user(username='lecteur', email='lecteur@example.com')
+        now = timezone.now()
+        create_loan(user, create_book(0))
+        create_loan(user, create_book(1), due_date=now - timedelta(days=2))
+        create_loan(user, create_book(2), status='overdue', due_date=now - timedelta(days=5))
+        create_loan(user, create_book(3), status='returned', return_date=now, renewed_count=2)
+        loans = Loan.objects.select_related('user', 'book').order_by('id')
+
+        # Propriétés Python d'un côté, annotations SQL de l'autre
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            expected = LoanSerializer(loans, many=True).data
+        reader = LoanListSerializer()
+        rows = reader.serialize(loans.with_derived(now).values(*reader.columns))
+        self.assertEqual(rows, expected)
+        # Même ordre des clés dans le JSON
+        self.assertEqual([list(row) for row in rows], [list(row) for row in expected])
+
+
+class LoanDerivedFieldsTests(APITestCase):
+    """Champs dérivés filtrés et triés par la base"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='lecteur', email='lecteur@example.com')
+        self.client.force_authenticate(self.user)
+        now = timezone.now()
+        self.late = create_loan(self.user, create_book(0), due_date=now - timedelta(days=3))
+        self.later = create_loan(self.user, create_book(1), status='overdue', due_date=now - timedelta(days=9))
+        self.soon = create_loan(self.user, create_book(2), due_date=now + timedelta(days=2, hours=12))
+        self.returned = create_loan(self.user, create_book(3), status='returned')
+
+    def test_filter_and_order_in_sql(self):
+        response = self.client.get(
+            '/api/loans/', {'is_overdue': 'true', 'ordering': 'days_left,due_date'}
+        )
+        self.assertEqual(
+            [loan['id'] for loan in response.data['results']], [self.later.pk, self.late.pk]
+        )
+        response = self.client.get('/api/loans/', {'can_renew': 'true', 'ordering': '-days_left'})
+        self.assertEqual(
+            [(loan['id'], loan['days_left']) for loan in response.data['results']],
+            [(self.soon.pk, 2), (self.late.pk, 0)]
+        )
+
+    def test_annotation_overrides_property(self):
+        loan = Loan.objects.with_derived(timezone.now() + timedelta(days=30)).get(pk=self.soon.pk)
+        self.assertTrue(loan.is_overdue)
+        self.assertEqual(Loan.objects.get(pk=self.soon.pk).days_left, 2)
+
+
+class LoanCirculationTests(APITestCase):
+    """Sortie et retour des exemplaires"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='lecteur', email='lecteur@example.com', password='secret123'
+        )
+        self.book = create_book(0, total_copies=2, available_copies=2)
+        self.client.force_authenticate(self.user)
+
+    def test_checkout_takes_copies_until_none_left(self):
+        self.assertIsNotNone(Loan.objects.checkout(self.user, self.book))
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.available_copies, self.book.status), (1, 'available'))
+        self.assertIsNotNone(Loan.objects.checkout(self.user, self.book))
+        self.assertIsNone(Loan.objects.checkout(self.user, self.book))
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.available_copies, self.book.status), (0, 'borrowed'))
+        self.assertEqual(self.book.active_loans_count, 2)
+        self.assertEqual(Loan.objects.count(), 2)
+
+    def test_return_puts_copy_back(self):
+        loan = Loan.objects.checkout(self.user, self.book)
+        Loan.objects.checkout(self.user, self.book)
+        self.assertTrue(loan.return_book())
+        self.assertFalse(loan.return_book())
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.available_copies, self.book.status), (1, 'available'))
+        self.assertEqual(self.book.active_loans_count, 1)
+
+    def test_actions_answer_with_current_derived_fields(self):
+        loan = Loan.objects.checkout(self.user, self.book)
+        for can_renew in (True, False):
+            response = self.client.post(f'/api/loans/{loan.pk}/renew/')
+            self.assertEqual(response.data['data']['can_renew'], can_renew)
+        response = self.client.post(f'/api/loans/{loan.pk}/return_book/')
+        data = response.data['data']
+        self.assertEqual(
+            (data['status'], data['days_left'], data['is_overdue'], data['can_renew']),
+            ('returned', 0, False, False)
+        )
+
+    def test_deleted_loans_are_uncounted(self):
+        returned = Loan.objects.checkout(self.user, self.book)
+        returned.return_book()
+        Loan.objects.checkout(self.user, self.book)
+        Loan.objects.all().delete()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.active_loans_count, 0)
+
+    def test_create_endpoint(self):
+        for expected in (201, 201, 400):
+            response = self.client.post(
+                '/api/loans/', {'user': self.user.pk, 'book': self.book.pk}
+            )
+            self.assertEqual(response.status_code, expected)
+        self.assertIn('book', response.data)
+        loan = Loan.objects.first()
+        self.assertAlmostEqual(
+            loan.due_date - loan.borrow_date, timedelta(days=14), delta=timedelta(seconds=5)
+        )
+
+    def test_return_endpoint(self):
+        loan = Loan.objects.checkout(self.user, self.book)
+        response = self.client.post(f'/api/loans/{loan.pk}/return_book/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['status'], 'returned')
+        response = self.client.post(f'/api/loans/{loan.pk}/return_book/')
+        self.assertEqual(response.status_code, 400)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 2)
+
+
+class LoanConditionalGetTests(APITestCase):
+    """ETag / If-None-Match sur les listes interrogées en boucle"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='lecteur', email='lecteur@example.com')
+        self.client.force_authenticate(self.user)
+        self.loan = create_loan(self.user, create_book(0))
+        create_loan(self.user, create_book(1))
+
+    def poll(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_list_is_304_in_one_query(self):
+        first = self.client.get('/api/loans/my_loans/')
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(1):
+            response = self.poll('/api/loans/my_loans/', first)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_changes_refresh_the_list(self):
+        first = self.client.get('/api/loans/my_loans/')
+        self.loan.renew()
+        second = self.poll('/api/loans/my_loans/', first)
+        self.assertEqual(second.status_code, 200)
+        # Le titre du livre affiché fait partie du validateur
+        book = Book.objects.get(pk=self.loan.book_id)
+        book.title = 'Nouveau titre'
+        book.save()
+        self.assertEqual(self.poll('/api/loans/my_loans/', second).status_code, 200)
+        # Un retour en masse (UPDATE) change aussi le validateur
+        third = self.client.get('/api/loans/my_loans/')
+        Loan.objects.bulk_return([self.loan.pk])
+        self.assertEqual(self.poll('/api/loans/my_loans/', third).status_code, 200)
+
+    def test_time_derived_fields_expire_the_validator(self):
+        self.loan.due_date = timezone.now() + timedelta(days=3)
+        self.loan.save()
+        first = self.client.get('/api/loans/my_loans/')
+        later = timezone.now() + timedelta(days=5)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            response = self.poll('/api/loans/my_loans/', first)
+        self.assertEqual(response.status_code, 200)
+        loan = next(item for item in response.data['results'] if item['id'] == self.loan.pk)
+        self.assertEqual((loan['is_overdue'], loan['days_left']), (True, 0))
+
+    def test_async_my_loans(self):
+        from .views import LoanViewSet
+
+        expected = self.client.get('/api/loans/my_loans/')
+        # Validateur (agrégat) puis page, comme la version synchrone
+        with self.assertNumQueries(2):
+            first = async_get(LoanViewSet, 'my_loans', '/api/loans/my_loans/', user=self.user)
+        self.assertEqual((first.content, first['ETag']), (expected.content, expected['ETag']))
+        with self.assertNumQueries(1):
+            response = async_get(
+                LoanViewSet, 'my_loans', '/api/loans/my_loans/', user=self.user,
+                HTTP_IF_NONE_MATCH=first['ETag'],
+            )
+        self.assertEqual(response.status_code, 304)
+        # Les autres routes du ViewSet restent synchrones
+        with override_settings(ASYNC_VIEWS=True):
+            self.assertFalse(iscoroutinefunction(LoanViewSet.as_view({'get': 'list'})))
+
+    def test_retrieve_if_modified_since(self):
+        url = f'/api/loans/{self.loan.pk}/'
+        first = self.client.get(url)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.poll(url, first).status_code, 304)
+
+
+class LoanBulkTests(APITestCase):
+    """Emprunts et retours par lot au comptoir"""
+
+    def setUp(self):
+        self.staff = User.objects.create_user(
+            username='comptoir', email='comptoir@example.com', is_staff=True
+        )
+        self.reader = User.objects.create_user(
+            username='lecteur', email='lecteur@example.com'
+        )
+        self.client.force_authenticate(self.staff)
+
+    def checkout(self, book_ids):
+        return self.client.post(
+            '/api/loans/bulk_checkout/',
+            {'user': self.reader.pk, 'books': book_ids},
+            format='json'
+        )
+
+    def test_checkout_per_item_results(self):
+        single = create_book(0, total_copies=1, available_copies=1)
+        spare = create_book(1, total_copies=3, available_copies=3)
+        broken = create_book(2, status='maintenance')
+        response = self.checkout([single.pk, single.pk, spare.pk, broken.pk, 999])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['succeeded'], response.data['failed']), (2, 3))
+        self.assertEqual(
+            [item['success'] for item in response.data['results']],
+            [True, False, True, False, False]
+        )
+        self.assertEqual(response.data['results'][0]['data']['book_title'], 'Livre 0')
+        single.refresh_from_db()
+        spare.refresh_from_db()
+        self.assertEqual((single.available_copies, single.status), (0, 'borrowed'))
+        self.assertEqual((spare.available_copies, spare.status), (2, 'available'))
+        self.assertEqual(Loan.objects.filter(user=self.reader).count(), 2)
+
+    def test_checkout_and_return_constant_queries(self):
+        for size in (5, 50):
+            Loan.objects.all().delete()
+            book_ids = [create_book(index).pk for index in range(size * 10, size * 11)]
+            with self.assertNumQueries(6):
+                response = self.checkout(book_ids)
+            self.assertEqual(response.data['succeeded'], size)
+            self.assertEqual(
+                set(Book.objects.filter(pk__in=book_ids).values_list('active_loans_count', flat=True)),
+                {1}
+            )
+
+            loan_ids = list(Loan.objects.values_list('pk', flat=True))
+            with self.assertNumQueries(5):
+                response = self.client.post(
+                    '/api/loans/bulk_return/', {'loans': loan_ids + [loan_ids[0]]},
+                    format='json'
+                )
+            self.assertEqual((response.data['succeeded'], response.data['failed']), (size, 1))
+            self.assertFalse(Loan.objects.exclude(status='returned').exists())
+            self.assertEqual(
+                set(Book.objects.filter(pk__in=book_ids).values_list(
+                    'available_copies', 'active_loans_count'
+                )),
+                {(1, 0)}
+            )
+
+    def test_reader_cannot_checkout_for_someone_else(self):
+        self.client.force_authenticate(self.reader)
+        response = self.client.post(
+            '/api/loans/bulk_checkout/',
+            {'user': self.staff.pk, 'books': [create_book(0).pk]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class LoanExportTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='lecteur', email='lecteur@example.com')
+        self.client.force_authenticate(self.user)
+
+    def export(self, **params):
+        response = self.client.get('/api/loans/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_single_query(self):
+        for index in range(30):
+            create_loan(self.user, create_book(index))
+        with self.assertNumQueries(1):
+            lines = self.export().splitlines()
+        self.assertEqual(len(lines), 31)
+        self.assertTrue(lines[0].startswith('id,user_id,user_username,book_id,book_title'))
+        self.assertIn(',lecteur,', lines[1])
+
+    async def test_asgi_streams_asynchronously(self):
+        # Handler ASGI : flux asynchrone, lu par blocs dans un thread
+        from users.serializers import CustomTokenObtainPairSerializer
+
+        for index in range(3):
+            await sync_to_async(lambda: create_loan(self.user, create_book(index)))()
+        access = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        response = await self.async_client.get(
+            '/api/loans/export/', {'output': 'ndjson'},
+            headers={'Authorization': f'Bearer {access}'}
+        )
+        self.assertTrue(response.is_async)
+        lines = [line async for line in response.streaming_content]
+        self.assertEqual(len(lines), 3)
+
+    def test_unknown_output(self):
+        response = self.client.get('/api/loans/export/', {'output': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+
+class LoanCursorPaginationTests(APITestCase):
+    """Mode curseur (?cursor=) de la pagination"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='lecteur', email='lecteur@example.com')
+        self.client.force_authenticate(self.user)
+        self.loans = [create_loan(self.user, create_book(index)) for index in range(7)]
+        # Des dates identiques : l'id départage
+        Loan.objects.filter(pk__in=[loan.pk for loan in self.loans[1:4]]).update(
+            borrow_date=timezone.now()
+        )
+
+    def walk(self, url):
+        ids = []
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids.extend(loan['id'] for loan in response.data['results'])
+            last, url = response, response.data['next']
+        return ids, last
+
+    def test_forward_and_back(self):
+        expected = list(
+            Loan.objects.order_by('-borrow_date', '-id').values_list('id', flat=True)
+        )
+        ids, last = self.walk('/api/loans/?cursor=&page_size=3')
+        self.assertEqual(ids, expected)
+
+        response = self.client.get(last.data['previous'])
+        self.assertEqual([loan['id'] for loan in response.data['results']], expected[3:6])
+        self.assertIsNotNone(response.data['next'])
+
+    def test_include_total_and_invalid_cursor(self):
+        response = self.client.get('/api/loans/', {'cursor': '', 'include_total': 1})
+        self.assertEqual(response.data['approximate_count'], 7)
+        response = self.client.get('/api/loans/', {'cursor': 'pas-un-curseur'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_key_follows_the_effective_ordering(self):
+        Loan.objects.update(due_date=timezone.now() - timedelta(days=1))
+        Loan.objects.filter(pk__in=[loan.pk for loan in self.loans[4:6]]).update(
+            due_date=timezone.now() - timedelta(days=3)
+        )
+        expected = list(Loan.objects.order_by('due_date', 'id').values_list('id', flat=True))
+        ids, _ = self.walk('/api/loans/overdue_loans/?cursor=&page_size=3')
+        self.assertEqual(ids, expected)
+        ids, _ = self.walk('/api/loans/?cursor=&page_size=3&ordering=due_date')
+        self.assertEqual(ids, expected)
+        # Annotation : pas de clé de curseur possible
+        response = self.client.get('/api/loans/', {'cursor': '', 'ordering': 'days_left'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_page_numbers_unchanged(self):
+        response = self.client.get('/api/loans/', {'page': 2, 'page_size': 3})
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual(len(response.data['results']), 3)
@@ -2,42 +2,105 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
 from django.utils import timezone
 from .models import Loan
-from .serializers import LoanSerializer, LoanDetailSerializer
+from .filters import LoanFilter
+from .serializers import (
+    LoanSerializer, LoanDetailSerializer, LoanListSerializer,
+    BulkCheckoutSerializer, BulkReturnSerializer
+)
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from backend.async_views import AsyncViewSetMixin
+from backend.conditional import ConditionalGetMixin
+from backend.exports import ExportMixin
+from backend.metrics import SerializationTimingMixin
+from backend.pagination import OptInCursorPagination
+from backend.query_plan import QueryPlan, QueryPlanMixin
+from backend.replicas import ReplicaReadMixin
+from backend.values_serializer import ValuesListMixin
 
 
-class LoanPagination(PageNumberPagination):
+class LoanPagination(OptInCursorPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
 
 
-class LoanViewSet(viewsets.ModelViewSet):
+# Colonnes lues par les serializers d'emprunts
+LOAN_FIELDS = (
+    'id', 'user', 'book', 'borrow_date', 'due_date', 'return_date',
+    'status', 'renewable_count', 'renewed_count', 'notes',
+)
+LOAN_LIST_PLAN = QueryPlan(
+    select_related=('user', 'book'),
+    only=LOAN_FIELDS + ('user__username', 'book__title'),
+)
+LOAN_DETAIL_PLAN = QueryPlan(
+    select_related=('user', 'book'),
+    only=LOAN_FIELDS + (
+        'user__username', 'user__email', 'user__first_name', 'user__last_name',
+        'book__title', 'book__author', 'book__isbn', 'book__available_copies',
+        # Validateur des requêtes conditionnelles
+        'updated_at', 'book__updated_at',
+    ),
+)
+
+
+class LoanViewSet(SerializationTimingMixin, ReplicaReadMixin, ValuesListMixin, ConditionalGetMixin,
+                  QueryPlanMixin, ExportMixin, AsyncViewSetMixin, viewsets.ModelViewSet):
     """ViewSet pour gérer les emprunts"""
     permission_classes = [AllowAny]
     queryset = Loan.objects.all()
     serializer_class = LoanSerializer
+    # Listes (list, my_loans, overdue_loans) lues depuis .values()
+    read_serializer_class = LoanListSerializer
     pagination_class = LoanPagination
     
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['status', 'user']
+    # ?is_overdue=true&ordering=days_left : calculés en SQL (Loan.objects.with_derived)
+    filterset_class = LoanFilter
     search_fields = ['book__title', 'user__username']
-    ordering_fields = ['borrow_date', 'due_date']
+    ordering_fields = ['borrow_date', 'due_date', 'days_left']
     ordering = ['-borrow_date']
+    # Le titre du livre est affiché dans chaque emprunt
+    conditional_fields = ('updated_at', 'book__updated_at')
+    # days_left, is_overdue... : validateur renouvelé toutes les heures
+    conditional_period = 3600
+
+    # Rapport (export) lu sur un réplica
+    replica_actions = ('export',)
+    # Sous ASGI (ASYNC_VIEWS) : amy_loans
+    async_actions = ('my_loans',)
+
+    export_filename = 'loans'
+    export_fields = (
+        'id', 'user_id', 'user__username', 'book_id', 'book__title', 'book__isbn',
+        'borrow_date', 'due_date', 'return_date', 'status', 'renewed_count',
+    )
+
+    # Relations lues par le serializer de chaque action
+    query_plans = {
+        'list': LOAN_LIST_PLAN,
+        'retrieve': LOAN_DETAIL_PLAN,
+        'my_loans': LOAN_LIST_PLAN,
+        'overdue_loans': LOAN_LIST_PLAN,
+        'default': QueryPlan(select_related=('user', 'book')),
+    }
     
     def get_queryset(self):
         """Retourner les emprunts selon l'utilisateur"""
         user = self.request.user
         if user.is_authenticated:
             if user.is_staff:
-                return Loan.objects.all()
-            return Loan.objects.filter(user=user)
-        # Pour les utilisateurs anonymes, retourner tous les emprunts actifs
-        return Loan.objects.filter(status='active').order_by('-borrow_date')
+                loans = Loan.objects.all()
+            else:
+                loans = Loan.objects.filter(user=user)
+        else:
+            # Pour les utilisateurs anonymes, retourner tous les emprunts actifs
+            loans = Loan.objects.filter(status='active').order_by('-borrow_date')
+        return self.plan_queryset(loans.with_derived())
 
     def get_serializer_class(self):
         """Utiliser un serializer détaillé pour retrieve"""
@@ -47,10 +110,14 @@ class LoanViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         """Créer un emprunt avec l'utilisateur connecté"""
+        data = dict(serializer.validated_data)
         if self.request.user.is_authenticated:
-            serializer.save(user=self.request.user)
-        else:
-            serializer.save()  # pour AllowAny, sans user
+            data['user'] = self.request.user
+        # pour AllowAny, l'utilisateur vient des données envoyées
+        loan = Loan.objects.checkout(**data)
+        if loan is None:
+            raise ValidationError({'book': 'Aucun exemplaire disponible.'})
+        serializer.instance = loan
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def renew(self, request, pk=None):
@@ -78,14 +145,12 @@ class LoanViewSet(viewsets.ModelViewSet):
     def return_book(self, request, pk=None):
         """Retourner un emprunt sans authentification"""
         loan = self.get_object()
-
-        if loan.status == 'returned':
+        # Un retour concurrent passé entre-temps échoue aussi ici
+        if not loan.return_book():
             return Response(
                 {'detail': 'Ce livre a déjà été retourné.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        loan.return_book()  # ici tu mets juste à jour le statut
         serializer = self.get_serializer(loan)
         return Response(
             {'message': 'Livre retourné avec succès', 'data': serializer.data},
@@ -93,31 +158,67 @@ class LoanViewSet(viewsets.ModelViewSet):
         )
 
 
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def bulk_checkout(self, request):
+        """Emprunter une pile de livres en une seule requête"""
+        batch = BulkCheckoutSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+        user = batch.validated_data.get('user', request.user)
+        if user != request.user and not request.user.is_staff:
+            return Response(
+                {'detail': 'Seul le personnel peut emprunter pour un autre lecteur.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        results = Loan.objects.bulk_checkout(
+            user, batch.validated_data['books'], batch.validated_data.get('due_date')
+        )
+        return self._bulk_response(results, 'book')
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def bulk_return(self, request):
+        """Retourner une pile d'emprunts en une seule requête"""
+        batch = BulkReturnSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+        results = Loan.objects.bulk_return(batch.validated_data['loans'])
+        return self._bulk_response(results, 'loan_id')
+
+    def _bulk_response(self, results, key):
+        """Résultat par élément du lot, dans l'ordre de la demande"""
+        items = []
+        for result in results:
+            item = {key: result[key]}
+            if result['loan'] is None:
+                item.update(success=False, detail=result['detail'])
+            else:
+                item.update(success=True, data=self.get_serializer(result['loan']).data)
+            items.append(item)
+        succeeded = sum(item['success'] for item in items)
+        return Response({
+            'succeeded': succeeded,
+            'failed': len(items) - succeeded,
+            'results': items
+        }, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_loans(self, request):
         """Récupérer les emprunts de l'utilisateur connecté"""
-        loans = Loan.objects.filter(user=request.user).order_by('-borrow_date')
-        page = self.paginate_queryset(loans)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        
-        serializer = self.get_serializer(loans, many=True)
-        return Response(serializer.data)
+        return self.list_response(self._my_loans(request))
+
+    async def amy_loans(self, request):
+        return await self.alist_response(self._my_loans(request))
+
+    def _my_loans(self, request):
+        return self.plan_queryset(
+            Loan.objects.filter(user=request.user).order_by('-borrow_date').with_derived()
+        )
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def overdue_loans(self, request):
         """Récupérer les emprunts en retard"""
-        loans = Loan.objects.filter(
+        loans = self.plan_queryset(Loan.objects.filter(
             user=request.user,
-            status='active',
+            status__in=['active', 'overdue'],
             due_date__lt=timezone.now()
-        ).order_by('due_date')
-        
-        page = self.paginate_queryset(loans)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        
-        serializer = self.get_serializer(loans, many=True)
-        return Response(serializer.data)
+        ).order_by('due_date').with_derived())
+        return self.list_response(loans)
@@ -61,13 +61,17 @@ class ReservationAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        # Colonnes dérivées calculées en SQL, triables dans la liste
+        return super().get_queryset(request).with_derived()
+
     # -------- Méthodes admin --------
 
-    @admin.display(boolean=True, description="Expirée")
+    @admin.display(boolean=True, description="Expirée", ordering='is_expired')
     def is_expired_display(self, obj):
         return obj.is_expired
 
-    @admin.display(description="Jours restants")
+    @admin.display(description="Jours restants", ordering='days_until_deadline')
     def days_until_deadline_display(self, obj):
         return obj.days_until_deadline
 
@@ -0,0 +1,12 @@
+import django_filters
+
+from .models import Reservation
+
+
+class ReservationFilter(django_filters.FilterSet):
+    """Filtres des réservations, y compris sur les champs annotés (``with_derived``)"""
+    is_expired = django_filters.BooleanFilter()
+
+    class Meta:
+        model = Reservation
+        fields = ['status', 'user', 'book', 'is_expired']
@@ -1,11 +1,135 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import (
+    BooleanField, Case, Count, Exists, F, OuterRef, Q, Subquery, Value, When
+)
 from django.contrib.auth import get_user_model
 from books.models import Book
+from books.cache import books_changed
+from backend.annotations import annotated_property, days_left
 from django.utils import timezone
 from datetime import timedelta
+from collections import Counter, defaultdict
 
 User = get_user_model()
 
+
+def _shift_queues(book_counts, now, using=None):
+    """Ajouter ``book_counts[book_id]`` (négatif : retirer) aux files des livres
+
+    Met à jour ``Book.pending_reservations_count`` par un UPDATE par écart
+    distinct, quel que soit le nombre de livres.
+    """
+    books_changed(book_counts, using=using)
+    by_count = defaultdict(list)
+    for book_id, count in book_counts.items():
+        if count:
+            by_count[count].append(book_id)
+    for count, book_ids in by_count.items():
+        Book.objects.using(using).filter(pk__in=book_ids).update(
+            pending_reservations_count=F('pending_reservations_count') + count,
+            updated_at=now
+        )
+
+
+class ReservationQuerySet(models.QuerySet):
+
+    def with_derived(self, now=None):
+        """Annoter ``is_expired`` et ``days_until_deadline`` (filtrables, triables)"""
+        now = now or timezone.now()
+        return self.annotate(
+            is_expired=Case(
+                When(
+                    Q(status='expired')
+                    | Q(status__in=['pending', 'ready'], pickup_deadline__lt=now),
+                    then=Value(True)
+                ),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+            days_until_deadline=Case(
+                When(status__in=['pending', 'ready'], then=days_left('pickup_deadline', now)),
+                default=Value(0),
+            ),
+        )
+
+
+class ReservationManager(models.Manager.from_queryset(ReservationQuerySet)):
+    """Manager des réservations : transitions de statut en masse"""
+
+    def expire(self, now=None):
+        """Expirer les réservations dont la date limite est passée
+
+        Tout se fait par UPDATE ensemblistes, quel que soit le nombre de
+        lignes : les réservations en attente ou prêtes dont la date limite
+        est dépassée passent à ``expired``; pour chaque livre dont une
+        réservation prête a expiré, la première personne de la file passe
+        à ``ready``; enfin les files touchées sont renumérotées et leur
+        longueur (``Book.pending_reservations_count``) mise à jour.
+        Retourne ``{'expired': n, 'promoted': n}``.
+        """
+        now = now or timezone.now()
+        with transaction.atomic(using=self.db):
+            overdue = self.filter(
+                status__in=['pending', 'ready'],
+                pickup_deadline__lt=now
+            )
+            book_ids = list(overdue.order_by().values_list('book_id', flat=True).distinct())
+            freed_book_ids = list(
+                overdue.filter(status='ready').order_by().values_list('book_id', flat=True).distinct()
+            )
+            # Réservations qui quittent la file, par livre
+            dequeued = Counter(dict(
+                overdue.filter(status='pending').order_by().values('book_id').annotate(
+                    count=Count('id')
+                ).values_list('book_id', 'count')
+            ))
+            expired = overdue.update(status='expired', updated_at=now)
+
+            # La tête de file : aucune réservation en attente plus ancienne
+            earlier = self.filter(
+                book_id=OuterRef('book_id'),
+                status='pending'
+            ).filter(
+                Q(reservation_date__lt=OuterRef('reservation_date'))
+                | Q(reservation_date=OuterRef('reservation_date'), id__lt=OuterRef('id'))
+            )
+            # Sélectionnées avant l'UPDATE : SQLite réévalue le sous-select
+            # ligne à ligne et verrait les têtes déjà promues
+            heads = dict(self.filter(
+                book_id__in=freed_book_ids,
+                status='pending'
+            ).filter(~Exists(earlier)).values_list('pk', 'book_id'))
+            promoted = self.filter(pk__in=heads).update(
+                status='ready',
+                pickup_deadline=now + timedelta(days=7),
+                updated_at=now
+            )
+            dequeued.update(heads.values())
+            _shift_queues(
+                {book_id: -count for book_id, count in dequeued.items()}, now, self.db
+            )
+            self.renumber_queues(book_ids)
+        return {'expired': expired, 'promoted': promoted}
+
+    def renumber_queues(self, book_ids):
+        """Recalculer les positions des files de ``book_ids`` en un seul UPDATE
+
+        La position est le rang d'arrivée (``reservation_date``, ``id``)
+        parmi les réservations en attente du livre.
+        """
+        rank = self.filter(
+            book_id=OuterRef('book_id'),
+            status='pending'
+        ).filter(
+            Q(reservation_date__lt=OuterRef('reservation_date'))
+            | Q(reservation_date=OuterRef('reservation_date'), id__lte=OuterRef('id'))
+        ).order_by().values('book_id').annotate(rank=Count('id')).values('rank')
+        return self.filter(
+            book_id__in=book_ids,
+            status='pending'
+        ).update(position_in_queue=Subquery(rank), updated_at=timezone.now())
+
+
 class Reservation(models.Model):
     """Modèle pour les réservations de livres"""
     
@@ -26,33 +150,61 @@ class Reservation(models.Model):
     position_in_queue = models.IntegerField(default=1)
     
     notes = models.TextField(blank=True)
+    # Voir Loan.updated_at
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = ReservationManager()
     
     class Meta:
         ordering = ['reservation_date']
         unique_together = ('user', 'book')
+        indexes = [
+            # Pagination par curseur (reservation_date, id)
+            models.Index(fields=['reservation_date', 'id'], name='resa_date_keyset_idx'),
+            models.Index(fields=['user', 'reservation_date', 'id'], name='resa_user_date_keyset_idx'),
+            # Files d'attente : queue_status, place suivante, décalages
+            models.Index(
+                fields=['book', 'position_in_queue'], condition=models.Q(status='pending'),
+                name='resa_pending_position_idx'
+            ),
+            # Rang d'arrivée dans la file (renumérotation, promotion)
+            models.Index(
+                fields=['book', 'reservation_date', 'id'], condition=models.Q(status='pending'),
+                name='resa_pending_arrival_idx'
+            ),
+            # ready_for_pickup
+            models.Index(fields=['user', 'status', 'pickup_deadline'], name='resa_user_status_pickup_idx'),
+            # Balayage des expirations
+            models.Index(fields=['status', 'pickup_deadline'], name='resa_status_pickup_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         # Définir la date limite de récupération à 7 jours
         if not self.pickup_deadline:
             self.pickup_deadline = self.reservation_date + timedelta(days=7)
         
-        # Calculer la position dans la file d'attente
-        if not self.pk:
-            self.position_in_queue = Reservation.objects.filter(
-                book=self.book,
-                status='pending'
-            ).count() + 1
+        if self.pk:
+            super().save(*args, **kwargs)
+            return
         
-        super().save(*args, **kwargs)
+        # Prendre la place suivante dans la file d'attente : les positions
+        # vont de 1 à la longueur de la file, tenue à jour sur le livre
+        with transaction.atomic():
+            self.position_in_queue = self._lock_queue() + 1
+            super().save(*args, **kwargs)
+            if self.status == 'pending':
+                _shift_queues({self.book_id: 1}, self.updated_at)
     
-    @property
+    @annotated_property
     def is_expired(self):
         """Vérifier si la réservation a expiré"""
-        if self.status == 'pending' and timezone.now() > self.pickup_deadline:
+        if self.status == 'expired':
+            return True
+        if self.status in ['pending', 'ready'] and timezone.now() > self.pickup_deadline:
             return True
         return False
     
-    @property
+    @annotated_property
     def days_until_deadline(self):
         """Nombre de jours avant l'expiration"""
         if self.status in ['pending', 'ready']:
@@ -62,29 +214,48 @@ class Reservation(models.Model):
     
     def mark_as_ready(self):
         """Marquer la réservation comme prête à récupérer"""
-        if self.status == 'pending':
-            self.status = 'ready'
-            self.save()
-            return True
-        return False
+        return self._leave_queue('ready')
     
     def cancel(self):
         """Annuler la réservation"""
-        self.status = 'cancelled'
-        self.save()
-        # Mettre à jour la position des autres réservations
-        self._update_queue_positions()
+        return self._leave_queue('cancelled')
     
-    def _update_queue_positions(self):
-        """Mettre à jour les positions dans la file d'attente"""
-        reservations = Reservation.objects.filter(
-            book=self.book,
-            status='pending'
-        ).order_by('reservation_date')
-        
-        for index, reservation in enumerate(reservations, 1):
-            reservation.position_in_queue = index
-            reservation.save()
+    def _lock_queue(self):
+        """Verrouiller la file d'attente du livre jusqu'à la fin de la transaction
+
+        Retourne la longueur de la file (``pending_reservations_count``).
+        """
+        return Book.objects.select_for_update().filter(
+            pk=self.book_id
+        ).order_by().values_list('pending_reservations_count', flat=True).first() or 0
+    
+    def _leave_queue(self, new_status):
+        """Sortir de la file d'attente et avancer les suivants d'une place
+
+        Le nombre de requêtes est fixe : les réservations suivantes sont
+        décalées par un seul UPDATE, quelle que soit la longueur de la file.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            self._lock_queue()
+            position = Reservation.objects.filter(
+                pk=self.pk,
+                status='pending'
+            ).values_list('position_in_queue', flat=True).first()
+            if position is None:
+                return False
+            Reservation.objects.filter(pk=self.pk).update(status=new_status, updated_at=now)
+            Reservation.objects.filter(
+                book_id=self.book_id,
+                status='pending',
+                position_in_queue__gt=position
+            ).update(position_in_queue=F('position_in_queue') - 1, updated_at=now)
+            _shift_queues({self.book_id: -1}, now)
+        self.status = new_status
+        self.position_in_queue = position
+        self.updated_at = now
+        annotated_property.discard(self)
+        return True
     
     def __str__(self):
         return f"{self.user.username} - {self.book.title} (Position: {self.position_in_queue})"
\ No newline at end of file
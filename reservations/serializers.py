@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from backend.values_serializer import ValuesSerializer
 from .models import Reservation
 from books.models import Book
 from django.contrib.auth import get_user_model
@@ -11,7 +12,8 @@ class ReservationSerializer(serializers.ModelSerializer):
     
     user_username = serializers.CharField(source='user.username', read_only=True)
     book_title = serializers.CharField(source='book.title', read_only=True)
-    is_expired = serializers.SerializerMethodField()
+    # Annotés par Reservation.objects.with_derived (propriétés Python sinon)
+    is_expired = serializers.BooleanField(read_only=True)
     days_until_deadline = serializers.IntegerField(read_only=True)
     
     class Meta:
@@ -25,9 +27,32 @@ class ReservationSerializer(serializers.ModelSerializer):
             'id', 'reservation_date', 'user_username', 'book_title',
             'is_expired', 'days_until_deadline', 'position_in_queue'
         ]
-        
-    def get_is_expired(self, obj):
-        return obj.is_expired
+
+
+class ReservationListSerializer(ValuesSerializer):
+    """Même sortie que ``ReservationSerializer``, pour les listes annotées par ``with_derived``"""
+
+    columns = (
+        'id', 'user', 'user__username', 'book', 'book__title',
+        'reservation_date', 'pickup_deadline', 'status',
+        'position_in_queue', 'is_expired', 'days_until_deadline', 'notes',
+    )
+
+    def to_representation(self, row):
+        return {
+            'id': row['id'],
+            'user': row['user'],
+            'user_username': row['user__username'],
+            'book': row['book'],
+            'book_title': row['book__title'],
+            'reservation_date': self.datetime(row['reservation_date']),
+            'pickup_deadline': self.datetime(row['pickup_deadline']),
+            'status': row['status'],
+            'position_in_queue': row['position_in_queue'],
+            'is_expired': row['is_expired'],
+            'days_until_deadline': row['days_until_deadline'],
+            'notes': row['notes'],
+        }
 
 
 class ReservationDetailSerializer(serializers.ModelSerializer):
@@ -59,7 +84,7 @@ class ReservationDetailSerializer(serializers.ModelSerializer):
             'title': obj.book.title,
             'author': str(obj.book.author),
             'isbn': obj.book.isbn,
-            'is_available': obj.book.is_available
+            'is_available': obj.book.available_copies > 0
         }
     
     def get_is_expired(self, obj):
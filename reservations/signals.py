@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Reservation, _shift_queues
+
+
+@receiver(post_delete, sender=Reservation)
+def leave_queue_on_delete(sender, instance, using, **kwargs):
+    """Retirer de la file une réservation en attente supprimée
+
+    La file est renumérotée plutôt que décalée : une suppression en masse
+    envoie ce signal dans un ordre quelconque.
+    """
+    if instance.status != 'pending':
+        return
+    _shift_queues({instance.book_id: -1}, timezone.now(), using)
+    Reservation.objects.db_manager(using).renumber_queues([instance.book_id])
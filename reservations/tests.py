@@ -1,3 +1,269 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from books.tests import async_get, create_book
+from .models import Reservation
+from .serializers import ReservationListSerializer, ReservationSerializer
+
+User = get_user_model()
+
+
+def create_reservation(user, book, **kwargs):
+    kwargs.setdefault('pickup_deadline', timezone.now() + timedelta(days=7))
+    return Reservation.objects.create(user=user, book=book, **kwargs)
+
+
+class ReservationQueryCountTests(APITestCase):
+    """Le nombre de requêtes par page ne dépend pas du nombre de réservations"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='lecteur', email='lecteur@example.com', password='secret123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def seed(self, count, start=0, **kwargs):
+        for index in range(start, start + count):
+            create_reservation(self.user, create_book(index), **kwargs)
+
+    def assertConstantQueries(self, expected, url, **seed_kwargs):
+        self.seed(3, **seed_kwargs)
+        with self.assertNumQueries(expected):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.seed(20, start=3, **seed_kwargs)
+        with self.assertNumQueries(expected):
+            response = self.client.get(url, {'page_size': 100})
+        self.assertEqual(response.status_code, 200)
+
+    def test_list(self):
+        self.assertConstantQueries(2, '/api/reservations/')
+
+    def test_my_reservations(self):
+        self.assertConstantQueries(2, '/api/reservations/my_reservations/')
+
+    def test_ready_for_pickup(self):
+        self.assertConstantQueries(
+            2, '/api/reservations/ready_for_pickup/', status='ready'
+        )
+
+    def test_retrieve(self):
+        reservation = create_reservation(self.user, create_book(0))
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/reservations/{reservation.pk}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_queue_status(self):
+        book = create_book(0)
+        for index in range(3):
+            reader = User.objects.create_user(
+                username=f'lecteur{index}', email=f'lecteur{index}@example.com'
+            )
+            create_reservation(reader, book)
+        # Validateur conditionnel + file
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                '/api/reservations/queue_status/', {'book_id': book.pk}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['queue_length'], 3)
+        self.assertEqual(len(response.data['queue']), 3)
+
+    def test_mark_as_ready(self):
+        staff = User.objects.create_user(
+            username='staff', email='staff@example.com', is_staff=True
+        )
+        reservation = create_reservation(self.user, create_book(0))
+        self.client.force_authenticate(staff)
+        # Dont la longueur de la file sur le livre
+        with self.assertNumQueries(8):
+            response = self.client.post(f'/api/reservations/{reservation.pk}/mark_as_ready/')
+        self.assertEqual(response.status_code, 200)
+
+
+class ReservationListSerializerTests(APITestCase):
+
+    def test_same_output_as_model_serializer(self):
+        now = timezone.now()
+        book = create_book(0)
+        for index, (status, deadline) in enumerate((
+            ('pending', now + timedelta(days=3)),
+            ('pending', now - timedelta(days=1)),
+            ('ready', now + timedelta(days=6)),
+            ('expired', now - timedelta(days=2)),
+        )):
+            reader = User.objects.create_user(
+                username=f'lecteur{index}', email=f'lecteur{index}@example.com'
+            )
+            create_reservation(reader, book, status=status, pickup_deadline=deadline)
+        reservations = Reservation.objects.select_related('user', 'book').order_by('id')
+
+        # Propriétés Python d'un côté, annotations SQL de l'autre
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            expected = ReservationSerializer(reservations, many=True).data
+        reader = ReservationListSerializer()
+        rows = reader.serialize(reservations.with_derived(now).values(*reader.columns))
+        self.assertEqual(rows, expected)
+        # Même ordre des clés dans le JSON
+        self.assertEqual([list(row) for row in rows], [list(row) for row in expected])
+
+
+class ReservationDerivedFieldsTests(APITestCase):
+
+    def test_filter_and_order_in_sql(self):
+        staff = User.objects.create_user(username='staff', email='staff@example.com', is_staff=True)
+        self.client.force_authenticate(staff)
+        now = timezone.now()
+        late = create_reservation(staff, create_book(0), pickup_deadline=now - timedelta(days=1))
+        soon = create_reservation(staff, create_book(1), pickup_deadline=now + timedelta(days=1, hours=1))
+        later = create_reservation(staff, create_book(2), pickup_deadline=now + timedelta(days=5, hours=1))
+
+        response = self.client.get('/api/reservations/', {'is_expired': 'true'})
+        self.assertEqual([row['id'] for row in response.data['results']], [late.pk])
+        response = self.client.get(
+            '/api/reservations/', {'is_expired': 'false', 'ordering': '-days_until_deadline'}
+        )
+        self.assertEqual(
+            [(row['id'], row['days_until_deadline']) for row in response.data['results']],
+            [(later.pk, 5), (soon.pk, 1)]
+        )
+
+
+    def test_ready_past_deadline_is_expired(self):
+        # Le balayage expire aussi les réservations prêtes non retirées
+        reader = User.objects.create_user(username='lecteur', email='lecteur@example.com')
+        reservation = create_reservation(
+            reader, create_book(0), status='ready',
+            pickup_deadline=timezone.now() - timedelta(hours=1),
+        )
+        self.assertTrue(reservation.is_expired)
+        self.assertTrue(Reservation.objects.with_derived().get(pk=reservation.pk).is_expired)
+
+
+class ReservationQueueTests(APITestCase):
+    """File d'attente : positions compactes et nombre de requêtes fixe"""
+
+    def setUp(self):
+        self.book = create_book(0)
+        self.staff = User.objects.create_user(
+            username='staff', email='staff@example.com', is_staff=True
+        )
+        self.client.force_authenticate(self.staff)
+
+    def enqueue(self, count):
+        start = User.objects.count()
+        readers = [
+            User.objects.create_user(username=f'lecteur{index}', email=f'lecteur{index}@example.com')
+            for index in range(start, start + count)
+        ]
+        return [create_reservation(reader, self.book) for reader in readers]
+
+    def positions(self):
+        return list(
+            Reservation.objects.filter(book=self.book, status='pending')
+            .order_by('reservation_date', 'id')
+            .values_list('position_in_queue', flat=True)
+        )
+
+    def test_positions_follow_arrival_order(self):
+        self.enqueue(3)
+        self.assertEqual(self.positions(), [1, 2, 3])
+
+    def test_cancel_closes_the_gap(self):
+        first, second, third, fourth = self.enqueue(4)
+        second.cancel()
+        self.assertEqual(self.positions(), [1, 2, 3])
+        third.refresh_from_db()
+        self.assertEqual(third.position_in_queue, 2)
+        first.mark_as_ready()
+        self.assertEqual(self.positions(), [1, 2])
+        self.assertFalse(second.cancel())
+
+    def test_queue_length_on_book(self):
+        def queue_length():
+            self.book.refresh_from_db()
+            return self.book.pending_reservations_count
+
+        first, second, third, fourth = self.enqueue(4)
+        self.assertEqual(queue_length(), 4)
+        second.cancel()
+        Reservation.objects.filter(pk=third.pk).delete()
+        self.assertEqual((queue_length(), self.positions()), (2, [1, 2]))
+        first.mark_as_ready()
+        late, = self.enqueue(1)
+        self.assertEqual((queue_length(), late.position_in_queue), (2, 2))
+        # La réservation prête expire : la suivante (fourth) quitte la file
+        Reservation.objects.filter(pk=first.pk).update(
+            pickup_deadline=timezone.now() - timedelta(days=1)
+        )
+        Reservation.objects.expire()
+        self.assertEqual((queue_length(), self.positions()), (1, [1]))
+
+    def test_cancel_answers_with_current_derived_fields(self):
+        reservation, = self.enqueue(1)
+        response = self.client.post(f'/api/reservations/{reservation.pk}/cancel/')
+        data = response.data['data']
+        self.assertEqual(
+            (data['status'], data['days_until_deadline'], data['is_expired']),
+            ('cancelled', 0, False)
+        )
+
+    def test_cancel_twice_is_refused(self):
+        reservation, = self.enqueue(1)
+        url = f'/api/reservations/{reservation.pk}/cancel/'
+        self.assertEqual(self.client.post(url).status_code, 200)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Reservation.objects.get(pk=reservation.pk).status, 'cancelled')
+
+    def test_cancel_constant_queries(self):
+        for size in (3, 30):
+            Reservation.objects.all().delete()
+            reservations = self.enqueue(size)
+            with self.assertNumQueries(8):
+                response = self.client.post(f'/api/reservations/{reservations[0].pk}/cancel/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.positions(), list(range(1, size)))
+
+    def test_queue_status_constant_queries(self):
+        for size in (3, 30):
+            self.enqueue(size)
+            with self.assertNumQueries(2):
+                response = self.client.get(
+                    '/api/reservations/queue_status/', {'book_id': self.book.pk}
+                )
+            self.assertEqual(response.data['queue_length'], len(response.data['queue']))
+
+    def test_async_queue_status(self):
+        from .views import ReservationViewSet
+
+        self.enqueue(3)
+        url = '/api/reservations/queue_status/'
+        expected = self.client.get(url, {'book_id': self.book.pk})
+        with self.assertNumQueries(2):
+            response = async_get(ReservationViewSet, 'queue_status', url, {'book_id': self.book.pk})
+        self.assertEqual(response.content, expected.content)
+        response = async_get(ReservationViewSet, 'queue_status', url)
+        self.assertEqual(response.status_code, 400)
+
+
+class ReservationExportTests(APITestCase):
+
+    def test_ndjson(self):
+        user = User.objects.create_user(username='lecteur', email='lecteur@example.com')
+        create_reservation(user, create_book(0))
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/reservations/export/', {'output': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [
+            json.loads(line)
+            for line in b''.join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['book_title'], 'Livre 0')
+        self.assertEqual(rows[0]['position_in_queue'], 1)
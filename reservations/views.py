@@ -2,34 +2,98 @@ from rest_framework import viewsets, status # type: ignore
 from rest_framework.decorators import action # type: ignore
 from rest_framework.response import Response # type: ignore
 from rest_framework.permissions import IsAuthenticated, AllowAny # type: ignore
-from rest_framework.pagination import PageNumberPagination # type: ignore
 from django.utils import timezone # type: ignore
 from .models import Reservation
-from .serializers import ReservationSerializer, ReservationDetailSerializer
+from .filters import ReservationFilter
+from .serializers import (
+    ReservationSerializer, ReservationDetailSerializer, ReservationListSerializer
+)
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.filters import OrderingFilter, SearchFilter
+from backend.async_views import AsyncViewSetMixin
+from backend.conditional import ConditionalGetMixin
+from backend.exports import ExportMixin
+from backend.metrics import SerializationTimingMixin
+from backend.pagination import OptInCursorPagination
+from backend.query_plan import QueryPlan, QueryPlanMixin
+from backend.replicas import ReplicaReadMixin
+from backend.values_serializer import ValuesListMixin
 
 
-class ReservationPagination(PageNumberPagination):
+class ReservationPagination(OptInCursorPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
 
 
-class ReservationViewSet(viewsets.ModelViewSet):
+# Colonnes lues par les serializers de réservations
+RESERVATION_FIELDS = (
+    'id', 'user', 'book', 'reservation_date', 'pickup_deadline',
+    'status', 'position_in_queue', 'notes',
+)
+RESERVATION_LIST_PLAN = QueryPlan(
+    select_related=('user', 'book'),
+    only=RESERVATION_FIELDS + ('user__username', 'book__title'),
+)
+
+
+class ReservationViewSet(SerializationTimingMixin, ReplicaReadMixin, ValuesListMixin,
+                         ConditionalGetMixin, QueryPlanMixin, ExportMixin, AsyncViewSetMixin,
+                         viewsets.ModelViewSet):
     """ViewSet pour gérer les réservations"""
     queryset = Reservation.objects.all()
     serializer_class = ReservationSerializer
+    # Listes (list, my_reservations, ready_for_pickup, queue_status) lues depuis .values()
+    read_serializer_class = ReservationListSerializer
     pagination_class = ReservationPagination
     permission_classes = [AllowAny]
+
+    # ?is_expired=true&ordering=days_until_deadline : calculés en SQL
+    # (Reservation.objects.with_derived)
+    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filterset_class = ReservationFilter
+    # Le titre du livre est affiché dans chaque réservation
+    conditional_fields = ('updated_at', 'book__updated_at')
+    # days_until_deadline, is_expired : validateur renouvelé toutes les heures
+    conditional_period = 3600
+
+    # File d'attente publique et export lus sur un réplica
+    replica_actions = ('queue_status', 'export')
+    # Sous ASGI (ASYNC_VIEWS) : aqueue_status
+    async_actions = ('queue_status',)
+
+    export_filename = 'reservations'
+    export_fields = (
+        'id', 'user_id', 'user__username', 'book_id', 'book__title',
+        'reservation_date', 'pickup_deadline', 'status', 'position_in_queue',
+    )
+
+    # Relations lues par le serializer de chaque action
+    query_plans = {
+        'list': RESERVATION_LIST_PLAN,
+        # Validateur des requêtes conditionnelles : dates de la réservation et du livre
+        'retrieve': QueryPlan(
+            select_related=('book',),
+            only=RESERVATION_FIELDS + ('updated_at', 'book__updated_at'),
+        ),
+        'my_reservations': RESERVATION_LIST_PLAN,
+        'ready_for_pickup': RESERVATION_LIST_PLAN,
+        'queue_status': RESERVATION_LIST_PLAN,
+        'default': QueryPlan(select_related=('user', 'book')),
+    }
     
     def get_queryset(self):
         """Retourner les réservations filtrées par utilisateur ou none si anonyme"""
         user = self.request.user
         if user.is_authenticated:
             if user.is_staff:
-                return Reservation.objects.all()
-            return Reservation.objects.filter(user=user)
-        # Pour les utilisateurs non connectés, ne rien retourner
-        return Reservation.objects.none()
+                reservations = Reservation.objects.all()
+            else:
+                reservations = Reservation.objects.filter(user=user)
+        else:
+            # Pour les utilisateurs non connectés, ne rien retourner
+            reservations = Reservation.objects.none()
+        return self.plan_queryset(reservations.with_derived())
 
     def get_serializer_class(self):
         """Utiliser un serializer détaillé pour retrieve"""
@@ -70,12 +134,12 @@ class ReservationViewSet(viewsets.ModelViewSet):
                 {'detail': 'Vous ne pouvez annuler que vos propres réservations.'},
                 status=status.HTTP_403_FORBIDDEN
             )
-        if reservation.status != 'pending':
+        # Déjà sortie de la file, y compris par une requête concurrente
+        if not reservation.cancel():
             return Response(
                 {'detail': 'Seules les réservations en attente peuvent être annulées.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        reservation.cancel()
         serializer = self.get_serializer(reservation)
         return Response(
             {'message': 'Réservation annulée avec succès', 'data': serializer.data},
@@ -85,46 +149,61 @@ class ReservationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], permission_classes=[AllowAny])
     def my_reservations(self, request):
         """Récupérer les réservations de l'utilisateur connecté"""
-        reservations = Reservation.objects.filter(
+        reservations = self.plan_queryset(Reservation.objects.filter(
             user=request.user
-        ).order_by('position_in_queue')
-        page = self.paginate_queryset(reservations)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        serializer = self.get_serializer(reservations, many=True)
-        return Response(serializer.data)
+        ).order_by('position_in_queue').with_derived())
+        return self.list_response(reservations)
 
     @action(detail=False, methods=['get'], permission_classes=[AllowAny])
     def ready_for_pickup(self, request):
         """Récupérer les réservations prêtes à récupérer"""
-        reservations = Reservation.objects.filter(
+        reservations = self.plan_queryset(Reservation.objects.filter(
             user=request.user,
             status='ready'
-        ).order_by('pickup_deadline')
-        page = self.paginate_queryset(reservations)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        serializer = self.get_serializer(reservations, many=True)
-        return Response(serializer.data)
+        ).order_by('pickup_deadline').with_derived())
+        return self.list_response(reservations)
 
     @action(detail=False, methods=['get'], permission_classes=[AllowAny])
     def queue_status(self, request):
         """Voir la file d'attente d'un livre (public)"""
         book_id = request.query_params.get('book_id')
         if not book_id:
-            return Response(
-                {'detail': 'book_id est requis'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        reservations = Reservation.objects.filter(
+            return self._missing_book_id()
+        reservations = self._queue(book_id)
+        return self.conditional(reservations, self._queue_response, book_id, reservations)
+
+    async def aqueue_status(self, request):
+        book_id = request.query_params.get('book_id')
+        if not book_id:
+            return self._missing_book_id()
+        reservations = self._queue(book_id)
+        return await self.aconditional(reservations, self._aqueue_response, book_id, reservations)
+
+    def _missing_book_id(self):
+        return Response(
+            {'detail': 'book_id est requis'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    def _queue(self, book_id):
+        return self.plan_queryset(Reservation.objects.filter(
             book_id=book_id,
             status='pending'
-        ).order_by('position_in_queue')
-        serializer = self.get_serializer(reservations, many=True)
+        ).order_by('position_in_queue').with_derived())
+
+    def _queue_response(self, book_id, reservations):
+        reader = self.get_read_serializer()
+        return self._queue_payload(book_id, reservations.values(*reader.columns), reader)
+
+    async def _aqueue_response(self, book_id, reservations):
+        reader = self.get_read_serializer()
+        rows = [row async for row in reservations.values(*reader.columns).aiterator()]
+        return self._queue_payload(book_id, rows, reader)
+
+    def _queue_payload(self, book_id, rows, reader):
+        queue = reader.serialize(rows)
         return Response({
             'book_id': book_id,
-            'queue_length': reservations.count(),
-            'queue': serializer.data
+            'queue_length': len(queue),
+            'queue': queue
         })
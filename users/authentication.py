@@ -0,0 +1,86 @@
+"""Authentification JWT sans requête pour les lectures.
+
+``JWTAuthentication`` recharge l'utilisateur depuis la base à chaque
+requête authentifiée. ``ClaimsJWTAuthentication`` le reconstruit à partir
+des claims du jeton (``ClaimsUser``) pour les méthodes sûres : la base
+n'est lue que si la vue touche un champ absent du jeton. Les écritures
+gardent la vérification complète (utilisateur existant et actif).
+
+Un utilisateur désactivé, supprimé ou dont les claims ont changé (rôle,
+statut staff...) est noté dans ``revoked_users`` : ses jetons repassent
+par la base jusqu'à leur expiration. Cette liste est propre au processus ;
+dans les autres processus, un jeton déjà émis reste cru en lecture
+jusqu'à son expiration (``ACCESS_TOKEN_LIFETIME``).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import ClaimsUser
+
+
+class RevokedUsers:
+    """LRU borné des utilisateurs dont les jetons ne sont plus crus sur parole
+
+    Une entrée expire après ``ttl`` secondes, la durée de vie d'un jeton
+    d'accès : les jetons émis avant la révocation ont alors expiré.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, user_id):
+        with self._lock:
+            self._entries[user_id] = time.monotonic() + self.ttl
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, user_id):
+        with self._lock:
+            expires = self._entries.get(user_id)
+            if expires is None:
+                return False
+            if expires < time.monotonic():
+                del self._entries[user_id]
+                return False
+            self._entries.move_to_end(user_id)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+revoked_users = RevokedUsers(
+    maxsize=getattr(settings, 'JWT_REVOKED_USERS_SIZE', 10000),
+    ttl=api_settings.ACCESS_TOKEN_LIFETIME.total_seconds(),
+)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` sans lecture de l'utilisateur pour GET, HEAD et OPTIONS"""
+
+    def authenticate(self, request):
+        self.safe_method = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if (
+            self.safe_method
+            and user_id is not None
+            and user_id not in revoked_users
+            # Jetons émis avant l'ajout des claims : lecture en base
+            and all(field in validated_token for field in ClaimsUser.CLAIM_FIELDS)
+        ):
+            return ClaimsUser.from_claims(user_id, validated_token)
+        return super().get_user(validated_token)
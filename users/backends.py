@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+User = get_user_model()
+
+
+class EmailBackend(ModelBackend):
+    """Authentification par email, utilisée par ``/api/auth/login/``
+
+    ``CustomTokenObtainPairSerializer`` transmet ``email=...`` à
+    ``authenticate()``, que ``ModelBackend`` (connexion par nom
+    d'utilisateur, pour l'admin) ignore. L'email est comparé sans tenir
+    compte de la casse.
+    """
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if email is None or password is None:
+            return None
+        # Index unique sur LOWER(email) : une ligne au plus
+        user = User.objects.with_email(email).first()
+        if user is None:
+            # Même coût qu'un mot de passe faux : pas d'énumération des comptes
+            User().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,66 @@
+"""Hachage des mots de passe : Argon2 réglé pour nos machines.
+
+Les paramètres viennent des settings (``ARGON2_TIME_COST``,
+``ARGON2_MEMORY_COST`` en Kio, ``ARGON2_PARALLELISM``) ; les mesurer avec
+``python -m benchmarks.login``. Un hash aux paramètres différents (ou
+d'un autre algorithme de ``PASSWORD_HASHERS``) est recalculé à la
+connexion suivante par ``check_password``.
+
+Un hachage occupe un cœur pendant plusieurs dizaines de millisecondes :
+au plus ``PASSWORD_HASH_CONCURRENCY`` (par défaut le nombre de cœurs)
+s'exécutent en même temps dans le processus, les autres attendent leur
+tour. Sous ASGI, la vue de connexion (synchrone) tourne dans le pool de
+threads d'asgiref, jamais sur la boucle d'événements ; le sémaphore
+borne la part de ce pool occupée à hacher.
+"""
+import os
+import threading
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+_slots = None
+_slots_lock = threading.Lock()
+
+
+def hash_concurrency():
+    return getattr(settings, 'PASSWORD_HASH_CONCURRENCY', 0) or os.cpu_count() or 1
+
+
+def hashing_slots():
+    """Sémaphore partagé par tous les hachages du processus"""
+    global _slots
+    if _slots is None:
+        with _slots_lock:
+            if _slots is None:
+                _slots = threading.BoundedSemaphore(hash_concurrency())
+    return _slots
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Argon2id aux paramètres des settings, concurrence bornée
+
+    Même algorithme (``argon2``) que le hasher de Django : les hashs
+    existants restent lisibles et ``must_update`` compare leurs paramètres
+    à ceux-ci.
+    """
+
+    @property
+    def time_cost(self):
+        return settings.ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.ARGON2_PARALLELISM
+
+    def encode(self, password, salt):
+        with hashing_slots():
+            return super().encode(password, salt)
+
+    def verify(self, password, encoded):
+        with hashing_slots():
+            return super().verify(password, encoded)
@@ -0,0 +1,69 @@
+import csv
+
+from django.contrib.auth.tokens import default_token_generator
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from books.importers import read_rows
+from users.roster import RosterImporter
+
+
+class Command(BaseCommand):
+    help = "Créer les comptes d'une liste d'étudiants (CSV ou XLSX) par lots"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=('csv', 'xlsx'))
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--invitations',
+            help="CSV des invitations à envoyer (uid et token pour /api/users/set_password/)",
+        )
+
+    def handle(self, *args, **options):
+        invitations = None
+        if options['invitations']:
+            try:
+                invitations = open(options['invitations'], 'w', newline='', encoding='utf-8')
+            except OSError as exc:
+                raise CommandError(str(exc))
+        try:
+            report = self._import(options, invitations)
+        finally:
+            if invitations is not None:
+                invitations.close()
+
+        for error in report.errors:
+            self.stderr.write(f"Ligne {error['line']} : {error['errors']}")
+        if report.failed > len(report.errors):
+            self.stderr.write(f'... {report.failed - len(report.errors)} autres erreurs')
+        self.stdout.write(self.style.SUCCESS(f'Import terminé : {report}'))
+
+    def _import(self, options, invitations):
+        created = None
+        if invitations is not None:
+            writer = csv.writer(invitations)
+            writer.writerow(['username', 'email', 'uid', 'token'])
+
+            def created(users):
+                writer.writerows(
+                    [
+                        user.username, user.email, urlsafe_base64_encode(force_bytes(user.pk)),
+                        default_token_generator.make_token(user),
+                    ]
+                    for user in users
+                )
+
+        importer = RosterImporter(
+            chunk_size=options['chunk_size'],
+            using=options['database'],
+            progress=lambda report: self.stdout.write(str(report)),
+            created=created,
+        )
+        try:
+            return importer.run(read_rows(options['path'], options['format']))
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
@@ -1,5 +1,20 @@
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db.models.functions import Lower
+from django.contrib.auth.models import AbstractUser, UserManager
+
+# Index unique sur LOWER(email), reconnu par les serializers en cas de doublon
+EMAIL_UNIQUE_CONSTRAINT = 'users_customuser_email_ci_unique'
+
+
+class CustomUserManager(UserManager):
+
+    def with_email(self, email):
+        """Utilisateurs à cet email, sans tenir compte de la casse
+
+        ``LOWER(email) = ...`` : la forme de l'index unique sur l'email.
+        """
+        return self.alias(email_lower=Lower('email')).filter(email_lower=email.lower())
+
 
 class CustomUser(AbstractUser):
     ROLE_CHOICES = (
@@ -16,6 +31,48 @@ class CustomUser(AbstractUser):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='student')
     is_active = models.BooleanField(default=True)
     joined_date = models.DateTimeField(auto_now_add=True)
+    # Validateur des requêtes conditionnelles (profil, liste des utilisateurs)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CustomUserManager()
+
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # Un email par compte, casse comprise ; les comptes sans email restent possibles
+            models.UniqueConstraint(
+                Lower('email'), name=EMAIL_UNIQUE_CONSTRAINT,
+                condition=~models.Q(email=''),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
+
+
+class ClaimsUser(CustomUser):
+    """Utilisateur reconstruit à partir des claims du JWT, sans requête
+
+    Seuls ``CLAIM_FIELDS`` sont renseignés ; les autres champs sont différés
+    et le premier accès à l'un d'eux les charge tous en une seule requête.
+    Voir ``users.authentication.ClaimsJWTAuthentication``.
+    """
+    # Claims ajoutés par CustomTokenObtainPairSerializer.get_token
+    CLAIM_FIELDS = ('username', 'email', 'role', 'is_staff')
+
+    class Meta:
+        proxy = True
+
+    @classmethod
+    def from_claims(cls, user_id, claims):
+        values = {'id': user_id, 'is_active': True}
+        values.update((field, claims[field]) for field in cls.CLAIM_FIELDS)
+        fields = [field for field in cls._meta.concrete_fields if field.attname in values]
+        return cls.from_db(None, [field.attname for field in fields],
+                           [values[field.attname] for field in fields])
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            # Un champ différé lu : charger tous les autres avec lui
+            fields = deferred
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
@@ -0,0 +1,97 @@
+"""Création en masse des comptes étudiants depuis la liste de l'université."""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from rest_framework import serializers
+
+from books.importers import ChunkedImporter, ImportReport
+
+User = get_user_model()
+
+
+class RosterRowSerializer(serializers.ModelSerializer):
+    """Validation d'une ligne de la liste ; l'unicité est vérifiée par lot"""
+    class Meta:
+        model = User
+        fields = ('username', 'email', 'first_name', 'last_name', 'role', 'phone')
+        extra_kwargs = {
+            'username': {'validators': []},
+            'email': {'required': True, 'allow_blank': False},
+        }
+
+
+class RosterReport(ImportReport):
+    """``ImportReport`` et comptes déjà présents"""
+
+    def __init__(self):
+        super().__init__()
+        self.existing = 0
+
+    def __str__(self):
+        return (
+            f'{self.rows} lignes, {self.imported} comptes créés, {self.existing} existants, '
+            f'{self.failed} erreurs ({self.rows_per_second:.0f} lignes/s)'
+        )
+
+
+class RosterImporter(ChunkedImporter):
+    """Créer les comptes absents (email sans casse ou nom d'utilisateur)
+
+    Les comptes sont créés sans mot de passe utilisable : ``created`` reçoit
+    ceux de chaque lot pour leur envoyer une invitation (``set_password``).
+    """
+    report_class = RosterReport
+
+    def __init__(self, *args, created=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created = created
+        self.serializer = RosterRowSerializer()
+
+    def write_chunk(self, chunk, report):
+        users = {}
+        usernames = set()
+        for line, row in chunk:
+            try:
+                data = self.serializer.run_validation(row)
+            except serializers.ValidationError as exc:
+                report.add_error(line, exc.detail)
+                continue
+            data['email'] = User.objects.normalize_email(data['email'])
+            email = data['email'].lower()
+            # Doublon dans la liste elle-même : la première ligne gagne
+            if email in users or data['username'] in usernames:
+                report.existing += 1
+                continue
+            users[email] = User(password=make_password(None), **data)
+            usernames.add(data['username'])
+
+        if not users:
+            return
+        with transaction.atomic(using=self.using):
+            # Une requête par lot pour écarter les comptes existants
+            existing = User.objects.using(self.using).alias(
+                email_lower=Lower('email')
+            ).filter(
+                Q(email_lower__in=list(users)) | Q(username__in=usernames)
+            ).values_list('username', 'email')
+            taken_usernames, taken_emails = set(), set()
+            for username, email in existing:
+                taken_usernames.add(username)
+                taken_emails.add(email.lower())
+            new = [
+                user for email, user in users.items()
+                if email not in taken_emails and user.username not in taken_usernames
+            ]
+            # Compte créé entre-temps (inscription) : ignoré par la base
+            User.objects.using(self.using).bulk_create(new, ignore_conflicts=True)
+            # Les lignes ignorées n'ont pas de clé : relues par leur mot de
+            # passe inutilisable, aléatoire donc propre à chaque compte créé
+            created = list(User.objects.using(self.using).filter(
+                password__in=[user.password for user in new]
+            ))
+        report.existing += len(users) - len(created)
+        report.imported += len(created)
+        if created and self.created is not None:
+            self.created(created)
@@ -1,11 +1,61 @@
 from rest_framework import serializers  # type: ignore
 from django.contrib.auth import get_user_model  # type: ignore
+from django.contrib.auth.tokens import default_token_generator
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db import IntegrityError, transaction
+from django.utils.http import urlsafe_base64_decode
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer  # type: ignore
 
+from .models import EMAIL_UNIQUE_CONSTRAINT
+
 User = get_user_model()
 
+UNIQUE_ERRORS = {
+    'email': 'Cet email est déjà utilisé.',
+    'username': 'Ce nom d\'utilisateur est déjà utilisé.',
+}
+
+
+def unique_errors(exc):
+    """Erreurs de champ correspondant à une violation d'unicité, None sinon
+
+    SQLite et PostgreSQL nomment l'index (email) ou la colonne (username)
+    dans le message.
+    """
+    message = str(exc)
+    if EMAIL_UNIQUE_CONSTRAINT in message:
+        return {'email': [UNIQUE_ERRORS['email']]}
+    if 'username' in message:
+        return {'username': [UNIQUE_ERRORS['username']]}
+    return None
+
+
+class UniqueFieldsMixin:
+    """Unicité de l'email et du nom d'utilisateur vérifiée par la base
+
+    Pas de ``exists()`` avant l'écriture : l'INSERT ou l'UPDATE échoue sur
+    l'index unique et l'``IntegrityError`` devient une erreur de champ.
+    """
+
+    def create(self, validated_data):
+        return self._save_unique(super().create, validated_data)
 
-class UserSerializer(serializers.ModelSerializer):
+    def update(self, instance, validated_data):
+        return self._save_unique(super().update, instance, validated_data)
+
+    def _save_unique(self, save, *args):
+        try:
+            # Point de sauvegarde : la transaction englobante reste utilisable
+            with transaction.atomic():
+                return save(*args)
+        except IntegrityError as exc:
+            errors = unique_errors(exc)
+            if errors is None:
+                raise
+            raise serializers.ValidationError(errors)
+
+
+class UserSerializer(UniqueFieldsMixin, serializers.ModelSerializer):
     """Serializer pour afficher les données utilisateur"""
     class Meta:
         model = User
@@ -13,8 +63,12 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'joined_date')
 
 
-class RegisterSerializer(serializers.ModelSerializer):
-    """Serializer pour l'inscription de nouveaux utilisateurs"""
+class RegisterSerializer(UniqueFieldsMixin, serializers.ModelSerializer):
+    """Serializer pour l'inscription de nouveaux utilisateurs
+
+    Un seul INSERT : les doublons (email, nom d'utilisateur) sont refusés
+    par les index uniques de la base.
+    """
     password = serializers.CharField(write_only=True, min_length=6)
     password_confirm = serializers.CharField(write_only=True, min_length=6)
     full_name = serializers.CharField(source='first_name', required=False)
@@ -22,6 +76,10 @@ class RegisterSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('username', 'email', 'password', 'password_confirm', 'full_name', 'phone', 'address')
+        extra_kwargs = {
+            # Sans UniqueValidator (une requête de plus) : voir UniqueFieldsMixin
+            'username': {'validators': [UnicodeUsernameValidator()]},
+        }
     
     def validate(self, data):
         """Valider que les mots de passe correspondent"""
@@ -33,22 +91,13 @@ class RegisterSerializer(serializers.ModelSerializer):
                 'password_confirm': 'Les mots de passe ne correspondent pas.'
             })
         
-        # Vérifier si l'email existe déjà
-        if User.objects.filter(email=data['email']).exists():
-            raise serializers.ValidationError({
-                'email': 'Cet email est déjà utilisé.'
-            })
-        
-        # Vérifier si le username existe déjà
-        if User.objects.filter(username=data['username']).exists():
-            raise serializers.ValidationError({
-                'username': 'Ce nom d\'utilisateur est déjà utilisé.'
-            })
-        
         return data
     
     def create(self, validated_data):
         """Créer un nouvel utilisateur"""
+        return self._save_unique(self._create_user, validated_data)
+
+    def _create_user(self, validated_data):
         validated_data.pop('password_confirm', None)
         password = validated_data.pop('password')
         
@@ -91,6 +140,8 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         token['full_name'] = user.get_full_name()
         token['user_id'] = user.id
         token['role'] = getattr(user, 'role', 'user')
+        # Lu par ClaimsJWTAuthentication (permissions sans requête)
+        token['is_staff'] = user.is_staff
         
         return token
 
@@ -117,15 +168,40 @@ class ChangePasswordSerializer(serializers.Serializer):
         return data
 
 
-class UserUpdateSerializer(serializers.ModelSerializer):
-    """Serializer pour mettre à jour le profil utilisateur"""
+class SetPasswordSerializer(serializers.Serializer):
+    """Choisir son mot de passe depuis une invitation (``uid`` et ``token``)"""
+    uid = serializers.CharField()
+    token = serializers.CharField()
+    new_password = serializers.CharField(write_only=True, min_length=6)
+    new_password_confirm = serializers.CharField(write_only=True, min_length=6)
+
+    def validate(self, data):
+        if data['new_password'] != data['new_password_confirm']:
+            raise serializers.ValidationError({
+                'new_password_confirm': 'Les nouveaux mots de passe ne correspondent pas.'
+            })
+        try:
+            user = User.objects.get(pk=urlsafe_base64_decode(data['uid']).decode())
+        except (ValueError, User.DoesNotExist):
+            user = None
+        # Jeton lié au mot de passe : inutilisable une fois celui-ci choisi
+        if user is None or not default_token_generator.check_token(user, data['token']):
+            raise serializers.ValidationError({'token': 'Invitation invalide ou expirée.'})
+        data['user'] = user
+        return data
+
+    def save(self):
+        user = self.validated_data['user']
+        user.set_password(self.validated_data['new_password'])
+        user.save(update_fields=['password', 'updated_at'])
+        return user
+
+
+class UserUpdateSerializer(UniqueFieldsMixin, serializers.ModelSerializer):
+    """Serializer pour mettre à jour le profil utilisateur
+
+    Email déjà utilisé : refusé par l'index unique (voir UniqueFieldsMixin).
+    """
     class Meta:
         model = User
         fields = ('first_name', 'last_name', 'phone', 'address', 'email')
-        
-    def validate_email(self, value):
-        """Vérifier que l'email n'est pas déjà utilisé"""
-        user = self.context.get('request').user
-        if User.objects.filter(email=value).exclude(pk=user.pk).exists():
-            raise serializers.ValidationError('Cet email est déjà utilisé.')
-        return value
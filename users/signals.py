@@ -0,0 +1,33 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .authentication import revoked_users
+from .models import ClaimsUser, CustomUser
+
+# Changer l'un de ces champs rend les claims des jetons déjà émis obsolètes
+CLAIM_FIELDS = ClaimsUser.CLAIM_FIELDS + ('is_active',)
+
+
+@receiver(pre_save, sender=CustomUser)
+def remember_claims_change(sender, instance, update_fields=None, **kwargs):
+    """Noter si l'enregistrement modifie un champ repris dans les jetons"""
+    if instance._state.adding:
+        return
+    if update_fields is not None and not set(update_fields) & set(CLAIM_FIELDS):
+        return
+    previous = CustomUser.objects.filter(pk=instance.pk).values(*CLAIM_FIELDS).first()
+    instance._claims_changed = previous is not None and any(
+        previous[field] != getattr(instance, field) for field in CLAIM_FIELDS
+    )
+
+
+@receiver(post_save, sender=CustomUser)
+def revoke_changed_claims(sender, instance, **kwargs):
+    if getattr(instance, '_claims_changed', False):
+        revoked_users.add(instance.pk)
+        instance._claims_changed = False
+
+
+@receiver(post_delete, sender=CustomUser)
+def revoke_deleted_user(sender, instance, **kwargs):
+    revoked_users.add(instance.pk)
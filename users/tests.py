@@ -1,3 +1,261 @@
-from django.test import TestCase
+import csv
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db.models.query import QuerySet
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from books.tests import async_get, create_book
+from loans.tests import create_loan
+from .authentication import revoked_users
+
+User = get_user_model()
+
+
+class UserQueryCountTests(APITestCase):
+
+    def test_list(self):
+        for size in (3, 30):
+            for index in range(User.objects.count(), size):
+                User.objects.create_user(
+                    username=f'lecteur{index}', email=f'lecteur{index}@example.com'
+                )
+            with self.assertNumQueries(2):
+                response = self.client.get('/api/users/', {'page_size': size})
+            self.assertEqual(response.status_code, 200)
+
+    def test_retrieve(self):
+        user = User.objects.create_user(username='lecteur', email='lecteur@example.com')
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/users/{user.pk}/')
+        self.assertEqual(response.data['username'], 'lecteur')
+
+
+class ProfileConditionalGetTests(APITestCase):
+
+    def test_profile_304_until_changed(self):
+        user = User.objects.create_user(username='lecteur', email='lecteur@example.com')
+        self.client.force_authenticate(user)
+        first = self.client.get('/api/users/profile/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/users/profile/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        user.phone = '0600000000'
+        user.save()
+        response = self.client.get('/api/users/profile/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['phone'], '0600000000')
+
+
+class LoginTests(APITestCase):
+
+    def test_login_by_email(self):
+        User.objects.create_user(
+            username='lecteur', email='lecteur@example.com', password='secret123'
+        )
+        response = self.client.post(
+            '/api/auth/login/', {'email': 'lecteur@example.com', 'password': 'secret123'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+        response = self.client.post(
+            '/api/auth/login/', {'email': 'lecteur@example.com', 'password': 'faux'}
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def login(self):
+        return self.client.post(
+            '/api/auth/login/', {'email': 'lecteur@example.com', 'password': 'secret123'}
+        )
+
+    def test_legacy_hash_upgraded_on_login(self):
+        user = User.objects.create(
+            username='lecteur', email='lecteur@example.com',
+            password=make_password('secret123', hasher='pbkdf2_sha256'),
+        )
+        self.assertEqual(self.login().status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('argon2$'))
+        self.assertTrue(user.check_password('secret123'))
+
+    def test_rehash_when_parameters_change(self):
+        user = User.objects.create_user(
+            username='lecteur', email='lecteur@example.com', password='secret123'
+        )
+        with override_settings(ARGON2_TIME_COST=2):
+            self.assertEqual(self.login().status_code, 200)
+        user.refresh_from_db()
+        self.assertIn(',t=2,', user.password)
+
+
+class RegisterTests(APITestCase):
+    """Unicité vérifiée par les index de la base, un seul INSERT"""
+
+    def register(self, username, email):
+        return self.client.post('/api/users/register/', {
+            'username': username, 'email': email,
+            'password': 'secret123', 'password_confirm': 'secret123',
+        })
+
+    def test_single_insert(self):
+        # Point de sauvegarde, INSERT, libération
+        with self.assertNumQueries(3):
+            response = self.register('lecteur', 'lecteur@example.com')
+        self.assertEqual(response.status_code, 201)
+
+    def test_duplicates_map_to_field_errors(self):
+        self.register('lecteur', 'lecteur@example.com')
+        response = self.register('autre', 'Lecteur@Example.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['email'], ['Cet email est déjà utilisé.'])
+        response = self.register('lecteur', 'autre@example.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['username'], ["Ce nom d'utilisateur est déjà utilisé."])
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_login_ignores_email_case(self):
+        self.register('lecteur', 'lecteur@example.com')
+        response = self.client.post(
+            '/api/auth/login/', {'email': 'LECTEUR@example.com', 'password': 'secret123'}
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+ROSTER_CSV = """username;email;first_name;last_name
+e1001;alice@univ.example;Alice;Martin
+e1002;BOB@univ.example;Bob;Durand
+e1003;pas-un-email;Chloé;Petit
+e1004;Alice@Univ.example;Alice;Doublon
+e1005;eve@univ.example;Ève;Bernard
+"""
+
+
+class RosterImportTests(APITestCase):
+    """Création des comptes étudiants par lots"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.path = self.directory / 'rentree.csv'
+        self.path.write_text(ROSTER_CSV, encoding='utf-8')
+
+    def test_import_skips_existing_accounts(self):
+        User.objects.create_user(username='bob', email='bob@univ.example')
+        path = self.path
+        out, err = StringIO(), StringIO()
+        call_command('import_roster', str(path), chunk_size=2, stdout=out, stderr=err)
+        self.assertIn('5 lignes, 2 comptes créés, 2 existants, 1 erreurs', out.getvalue())
+        self.assertIn('Ligne 4', err.getvalue())
+        student = User.objects.get(username='e1005')
+        self.assertEqual((student.role, student.first_name), ('student', 'Ève'))
+        self.assertFalse(student.has_usable_password())
+        # Réimport : rien de nouveau
+        out = StringIO()
+        call_command('import_roster', str(path), stdout=out, stderr=StringIO())
+        self.assertIn('0 comptes créés, 4 existants', out.getvalue())
+
+    def test_rows_dropped_by_the_database_are_not_counted(self):
+        bulk_create = QuerySet.bulk_create
+
+        def register_meanwhile(queryset, objs, *args, **kwargs):
+            # Inscription entre la vérification et l'INSERT
+            User.objects.create_user(username='eve', email='eve@univ.example')
+            return bulk_create(queryset, objs, *args, **kwargs)
+
+        out = StringIO()
+        with mock.patch.object(QuerySet, 'bulk_create', register_meanwhile):
+            call_command('import_roster', str(self.path), stdout=out, stderr=StringIO())
+        self.assertIn('2 comptes créés, 2 existants', out.getvalue())
+
+    def test_invited_student_sets_password(self):
+        invitations = self.directory / 'invitations.csv'
+        call_command(
+            'import_roster', str(self.path), invitations=str(invitations),
+            stdout=StringIO(), stderr=StringIO(),
+        )
+        with open(invitations, newline='', encoding='utf-8') as file:
+            rows = {row['username']: row for row in csv.DictReader(file)}
+        self.assertEqual(set(rows), {'e1001', 'e1002', 'e1005'})
+        invitation = rows['e1005']
+        data = {
+            'uid': invitation['uid'], 'token': invitation['token'],
+            'new_password': 'rentree2026', 'new_password_confirm': 'rentree2026',
+        }
+        response = self.client.post('/api/users/set_password/', data)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(
+            '/api/auth/login/', {'email': 'eve@univ.example', 'password': 'rentree2026'}
+        )
+        self.assertEqual(response.status_code, 200)
+        # L'invitation ne sert qu'une fois
+        response = self.client.post('/api/users/set_password/', data)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('token', response.data)
+
+
+class ClaimsAuthenticationTests(APITestCase):
+    """Lectures authentifiées par les claims du jeton, sans lire l'utilisateur"""
+
+    def setUp(self):
+        revoked_users.clear()
+        self.user = User.objects.create_user(
+            username='lecteur', email='lecteur@example.com', password='secret123',
+            phone='0600000000',
+        )
+        create_loan(self.user, create_book(0))
+        response = self.client.post(
+            '/api/auth/login/', {'email': 'lecteur@example.com', 'password': 'secret123'}
+        )
+        self.access = response.data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+
+    def test_read_skips_user_lookup(self):
+        # Condition + page : plus de SELECT sur l'utilisateur
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/loans/my_loans/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_model_fields_load_once(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/users/profile/')
+        self.assertEqual(response.data['phone'], '0600000000')
+        self.assertEqual(response.data['username'], 'lecteur')
+
+    def test_profile_revalidation_reads_user_once(self):
+        first = self.client.get('/api/users/profile/')
+        # updated_at, nécessaire au validateur, n'est pas dans le jeton
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/users/profile/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_async_profile(self):
+        from .views import UserViewSet
+
+        expected = self.client.get('/api/users/profile/')
+        with self.assertNumQueries(1):
+            response = async_get(
+                UserViewSet, 'profile', '/api/users/profile/',
+                HTTP_AUTHORIZATION=f'Bearer {self.access}',
+            )
+        self.assertEqual(response.content, expected.content)
+
+    def test_deactivated_user_is_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get('/api/loans/my_loans/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_role_change_reloads_user(self):
+        self.user.is_staff = True
+        self.user.save()
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/loans/my_loans/')
+        self.assertEqual(response.status_code, 200)
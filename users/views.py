@@ -3,8 +3,13 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.views import TokenObtainPairView
-from .serializers import UserSerializer, RegisterSerializer, CustomTokenObtainPairSerializer
+from .serializers import (
+    UserSerializer, RegisterSerializer, CustomTokenObtainPairSerializer, SetPasswordSerializer,
+)
 from rest_framework.permissions import AllowAny
+from backend.async_views import AsyncViewSetMixin
+from backend.conditional import ConditionalGetMixin, make_etag
+from backend.metrics import SerializationTimingMixin
 
 User = get_user_model()
 
@@ -13,10 +18,13 @@ class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(SerializationTimingMixin, ConditionalGetMixin, AsyncViewSetMixin,
+                  viewsets.ModelViewSet):
     queryset = User.objects.all().order_by('id')
     serializer_class = UserSerializer
     permission_classes = [AllowAny]  # tout le ViewSet est accessible
+    # Sous ASGI (ASYNC_VIEWS) : aprofile
+    async_actions = ('profile',)
 
     @action(detail=False, methods=['post'], permission_classes=[AllowAny])
     def register(self, request):
@@ -29,12 +37,39 @@ class UserViewSet(viewsets.ModelViewSet):
             )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'], permission_classes=[AllowAny])
+    def set_password(self, request):
+        """Premier mot de passe d'un compte importé (voir ``import_roster``)"""
+        serializer = SetPasswordSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response({'message': 'Mot de passe enregistré'})
+
     @action(detail=False, methods=['get'], permission_classes=[AllowAny])
     def profile(self, request):
-        print("Request user:", request.user, "Authenticated?", request.user.is_authenticated)
         if request.user.is_authenticated:
-            serializer = UserSerializer(request.user)
-            return Response(serializer.data)
+            # Jeton (ClaimsUser) : updated_at et le profil, absents des claims,
+            # sont lus ensemble en une requête ; aucune avec une session
+            return self._profile_response(request, request.user)
+        return self._guest_profile()
+
+    async def aprofile(self, request):
+        user = request.user
+        if user.is_authenticated:
+            # Utilisateur reconstruit depuis le jeton : champs manquants lus en une requête
+            deferred = user.get_deferred_fields()
+            if deferred:
+                await user.arefresh_from_db(fields=list(deferred))
+            return self._profile_response(request, user)
+        return self._guest_profile()
+
+    def _profile_response(self, request, user):
+        etag = make_etag(request.get_full_path(), user.pk, user.updated_at.isoformat())
+        return self.conditional_response(
+            etag, user.updated_at, lambda: Response(self.get_serializer(user).data)
+        )
+
+    def _guest_profile(self):
         return Response({
             'id': None,
             'username': 'Invité',